@@ -0,0 +1,276 @@
+import argparse
+import fnmatch
+import glob
+import os
+import shutil
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from create_std_out import create_master_std_out
+from handlers.html_tag_handler import html_to_text
+from handlers.long_word_handler import guard_long_words
+from lexer import lex_file_std_outs
+
+# Master output of every file, in its own result folder next to its std_outs folder
+master_file = "612203120_assign2_output.txt"
+
+# Seconds between two scans of a watched folder
+default_interval = 2.0
+
+
+# True if a path has glob wildcards
+def is_glob(source):
+    return any(char in source for char in "*?[")
+
+
+# Input files of the sources (directories, searched recursively, glob patterns or files)
+# as (file, base) pairs: the result folder of a file is its path relative to base
+# Hidden files and the files of the result folder are left out
+def input_files(sources, pattern="*", out_root="results"):
+    out_root = os.path.abspath(out_root)
+    found = []
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs[:] = [
+                    name
+                    for name in dirs
+                    if not name.startswith(".")
+                    and os.path.abspath(os.path.join(root, name)) != out_root
+                ]
+                for name in files:
+                    if not name.startswith(".") and fnmatch.fnmatch(name, pattern):
+                        found.append((os.path.join(root, name), source))
+        elif is_glob(source):
+            matches = [
+                path
+                for path in glob.glob(source, recursive=True)
+                if os.path.isfile(path)
+                and not os.path.abspath(path).startswith(out_root + os.sep)
+            ]
+            if matches:
+                base = os.path.commonpath([os.path.dirname(path) for path in matches])
+                found += [(path, base) for path in matches]
+        elif os.path.isfile(source):
+            found.append((source, os.path.dirname(source)))
+        else:
+            print(f"Warning: {source} is not a file, a directory or a glob pattern")
+    return sorted(set(found))
+
+
+# Result folder of an input file
+def result_dir(out_root, input_file, base):
+    return os.path.join(out_root, os.path.relpath(input_file, base or "."))
+
+
+# Input files with their result folders, as (file, result folder) pairs
+# Two different files with the same path relative to their source (eg; a/x.txt and b/x.txt
+# given as files, or two folders that both have an x.txt) would write to the same result
+# folder, the batch fails instead of letting one silently overwrite the other. A file
+# found twice with the same result folder is only kept once
+def result_dirs(files, out_root):
+    owners = {}
+    pairs = []
+    for input_file, base in files:
+        output_dir = result_dir(out_root, input_file, base)
+        owner = owners.setdefault(output_dir, input_file)
+        if owner is input_file:
+            pairs.append((input_file, output_dir))
+        elif os.path.realpath(owner) != os.path.realpath(input_file):
+            raise ValueError(
+                f"{owner} and {input_file} would both be tokenized into {output_dir}, "
+                "give their common folder as the source instead"
+            )
+    return pairs
+
+
+# True if the master output of a file is newer than the file (tokenized by an earlier run)
+def up_to_date(input_file, output_dir):
+    master = os.path.join(output_dir, master_file)
+    return os.path.exists(master) and os.path.getmtime(master) >= os.path.getmtime(
+        input_file
+    )
+
+
+# Worker: tokenizes one file with the single pass lexer into its result folder
+# The file is lexed block by block (lex_file_std_outs), so a worker never holds a whole
+# file. The text converted by --html-parser and --guarded goes to the inter_files folder
+# of the result folder, so the workers never share an intermediate file, and is deleted
+# once the file is done. Returns the size of the file and the time it took
+def tokenize_file(input_file, output_dir, html_parser=False, guarded=False):
+    start = time.perf_counter()
+    inter_dir = os.path.join(output_dir, "inter_files")
+    os.makedirs(inter_dir, exist_ok=True)
+    text_file = input_file
+    try:
+        if html_parser:
+            text_file = html_to_text(
+                text_file, output_file=os.path.join(inter_dir, "html_text.txt")
+            )
+        if guarded:
+            text_file = guard_long_words(
+                text_file, output_file=os.path.join(inter_dir, "guarded.txt")
+            )
+        std_files = lex_file_std_outs(text_file, os.path.join(output_dir, "std_outs"))
+    finally:
+        shutil.rmtree(inter_dir)
+    create_master_std_out(std_files, os.path.join(output_dir, master_file))
+    return os.path.getsize(input_file), time.perf_counter() - start
+
+
+# Worker initializer: Ctrl+C and SIGTERM go to the whole process group, the workers
+# ignore them so that only the main process stops the batch (and lets the files already
+# started finish) instead of every worker dying with a KeyboardInterrupt
+def ignore_signals():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
+# Throughput of a batch
+def batch_summary(files, failed, size, seconds):
+    seconds = max(seconds, 1e-9)
+    return (
+        f"{files} files tokenized ({failed} failed), {size / (1024 * 1024):.1f} MB in "
+        f"{seconds:.1f} s: {files / seconds:.2f} files/s, "
+        f"{size / (1024 * 1024) / seconds:.2f} MB/s"
+    )
+
+
+# Files of the sources to tokenize now, as (file, result folder) pairs. seen has the size
+# and time of every file at the previous scan, submitted the ones it was tokenized at
+# With watch a file is only taken once its size and time are the same as at the previous
+# scan, so that a file still being copied into the folder is left for a later scan
+def ready_files(sources, pattern, out_root, seen, submitted, watch=False):
+    ready = []
+    files = result_dirs(input_files(sources, pattern, out_root), out_root)
+    for input_file, output_dir in files:
+        # A file can be moved away between the scan and here
+        try:
+            stat = os.stat(input_file)
+        except FileNotFoundError:
+            continue
+        signature = (stat.st_size, stat.st_mtime_ns)
+        previous = seen.get(input_file)
+        seen[input_file] = signature
+        if submitted.get(input_file) == signature or (watch and previous != signature):
+            continue
+        submitted[input_file] = signature
+        ready.append((input_file, output_dir))
+    return ready
+
+
+# Tokenizes every file of the sources with a pool of worker processes, each file into
+# out_root/<its path>/ (std_outs and master output). The workers live for the whole batch,
+# so the imports and the regexes are paid once per worker and not once per file
+# Files already tokenized since they last changed are skipped unless force is set
+# With watch the folders are scanned every interval seconds until Ctrl+C
+def batch_tokenize(
+    sources,
+    out_root="results",
+    jobs=None,
+    pattern="*",
+    watch=False,
+    interval=default_interval,
+    html_parser=False,
+    guarded=False,
+    force=False,
+):
+    os.makedirs(out_root, exist_ok=True)
+    stats = {"files": 0, "failed": 0, "bytes": 0, "seconds": 0.0}
+    started = time.perf_counter()
+    seen = {}
+    submitted = {}
+    running = {}
+    with ProcessPoolExecutor(max_workers=jobs, initializer=ignore_signals) as executor:
+        try:
+            ready = ready_files(sources, pattern, out_root, seen, submitted, watch)
+            while True:
+                for input_file, output_dir in ready:
+                    if force or not up_to_date(input_file, output_dir):
+                        future = executor.submit(
+                            tokenize_file, input_file, output_dir, html_parser, guarded
+                        )
+                        running[future] = (input_file, output_dir)
+                ready = []
+                if not running and not watch:
+                    break
+                if running:
+                    timeout = interval if watch else None
+                    done, _ = wait(running, timeout, FIRST_COMPLETED)
+                else:
+                    done = []
+                    time.sleep(interval)
+                for future in done:
+                    input_file, output_dir = running.pop(future)
+                    try:
+                        size, seconds = future.result()
+                    except Exception as error:
+                        stats["failed"] += 1
+                        print(f"Failed: {input_file}: {error}")
+                        continue
+                    stats["files"] += 1
+                    stats["bytes"] += size
+                    print(
+                        f"Tokenized {input_file} into {output_dir} "
+                        f"({size / (1024 * 1024):.1f} MB, {seconds:.2f} s)"
+                    )
+                if watch:
+                    ready = ready_files(
+                        sources, pattern, out_root, seen, submitted, watch
+                    )
+        except KeyboardInterrupt:
+            print(
+                "Stopping: the files already started are finished, the others dropped"
+            )
+            executor.shutdown(cancel_futures=True)
+    stats["seconds"] = time.perf_counter() - started
+    print(
+        batch_summary(stats["files"], stats["failed"], stats["bytes"], stats["seconds"])
+    )
+    return stats
+
+
+# Tokenizes folders of files without any prompt:
+# python batch_tokenize.py corpus/ "dumps/**/*.txt" --out results --jobs 4
+# python batch_tokenize.py drop_folder/ --watch
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch tokenizer")
+    parser.add_argument(
+        "sources",
+        nargs="+",
+        help="folders (searched recursively), files or glob patterns",
+    )
+    parser.add_argument("--out", default="results", help="folder of the result folders")
+    parser.add_argument(
+        "--jobs", type=int, default=None, help="worker processes (default: CPU count)"
+    )
+    parser.add_argument(
+        "--pattern", default="*", help="file names to take from the folders, eg; *.txt"
+    )
+    parser.add_argument(
+        "--watch", action="store_true", help="keep scanning the folders for new files"
+    )
+    parser.add_argument("--interval", type=float, default=default_interval)
+    parser.add_argument("--html-parser", action="store_true")
+    parser.add_argument("--guarded", action="store_true")
+    parser.add_argument(
+        "--force", action="store_true", help="also tokenize the files already done"
+    )
+    args = parser.parse_args()
+
+    # A service manager stops the watcher with SIGTERM, handled like Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        batch_tokenize(
+            args.sources,
+            args.out,
+            args.jobs,
+            args.pattern,
+            args.watch,
+            args.interval,
+            args.html_parser,
+            args.guarded,
+            args.force,
+        )
+    except ValueError as error:
+        parser.error(str(error))
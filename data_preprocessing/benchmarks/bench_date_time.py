@@ -0,0 +1,104 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from handlers.canonical_date_time_handler import convert_dates, convert_times
+
+words = ["the", "meeting", "is", "on", "at", "and", "moved", "to", "by", "for"]
+dates = [
+    "5 January 2020",
+    "12/05/2021",
+    "2020-03-07",
+    "March 5, 2019",
+    "5th Jan 2020",
+    "12.05.20",
+    "31-12-1999",
+]
+times = ["7:30 pm IST", "19:00", "7pm", "7 a.m. UTC", "10.30 am", "12:45:30 PDT"]
+
+# Texts with their expected conversion: an AM / PM word after a date (or on the next
+# line) is not a time, the day of the date stays in the date
+checks = [
+    ("On 12/05/2020 PM Modi spoke", "On CF:D:2020-05-12  PM Modi spoke"),
+    ("2020-05-12 AM", "CF:D:2020-05-12  AM"),
+    ("January 5, 2020\nPM Modi", "CF:D:2020-01-05 \nPM Modi"),
+    ("7:30\nPM Modi", "CF:T:07:30:IST \nPM Modi"),
+    ("at 7 pm IST", "at CF:T:19:00:IST "),
+]
+
+# The old regexes, for the reference run
+legacy_date_regex = r"(\d{1,2})[/\s]+(January|February|March|April|May|June|July|August|September|October|November|December|\d{1,2})[/\s]+(\d{2,4})"
+legacy_time_regex = (
+    r"(?<!CF:D:)\b(\d{1,2})[.:]?(\d{2})\s*(?:(a|p).?m.?)?\s*(IST|PST)?\b"
+)
+
+
+# Synthetic date heavy text of about size_mb megabytes (a date or a time every 4 words)
+def generate_text(size_mb, seed=0):
+    rng = random.Random(seed)
+    pieces = []
+    size = 0
+    while size < size_mb * 1024 * 1024:
+        piece = rng.choice(dates if rng.random() < 0.5 else times)
+        piece += " " + " ".join(rng.choice(words) for _ in range(3))
+        piece += "\n" if rng.random() < 0.1 else " "
+        pieces.append(piece)
+        size += len(piece)
+    return "".join(pieces)
+
+
+# The conversion as it used to be: a search for the first match, then a substitution
+# of that value for every match (the canonical values are not computed here)
+def legacy_convert(text):
+    for regex in (legacy_date_regex, legacy_time_regex):
+        match = re.search(regex, text, re.IGNORECASE)
+        canonical = match.group() if match else ""
+        text = re.sub(regex, canonical, text)
+    return text
+
+
+# Runs a conversion function and returns the time it took
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Date and time conversion benchmark")
+    parser.add_argument("--size-mb", type=int, default=20)
+    parser.add_argument("--input", help="benchmark on this file instead")
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, "r") as f_in:
+            text = f_in.read()
+    else:
+        text = generate_text(args.size_mb)
+    size = len(text.encode()) / (1024 * 1024)
+    print(f"Input: {size:.1f} MB")
+
+    new_time = timed(lambda: convert_times(convert_dates(text)))
+    print(f"per match conversion: {new_time:8.2f} s  {size / new_time:8.2f} MB/s")
+    legacy_time = timed(legacy_convert, text)
+    print(f"legacy (first match): {legacy_time:8.2f} s  {size / legacy_time:8.2f} MB/s")
+
+    converted = convert_times(convert_dates(text))
+    print("Dates converted:", converted.count("CF:D:"))
+    print("Times converted:", converted.count("CF:T:"))
+
+    failed = [
+        (sample, got, expected)
+        for sample, expected in checks
+        if (got := convert_times(convert_dates(sample))) != expected
+    ]
+    for sample, got, expected in failed:
+        print(f"FAILED: {sample!r} -> {got!r}, expected {expected!r}")
+    if failed:
+        sys.exit(1)
+    print(f"All {len(checks)} checks passed")
@@ -0,0 +1,72 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from handlers.emoji_handler import (
+    regex,
+    emoticon_rule,
+    emoticons_lexicon,
+    emoji_lexicon,
+)
+
+words = ["lol", "this", "is", "so", "good", "omg", "we", "won", "the", "match", "!!"]
+
+
+# Synthetic social media text of about size_mb megabytes, an emoji or emoticon every 3 words
+def generate_text(size_mb, seed=0):
+    rng = random.Random(seed)
+    emojis = list(emoji_lexicon.keys())
+    emoticons = list(emoticons_lexicon.keys())
+    pieces = []
+    size = 0
+    while size < size_mb * 1024 * 1024:
+        roll = rng.random()
+        if roll < 0.2:
+            piece = rng.choice(emojis)
+        elif roll < 0.33:
+            piece = rng.choice(emoticons)
+        else:
+            piece = rng.choice(words)
+        pieces.append(piece)
+        size += len(piece.encode()) + 1
+    return " ".join(pieces)
+
+
+# Runs a function and returns its result and the time it took
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emoticon and emoji matcher benchmark")
+    parser.add_argument("--size-mb", type=int, default=20)
+    parser.add_argument("--input", help="benchmark on this file instead")
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, "r") as f_in:
+            text = f_in.read()
+    else:
+        text = generate_text(args.size_mb)
+    size = len(text.encode()) / (1024 * 1024)
+    print(f"Input: {size:.1f} MB")
+
+    pattern, compile_time = timed(re.compile, regex)
+    print(f"Compile: {compile_time:.2f} s ({len(regex)} characters)")
+    found, scan_time = timed(pattern.findall, text)
+    print(
+        f"emoji matcher:  {scan_time:8.2f} s  {size / scan_time:8.2f} MB/s  "
+        f"{len(found) / scan_time / 1e6:.2f} M matches/s ({len(found)} found)"
+    )
+    legacy_found, legacy_time = timed(re.findall, emoticon_rule, text)
+    print(
+        f"old rule only:  {legacy_time:8.2f} s  {size / legacy_time:8.2f} MB/s  "
+        f"({len(legacy_found)} found)"
+    )
@@ -0,0 +1,119 @@
+import argparse
+import csv
+import html
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from handlers.html_tag_handler import strip_tags, html_text, html_to_text
+from lexer import normalize_text
+
+# Bodies scraped by the article scraper, one HTML fragment per row
+scraped_csv = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "web_scraping",
+    "articlescraper",
+    "articlescraper",
+    "output.csv",
+)
+
+# Entities left undecoded in the text, eg; &amp; &#233;
+entity_regex = r"&(?:#\d+|#x[0-9a-fA-F]+|[a-zA-Z]+\d*);"
+
+# Escaped "<" and ">" in a page, with the text the modes must keep once it is converted
+# and its tags are stripped again (the stages run the tag regex on the text)
+escaped_html = "<p>if x &lt; 3 and y &gt; 5 then use &lt;div&gt; tags</p>"
+escaped_text = "if x < 3 and y > 5 then use <div> tags"
+
+
+# HTML of the scraped bodies, repeated up to about size_mb megabytes if given
+def load_bodies(csv_file, size_mb=None):
+    csv.field_size_limit(sys.maxsize)
+    with open(csv_file, "r", newline="") as f_in:
+        bodies = [row["body"] for row in csv.DictReader(f_in)]
+    text = "\n".join(bodies) + "\n"
+    if size_mb:
+        text *= max(1, int(size_mb * 1024 * 1024 / len(text.encode())))
+    return text
+
+
+# Runs a function and returns its result and the time it took
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+# Number of entities left in a text
+def leftovers(text):
+    return f"{len(re.findall(entity_regex, text))} entities"
+
+
+# Number of entities left in a text converted by the HTML parser, which writes "<" and
+# ">" back as &lt; and &gt; on purpose
+def parser_leftovers(text):
+    kept = len(re.findall("&(?:lt|gt);", text))
+    return f"{len(re.findall(entity_regex, text)) - kept} entities (+{kept} &lt; &gt;)"
+
+
+# True if the text of escaped_html is kept by the HTML parser and the tag regex after it
+def escaped_text_kept():
+    text = normalize_text(html_text(escaped_html))
+    return html.unescape(text).split() == escaped_text.split()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTML stripping benchmark")
+    parser.add_argument(
+        "--input", default=scraped_csv, help="CSV file with a body column"
+    )
+    parser.add_argument(
+        "--size-mb", type=float, help="repeat the bodies up to this size"
+    )
+    args = parser.parse_args()
+
+    text = load_bodies(args.input, args.size_mb)
+    size = len(text.encode()) / (1024 * 1024)
+    print(f"Input: {size:.1f} MB of HTML ({leftovers(text)})")
+
+    stripped, regex_time = timed(strip_tags, text)
+    print(
+        f"regex:          {regex_time:8.2f} s  {size / regex_time:8.2f} MB/s  "
+        f"{leftovers(stripped)}"
+    )
+    parsed, parser_time = timed(html_text, text)
+    print(
+        f"html.parser:    {parser_time:8.2f} s  {size / parser_time:8.2f} MB/s  "
+        f"{parser_leftovers(parsed)}"
+    )
+
+    work_dir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        os.chdir(work_dir)
+        os.makedirs("inter_files")
+        with open("input.html", "w") as f_out:
+            f_out.write(text)
+        _, stream_time = timed(html_to_text, "input.html")
+        # Second run for the memory, tracemalloc slows it down
+        tracemalloc.start()
+        html_to_text("input.html")
+        peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+        print(
+            f"html_to_text:   {stream_time:8.2f} s  {size / stream_time:8.2f} MB/s  "
+            f"(file to file, peak traced memory {peak:.1f} MB)"
+        )
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir)
+
+    if not escaped_text_kept():
+        sys.exit(f"FAILED: the text of {escaped_html} is not kept by the stages")
+    print(f"Escaped < and > kept: {escaped_html}")
@@ -0,0 +1,96 @@
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from handlers.lexicon import Lexicon
+from handlers.abbreviation_handler import AbbreviationPattern, pattern as abbreviations
+
+
+# Random abbreviation like entries: a few dotted groups of letters
+def generate_entries(count, seed=0):
+    rng = random.Random(seed)
+    entries = set()
+    while len(entries) < count:
+        groups = rng.randint(1, 3)
+        key = "".join(
+            "".join(rng.choice(string.ascii_letters) for _ in range(rng.randint(1, 4)))
+            + "."
+            for _ in range(groups)
+        )
+        entries.add(key)
+    return [(key, "") for key in sorted(entries)]
+
+
+# Random text of about size_mb megabytes, with some entries of the lexicon in it
+def generate_text(entries, size_mb, seed=0):
+    rng = random.Random(seed)
+    words = ["the", "of", "and", "results", "patients", "study", "were", "in"]
+    keys = [key for key, _ in entries]
+    pieces = []
+    size = 0
+    while size < size_mb * 1024 * 1024:
+        word = rng.choice(keys) if rng.random() < 0.05 else rng.choice(words)
+        pieces.append(word)
+        size += len(word) + 1
+    return " ".join(pieces)
+
+
+# Keys of the shipped abbreviation lexicon that the abbreviation stage does not find as a
+# single token (eg; M.Sc. split into the dotted capitals M. and the rest)
+def unmatched_keys():
+    keys = abbreviations.lexicon.keys()
+    return [key for key in keys if abbreviations.findall(key) != [key]]
+
+
+# Runs a function and returns its result and the time it took
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lexicon benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--text-mb", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for count in args.sizes:
+            entries = generate_entries(count)
+            lexicon, build_time = timed(Lexicon.from_entries, entries)
+            path = os.path.join(work_dir, f"bench_{count}.lex")
+            lexicon.save(path)
+            lexicon, load_time = timed(Lexicon.load, path)
+            regex, regex_time = timed(lexicon.regex)
+            _, cached_time = timed(lexicon.regex)
+            pattern, compile_time = timed(re.compile, rf"(?<!\w)(?:{regex})(?!\w)")
+            keys = [key for key, _ in entries] * max(1, 100000 // count)
+            _, lookup_time = timed(lambda: [lexicon.get(key) for key in keys])
+            text = generate_text(entries, args.text_mb)
+            found, scan_time = timed(pattern.findall, text)
+            walker, walker_time = timed(AbbreviationPattern, lexicon)
+            walked, walk_time = timed(walker.findall, text)
+            size = len(text) / (1024 * 1024)
+            print(
+                f"{count:6d} entries  build {build_time:6.2f} s  "
+                f"load {load_time * 1000:6.1f} ms ({os.path.getsize(path) // 1024} KB)  "
+                f"regex {regex_time:5.2f} s (again {cached_time * 1000:.3f} ms)  "
+                f"compile {compile_time:5.2f} s  "
+                f"lookup {len(keys) / lookup_time / 1e6:5.2f} M/s  "
+                f"scan {size / scan_time:6.1f} MB/s ({len(found)} found)  "
+                f"trie walk {walker_time * 1000:.1f} ms + {size / walk_time:5.1f} MB/s "
+                f"({len(walked)} found)"
+            )
+
+    unmatched = unmatched_keys()
+    if unmatched:
+        sys.exit(f"FAILED: abbreviations not found as one token: {' '.join(unmatched)}")
+    print(f"All {len(abbreviations.lexicon)} abbreviation keys found as one token")
@@ -0,0 +1,68 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crf_ner import CRFNERTagger, generate_sentences
+from create_std_out import std_out_tokens
+from stanford_ner import StanfordNERServer, stanford_ner_jar, stanford_ner_model
+
+
+# Runs a function and returns its result and the time it took
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+# Tags the tokens in batches like batch_ner_tagging, returns the tokens per second
+def tagging_speed(tagger, tokens, batch_size=10000):
+    start = time.perf_counter()
+    for i in range(0, len(tokens), batch_size):
+        tagger.tag(tokens[i : i + batch_size])
+    return len(tokens) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CRF and Stanford NER benchmark")
+    parser.add_argument("--train-sentences", type=int, default=5000)
+    parser.add_argument("--tokens", type=int, default=200000)
+    parser.add_argument("--input", help="tag the tokens of this master output instead")
+    args = parser.parse_args()
+
+    if args.input:
+        tokens = [token for block in std_out_tokens(args.input) for token in block]
+    else:
+        test_sentences = generate_sentences(args.tokens // 8, seed=1)
+        tokens = [word for sentence in test_sentences for word, _ in sentence]
+    print(f"Input: {len(tokens)} tokens")
+
+    model_dir = tempfile.mkdtemp()
+    try:
+        model_file = os.path.join(model_dir, "crf_ner_model.crfsuite")
+        trainer = CRFNERTagger(model_file=None)
+        sentences = generate_sentences(args.train_sentences)
+        _, train_time = timed(trainer.train, sentences, model_file)
+        print(f"CRF training:    {train_time:8.2f} s ({len(sentences)} sentences)")
+        trainer.close()
+
+        tagger, startup_time = timed(CRFNERTagger, model_file)
+        speed = tagging_speed(tagger, tokens)
+        print(f"CRF startup:     {startup_time:8.2f} s  {speed:10.0f} tokens/s")
+        tagger.close()
+    finally:
+        shutil.rmtree(model_dir)
+
+    if not shutil.which("java") or not os.path.exists(stanford_ner_jar):
+        print(f"Stanford NER:    skipped (no Java or no jar at {stanford_ner_jar})")
+    else:
+        server, startup_time = timed(StanfordNERServer, stanford_ner_model)
+        try:
+            speed = tagging_speed(server, tokens)
+        finally:
+            server.close()
+        print(f"Stanford server: {startup_time:8.2f} s  {speed:10.0f} tokens/s")
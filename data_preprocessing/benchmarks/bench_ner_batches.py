@@ -0,0 +1,172 @@
+import argparse
+import ast
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_std_out import create_master_std_out, std_out_tokens
+from disk_cache import default_cache_mb
+from lexer import lex_file_std_outs, normalize_file
+from stanford_ner import batch_ner_tagging, ner_tagger_env, ner_tagging, sentence_ends
+from synthetic_corpus import write_corpus
+
+master_file = "612203120_assign2_output.txt"
+ne_file = "612203120_NE-Dict.txt"
+
+
+class FakeTagger:
+    """Tagger without a model: a title case token is a PERSON at the start of a sentence
+    (first token of the call or after . ! or ?) and a LOCATION inside one, any other token
+    is O. Like a real tagger, the tag of a token depends on the tokens before it in the
+    call, so a sentence without a sentence end gets other tags if the sentence before it
+    is given in the same call"""
+
+    def tag(self, tokens):
+        tagged = []
+        previous = "."
+        for token in tokens:
+            tag = fake_tags(token)[0]
+            if tag == "PERSON" and previous not in sentence_ends:
+                tag = "LOCATION"
+            tagged.append((token, tag))
+            previous = token
+        return tagged
+
+    def close(self):
+        pass
+
+
+class FailingTagger(FakeTagger):
+    """Fake tagger that fails on its second batch"""
+
+    def __init__(self):
+        self.batches = 0
+
+    def tag(self, tokens):
+        self.batches += 1
+        if self.batches > 1:
+            raise RuntimeError("tagger failure")
+        return super().tag(tokens)
+
+
+# Tags the fake tagger can give a token
+def fake_tags(token):
+    return ("PERSON", "LOCATION") if token.istitle() else ("O",)
+
+
+# Count line and (token, tag) pairs of the NE dictionary
+def read_ne_file(input_file):
+    with open(input_file, "r") as f_in:
+        count = int(f_in.readline())
+        return count, [ast.literal_eval(line) for line in f_in]
+
+
+# Differences between an NE dictionary and the tokens of the master output, in order or
+# as a multiset (the sentences of the text have the tokens in text order)
+def check_ne_file(input_file, tokens, in_order):
+    count, pairs = read_ne_file(input_file)
+    problems = []
+    if count != len(pairs):
+        problems.append(f"count line {count} for {len(pairs)} tags")
+    tagged = [token for token, _ in pairs]
+    if (tagged if in_order else sorted(tagged)) != (
+        tokens if in_order else sorted(tokens)
+    ):
+        problems.append(f"{len(pairs)} tagged tokens are not the {len(tokens)} tokens")
+    if any(tag not in fake_tags(token) for token, tag in pairs):
+        problems.append("a tag is not the one of the tagger")
+    return problems
+
+
+# Runs ner_tagging with the fake tagger named in TOKENIZER_NER_TAGGER, returns the time
+def timed_ner(*args):
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        ner_tagging(master_file, None, *args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NER stage check with a fake tagger")
+    parser.add_argument("--size-mb", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--input", help="check on this file instead")
+    args = parser.parse_args()
+
+    # ner_tagging imports the tagger of this script by its module name
+    os.environ[ner_tagger_env] = "bench_ner_batches:FakeTagger"
+    work_dir = tempfile.mkdtemp(prefix="bench_ner_batches_")
+    try:
+        if args.input:
+            input_file = os.path.abspath(args.input)
+        else:
+            input_file = write_corpus(
+                os.path.join(work_dir, "input.txt"), args.size_mb, None, args.seed
+            )
+        os.chdir(work_dir)
+        os.makedirs("inter_files")
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            std_files = lex_file_std_outs(input_file, "std_outs")
+            create_master_std_out(std_files, master_file)
+            text_file, spans_file = normalize_file(input_file)
+        tokens = [token for block in std_out_tokens(master_file) for token in block]
+        print(f"Input: {len(tokens)} tokens")
+
+        failed = False
+        runs = [
+            ("master output", True, ()),
+            ("sentences", False, (None, default_cache_mb, text_file, spans_file)),
+            (
+                "sentences, cache",
+                False,
+                ("ner_cache.sqlite", default_cache_mb, text_file, spans_file),
+            ),
+            (
+                "sentences, cached",
+                False,
+                ("ner_cache.sqlite", default_cache_mb, text_file, spans_file),
+            ),
+        ]
+        # Every sentence is tagged on its own, with the cache or without it, so all the
+        # runs on the sentences give the same NE dictionary
+        sentence_pairs = None
+        for name, in_order, ner_args in runs:
+            seconds = timed_ner(*ner_args)
+            problems = check_ne_file(ne_file, tokens, in_order)
+            if not in_order:
+                pairs = read_ne_file(ne_file)[1]
+                if sentence_pairs is not None and pairs != sentence_pairs:
+                    problems.append(
+                        "the tags are not the ones of the first sentence run"
+                    )
+                sentence_pairs = sentence_pairs or pairs
+            failed = failed or bool(problems)
+            print(
+                f"{name:18} {seconds:8.2f} s {len(tokens) / seconds:10.0f} tokens/s  "
+                f"{'; '.join(problems) or 'same tokens and tags'}"
+            )
+
+        # A failing tagger leaves no part file and no reader thread behind
+        threads = threading.active_count()
+        try:
+            batch_ner_tagging(master_file, 1000, FailingTagger())
+            problems = ["the tagger failure was not raised"]
+        except RuntimeError:
+            problems = []
+        if os.path.exists(ne_file + ".part"):
+            problems.append("the part file is left")
+        if threading.active_count() != threads:
+            problems.append("the reader thread is left")
+        failed = failed or bool(problems)
+        print(f"{'failing tagger':18} {'; '.join(problems) or 'cleaned up'}")
+        if failed:
+            sys.exit(1)
+    finally:
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        shutil.rmtree(work_dir)
@@ -0,0 +1,126 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from handlers.html_tag_handler import regex as tag_regex, strip_tags
+from handlers.canonical_date_time_handler import date_pattern, time_pattern
+from handlers.long_word_handler import split_long_words
+from lexer import patterns, lex_text
+
+# Characters the patterns are the most sensitive to, for the random inputs
+fuzz_alphabet = "aZ1.-_/:@#'<>&;!?()[] \n"
+
+
+# Pathological inputs of about size characters: long runs that a pattern can start to
+# match at every position but never finish
+def pathological_inputs(size):
+    half = size // 2
+    third = size // 3
+    return {
+        "dots": "." * size,
+        "hyphens": "-" * size,
+        "dot_hyphen": ".-" * half,
+        "word_dot": "a." * half,
+        "capital_dot": "A." * half,
+        "capitals": "A" * size,
+        "word_hyphen": "a-" * half,
+        "word_dot_hyphen": "a.-" * third,
+        "url_dots": "http://" + "a." * half + "!",
+        "url_spaces": "http://a " * (size // 9),
+        "apostrophes": "a'" * half,
+        "digits": "1" * size,
+        "digit_spaces": "1 " * half,
+        "clock": "12:" * third,
+        "slashes": "1/" * half,
+        "open_tags": "<" * size,
+        "open_tag_words": "<a " * third,
+        "ampersands": "&" * size,
+        "mentions": "@" * size,
+        "hashes": "#" * size,
+        "colons": ":" * size,
+    }
+
+
+# Random inputs made of the sensitive characters, the same ones for the same seed
+def fuzz_inputs(size, count, seed=0):
+    rng = random.Random(seed)
+    return {
+        f"fuzz_{i}": "".join(rng.choice(fuzz_alphabet) for _ in range(size))
+        for i in range(count)
+    }
+
+
+# Every pattern run on the text by a handler: the word level ones and the text level ones
+def handler_patterns():
+    checked = dict(patterns)
+    checked["html_tags"] = re.compile(tag_regex)
+    checked["raw_dates"] = date_pattern
+    checked["raw_times"] = time_pattern
+    return checked
+
+
+# Time a function takes
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+# Time of the slowest pattern on a text in guarded mode: the long runs are cut first and
+# the tags are removed by strip_tags, which only scans up to the last ">"
+def guarded_time(checked, text):
+    guarded = split_long_words(text)
+    times = [
+        timed(pattern.findall, guarded)
+        for pattern_name, pattern in checked.items()
+        if pattern_name != "html_tags"
+    ]
+    times.append(timed(strip_tags, guarded))
+    times.append(timed(lambda: list(lex_text(guarded))))
+    return max(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regex safety fuzz and benchmark")
+    parser.add_argument("--size", type=int, default=8000, help="characters per input")
+    parser.add_argument("--fuzz", type=int, default=20, help="number of random inputs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    checked = handler_patterns()
+    inputs = pathological_inputs(args.size)
+    inputs.update(fuzz_inputs(args.size, args.fuzz, args.seed))
+    # The same inputs 4 times longer: a linear pattern takes about 4 times longer on them,
+    # a quadratic one 16 times longer
+    long_inputs = pathological_inputs(args.size * 4)
+    long_inputs.update(fuzz_inputs(args.size * 4, args.fuzz, args.seed))
+    superlinear = 0
+    print(f"{len(inputs)} inputs of {args.size} characters, {len(checked)} patterns")
+    print(
+        f"{'input':18} {'slowest pattern':16} {'plain':>9} {'guarded':>9} "
+        f"{'guarded x4':>11} {'growth':>7}"
+    )
+    for name, text in inputs.items():
+        times = {
+            pattern_name: timed(pattern.findall, text)
+            for pattern_name, pattern in checked.items()
+        }
+        slowest = max(times, key=times.get)
+        short_time = guarded_time(checked, text)
+        long_time = guarded_time(checked, long_inputs[name])
+        growth = long_time / max(short_time, 0.001)
+        flag = ""
+        if growth > 8 and long_time > 0.01:
+            flag = "  SUPERLINEAR"
+            superlinear += 1
+        print(
+            f"{name:18} {slowest:16} {times[slowest]:8.3f}s {short_time:8.3f}s "
+            f"{long_time:10.3f}s {growth:6.1f}x{flag}"
+        )
+    print(f"{superlinear} inputs with a superlinear time in guarded mode")
+    sys.exit(1 if superlinear else 0)
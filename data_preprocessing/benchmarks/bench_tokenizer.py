@@ -0,0 +1,216 @@
+import argparse
+import contextlib
+import filecmp
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_std_out import create_master_std_out
+from handlers.chunk_stream import default_chunk_size
+from lexer import crosses_date_time, normalize_text, outside_tag
+from pipeline_metrics import StageRecorder
+from synthetic_corpus import write_corpus, parse_densities
+from tokenize_pipeline import (
+    cascade_stages,
+    single_pass_stages,
+    parallel_stages,
+    graph_stages,
+    index_stages,
+    incremental_stages,
+)
+
+master_file = "612203120_assign2_output.txt"
+
+# Pipeline of every mode of custom_tokenizer.py, cascade is the one of tokenize()
+modes = {
+    "cascade": lambda input_file, jobs, recorder: cascade_stages(
+        input_file, None, recorder
+    ),
+    "stream": lambda input_file, jobs, recorder: cascade_stages(
+        input_file, default_chunk_size, recorder
+    ),
+    "single-pass": lambda input_file, jobs, recorder: single_pass_stages(
+        input_file, recorder
+    ),
+    "graph": lambda input_file, jobs, recorder: graph_stages(
+        input_file, False, recorder
+    ),
+    "index": lambda input_file, jobs, recorder: index_stages(
+        input_file, "612203120_assign2_output.idx", recorder
+    ),
+    "incremental": lambda input_file, jobs, recorder: incremental_stages(
+        input_file, 1024, recorder
+    ),
+    "parallel": lambda input_file, jobs, recorder: parallel_stages(
+        input_file, jobs, recorder
+    ),
+}
+
+
+# Texts where a cut after a blank space can change the normalized text: a lookbehind that
+# sees the text before the cut ("." before 2017), a date across a new line, an AM / PM
+# word after a date. The cuts of the parallel, single pass, incremental and batch modes
+# are all checked by crosses_date_time
+cut_samples = [
+    "M.Sc.2017 May 23 12/05/2020",
+    "M.Sc.2017 May 23\n12/05/2020",
+    "12/05/2020 | PM",
+    "On 12/05/2020 PM Modi spoke",
+    "2020-05-12 AM",
+    "January 5, 2020\nPM Modi",
+]
+
+
+# Cuts of the samples taken as safe that change their normalized text, as (text, pos)
+def unsafe_cuts():
+    unsafe = []
+    for text in cut_samples:
+        whole = normalize_text(text)
+        for pos in range(1, len(text)):
+            if not text[pos - 1].isspace() or not outside_tag(text, pos):
+                continue
+            if crosses_date_time(text, pos):
+                continue
+            if normalize_text(text[:pos]) + normalize_text(text[pos:]) != whole:
+                unsafe.append((text, pos))
+    return unsafe
+
+
+# Runs the pipeline of a mode in work_dir up to the master output, with the metrics on
+# Runs in its own process, so that the peak RSS is the one of this mode only
+def run_mode(mode, input_file, work_dir, jobs):
+    os.chdir(work_dir)
+    recorder = StageRecorder("basic")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        std_files, _ = modes[mode](input_file, jobs, recorder)
+        recorder.run(
+            "create_master_std_out", create_master_std_out, std_files, master_file
+        )
+    recorder.write_report(master_file)
+
+
+# Metrics report of a mode run in a fresh process
+def measure(mode, input_file, work_dir, jobs):
+    # The stages write to the folders of the repository layout
+    for folder in ("inter_files", "std_outs"):
+        os.makedirs(os.path.join(work_dir, folder))
+    process = multiprocessing.get_context("spawn").Process(
+        target=run_mode, args=(mode, input_file, work_dir, jobs)
+    )
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"The {mode} mode failed (exit code {process.exitcode})")
+    report_file = os.path.join(work_dir, "612203120_assign2_output_metrics.json")
+    with open(report_file, "r") as f_in:
+        return json.load(f_in)
+
+
+# Files of the master output and the standard outputs that differ from the reference run
+def compare_outputs(work_dir, reference_dir):
+    names = [master_file]
+    names += [
+        os.path.join("std_outs", name)
+        for name in sorted(os.listdir(os.path.join(reference_dir, "std_outs")))
+    ]
+    return [
+        name
+        for name in names
+        if not os.path.exists(os.path.join(work_dir, name))
+        or not filecmp.cmp(
+            os.path.join(work_dir, name), os.path.join(reference_dir, name), False
+        )
+    ]
+
+
+# Throughput in MB/s
+def speed(size, seconds):
+    return size / (1024 * 1024) / seconds if seconds else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tokenizer throughput benchmark")
+    parser.add_argument("--size-mb", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--density",
+        action="append",
+        metavar="KIND=SHARE",
+        help="share of the words of a kind in the synthetic corpus, can be repeated",
+    )
+    parser.add_argument("--input", help="benchmark on this file instead")
+    parser.add_argument(
+        "--modes",
+        default="cascade,stream,single-pass,graph,index,incremental,parallel",
+        help="comma separated modes, the first one is the reference of the output check",
+    )
+    parser.add_argument("--jobs", type=int, default=2, help="workers of parallel mode")
+    parser.add_argument("--report", help="also write the results to this JSON file")
+    parser.add_argument("--keep", action="store_true", help="keep the output folders")
+    args = parser.parse_args()
+
+    mode_names = args.modes.split(",")
+    for mode in mode_names:
+        if mode not in modes:
+            parser.error(f"unknown mode: {mode} (one of {', '.join(modes)})")
+    work_root = tempfile.mkdtemp(prefix="bench_tokenizer_")
+    try:
+        if args.input:
+            input_file = os.path.abspath(args.input)
+        else:
+            input_file = write_corpus(
+                os.path.join(work_root, "input.txt"),
+                args.size_mb,
+                parse_densities(args.density),
+                args.seed,
+            )
+        size = os.path.getsize(input_file)
+        print(f"Input: {size / (1024 * 1024):.1f} MB ({input_file})")
+
+        results = {}
+        for mode in mode_names:
+            work_dir = os.path.join(work_root, mode)
+            report = measure(mode, input_file, work_dir, args.jobs)
+            different = compare_outputs(
+                work_dir, os.path.join(work_root, mode_names[0])
+            )
+            total = report["total"]
+            total_speed = speed(size, total["wall_time"])
+            results[mode] = {**report, "different_files": different}
+            if mode == mode_names[0]:
+                check = "reference"
+            elif different:
+                check = f"DIFFERENT: {', '.join(different)}"
+            else:
+                check = "same output"
+            print(
+                f"{mode:12} {total['wall_time']:8.2f} s {total_speed:8.2f} MB/s"
+                f"  peak RSS {total['peak_rss'] / (1024 * 1024):7.1f} MB  {check}"
+            )
+            for stage in report["stages"]:
+                print(
+                    f"  {stage['stage']:30} {stage['wall_time']:8.2f} s "
+                    f"{speed(stage['bytes_read'], stage['wall_time']):8.2f} MB/s  "
+                    f"peak RSS {stage['peak_rss'] / (1024 * 1024):7.1f} MB"
+                )
+        if args.report:
+            with open(args.report, "w") as f_out:
+                json.dump({"input_bytes": size, "modes": results}, f_out, indent=2)
+            print(f"Results in: {args.report}")
+        unsafe = unsafe_cuts()
+        for text, pos in unsafe:
+            print(f"UNSAFE CUT: {text[:pos]!r} | {text[pos:]!r}")
+        if not unsafe:
+            print(f"Cuts of the {len(cut_samples)} date and time samples: all safe")
+        if unsafe or any(result["different_files"] for result in results.values()):
+            sys.exit(1)
+    finally:
+        if args.keep:
+            print(f"Outputs kept in: {work_root}")
+        else:
+            shutil.rmtree(work_root)
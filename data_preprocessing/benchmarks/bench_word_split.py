@@ -0,0 +1,112 @@
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from handlers.word_handler import word_new_line
+
+words = [
+    "the",
+    "tokenizer",
+    "CF:D:2020-01-05",
+    "https://www.apple.com/in/",
+    "@elonmusk",
+    "#nlpisgreat",
+    "don't",
+    ":)",
+    "state-of-the-art",
+    "U.S.A.",
+    "Jäger",
+    "naïve",
+    "😀",
+    "end.",
+]
+spaces = [" "] * 20 + ["\n", "\t", "  ", "\n\n", "\xa0"]
+
+
+# Writes a synthetic input of about size_mb megabytes
+def generate_input(path, size_mb, seed=0):
+    rng = random.Random(seed)
+    block = "".join(rng.choice(words) + rng.choice(spaces) for _ in range(100000))
+    target = size_mb * 1024 * 1024
+    written = 0
+    with open(path, "w") as f_out:
+        while written < target:
+            f_out.write(block)
+            written += len(block.encode())
+
+
+# The word split as it used to be: one re.sub and one write per character
+def legacy_word_new_line(input_file, output_file):
+    with open(output_file, "w") as f_out:
+        with open(input_file, "r") as f_in:
+            [
+                f_out.write(
+                    re.sub(
+                        r"^\s*$",
+                        "\n",
+                        row,
+                        flags=re.MULTILINE,
+                    )
+                )
+                for row in f_in.read()
+            ]
+    return output_file
+
+
+# Runs a word split function and returns the time it took
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Word split benchmark")
+    parser.add_argument("--size-mb", type=int, default=100)
+    parser.add_argument("--input", help="benchmark on this file instead")
+    parser.add_argument(
+        "--legacy-mb",
+        type=int,
+        default=None,
+        help="run the old word split on the first MB only and extrapolate",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        input_file = args.input and os.path.abspath(args.input)
+        os.chdir(work_dir)
+        os.makedirs("inter_files")
+        if not input_file:
+            input_file = "input.txt"
+            generate_input(input_file, args.size_mb)
+        size = os.path.getsize(input_file) / (1024 * 1024)
+        print(f"Input: {size:.1f} MB")
+
+        new_time = timed(word_new_line, input_file)
+        print(f"word_new_line:        {new_time:8.2f} s  {size / new_time:8.2f} MB/s")
+
+        legacy_input = input_file
+        legacy_size = size
+        if args.legacy_mb and args.legacy_mb < size:
+            legacy_input = "legacy_input.txt"
+            with open(input_file, "r") as f_in, open(legacy_input, "w") as f_out:
+                f_out.write(f_in.read(args.legacy_mb * 1024 * 1024))
+            legacy_size = os.path.getsize(legacy_input) / (1024 * 1024)
+        legacy_time = timed(legacy_word_new_line, legacy_input, "legacy_split.txt")
+        legacy_time *= size / legacy_size
+        print(
+            f"legacy (per char):    {legacy_time:8.2f} s  {size / legacy_time:8.2f} MB/s"
+        )
+        print(f"Speedup: {legacy_time / new_time:.1f}x")
+
+        if legacy_input == input_file:
+            with open("inter_files/split_words.txt") as new, open(
+                "legacy_split.txt"
+            ) as old:
+                print("Same output:", new.read() == old.read())
@@ -0,0 +1,139 @@
+import argparse
+import random
+
+words = (
+    "the report was published by a team of researchers in and results show that new "
+    "method is faster than old one we met at office to discuss next steps data model "
+    "people said it will be ready soon"
+).split()
+
+# Pieces of every kind of token, a piece replaces a word of the text
+pieces = {
+    "html": [
+        "<p>",
+        "</p>",
+        "<br/>",
+        '<div class="note">',
+        "</div>",
+        '<a href="https://example.com/page">link</a>',
+        "<b>bold</b>",
+        "<span id='x1'>",
+        "</span>",
+    ],
+    "dates": [
+        "5 January 2020",
+        "12/05/2021",
+        "2020-03-07",
+        "March 5, 2019",
+        "5th Jan 2020",
+        "12.05.20",
+        "31-12-1999",
+    ],
+    "times": ["7:30 pm IST", "19:00", "7pm", "7 a.m. UTC", "10.30 am", "12:45:30 PDT"],
+    "urls": [
+        "https://www.example.com/news/2020/story.html",
+        "http://site.org/a?b=c&d=e",
+        "www.test.co.in",
+        "https://docs.python.org/3/library/re.html#module-re",
+    ],
+    "mentions": ["@alice", "@bob_smith", "@NLP_lab", "@user2020"],
+    "hashtags": ["#NLProc", "#python", "#DataScience", "#tbt", "#COVID19"],
+    "clitics": ["don't", "it's", "we'll", "I'm", "they've", "can't", "she'd"],
+    "emoticons": [":)", ":-(", ";)", ":D", "<3", ":P", "😂", "👍", "🎉", "❤️"],
+    "hyphens": ["state-of-the-art", "well-known", "e-mail", "long-term", "co-author"],
+    "abbreviations": ["U.S.A.", "e.g.", "Dr.", "etc.", "Ph.D.", "U.K.", "i.e."],
+}
+
+# Share of the words replaced by a piece of every kind, when none is given
+default_densities = {
+    "html": 0.04,
+    "dates": 0.02,
+    "times": 0.02,
+    "urls": 0.02,
+    "mentions": 0.02,
+    "hashtags": 0.02,
+    "clitics": 0.03,
+    "emoticons": 0.02,
+    "hyphens": 0.02,
+    "abbreviations": 0.02,
+}
+
+sentence_ends = [".", ".", ".", "!", "?"]
+
+
+# Densities from "kind=share" strings, on top of the default ones
+def parse_densities(items):
+    densities = dict(default_densities)
+    for item in items or []:
+        kind, _, share = item.partition("=")
+        if kind not in pieces:
+            raise ValueError(f"Unknown token kind: {kind} (one of {', '.join(pieces)})")
+        densities[kind] = float(share)
+    if sum(densities.values()) > 1:
+        raise ValueError("The densities add up to more than 1")
+    return densities
+
+
+# Sentences of synthetic text, the same ones for the same seed and densities
+# Every word is replaced by a piece of a kind with the density of that kind
+def generate_sentences(densities=None, seed=0):
+    rng = random.Random(seed)
+    densities = densities or default_densities
+    kinds = [kind for kind in pieces if densities.get(kind)]
+    bounds = []
+    total = 0.0
+    for kind in kinds:
+        total += densities[kind]
+        bounds.append(total)
+    while True:
+        sentence = []
+        for _ in range(rng.randint(5, 25)):
+            roll = rng.random()
+            for kind, bound in zip(kinds, bounds):
+                if roll < bound:
+                    sentence.append(rng.choice(pieces[kind]))
+                    break
+            else:
+                sentence.append(rng.choice(words))
+        sentence[0] = sentence[0][:1].upper() + sentence[0][1:]
+        text = " ".join(sentence) + " " + rng.choice(sentence_ends)
+        roll = rng.random()
+        yield text + ("\n\n" if roll < 0.05 else "\n" if roll < 0.3 else " ")
+
+
+# Writes about size_mb megabytes of synthetic text to output_file, block by block
+def write_corpus(output_file, size_mb, densities=None, seed=0, block_size=1 << 20):
+    size = 0
+    target = size_mb * 1024 * 1024
+    with open(output_file, "w", encoding="utf-8") as f_out:
+        block = []
+        block_bytes = 0
+        for sentence in generate_sentences(densities, seed):
+            block.append(sentence)
+            block_bytes += len(sentence.encode("utf-8"))
+            if block_bytes >= block_size or size + block_bytes >= target:
+                f_out.write("".join(block))
+                size += block_bytes
+                block = []
+                block_bytes = 0
+                if size >= target:
+                    break
+    return output_file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic corpus generator")
+    parser.add_argument("output_file")
+    parser.add_argument("--size-mb", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--density",
+        action="append",
+        metavar="KIND=SHARE",
+        help=f"share of the words of a kind ({', '.join(pieces)}), can be repeated",
+    )
+    args = parser.parse_args()
+    write_corpus(
+        args.output_file, args.size_mb, parse_densities(args.density), args.seed
+    )
+    print(f"Corpus written to {args.output_file}")
@@ -1,20 +1,49 @@
+from handlers.artifact_store import open_artifact
+
+
+# Writes a single standard output file: the token count followed by one token per line
+def write_std_out(output_file, count, tokens):
+    with open_artifact(output_file, "w") as f_out:
+        f_out.write(f"{count}" + "\n")
+        for token in tokens:
+            f_out.write(token + "\n")
+    return output_file
+
+
+# Size of the blocks of lines read from the standard output files at once
+read_size = 1 << 18
+
+
+# Lines of a standard output file after its count line, stripped, without the blank ones
+# The file is read in blocks of lines so that a large file is never held in memory
+def std_out_tokens(std_file):
+    with open_artifact(std_file, "r") as f_in:
+        f_in.readline()
+        while True:
+            lines = f_in.readlines(read_size)
+            if not lines:
+                break
+            yield [token for token in (line.strip() for line in lines) if token]
+
+
+# Merges the standard output files into the master output: the total count, then the
+# tokens of every file in order. The counts are read first, so the tokens are copied
+# block by block instead of being collected in memory. The standard output files are read
+# from the active store if there is one, the master output is always a plain file
 def create_master_std_out(std_files, output_file):
     total_tokens = 0
-    all_tokens = []
 
     for file in std_files:
-        with open(file, "r") as f_in:
+        with open_artifact(file, "r") as f_in:
             int_line = f_in.readline().strip()
             if int_line.isdigit():
                 total_tokens += int(int_line)
             else:
                 print(f"Warning: Skipping non-integer count in {file}")
 
-            tokens_from_file = [line.strip() for line in f_in if line.strip()]
-            all_tokens.extend(tokens_from_file)
-
     with open(output_file, "w") as f_out:
         f_out.write(f"{total_tokens}" + "\n")
-        for token in all_tokens:
-            f_out.write(token + "\n")
+        for file in std_files:
+            for tokens in std_out_tokens(file):
+                f_out.write("".join(token + "\n" for token in tokens))
     return output_file
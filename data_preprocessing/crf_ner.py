@@ -0,0 +1,309 @@
+import argparse
+import ast
+import hashlib
+import os
+import random
+import re
+import shutil
+import pycrfsuite
+from handlers.lexicon import load_lexicon
+from stanford_ner import sentence_ends, split_sentences
+
+# Trained model of the crf NER mode, TOKENIZER_CRF_NER_MODEL points to another one
+# No model is shipped under this name, one has to be trained on real tags first
+default_model = os.environ.get(
+    "TOKENIZER_CRF_NER_MODEL",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "crf_ner_model.crfsuite"),
+)
+
+# Demo model trained on the synthetic sentences below (python crf_ner.py --synthetic 5000)
+# It mostly looks the names up in the gazetteer, so it is only for trying the crf mode
+demo_model = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "crf_ner_demo.crfsuite"
+)
+
+# Entity classes of single word names (lexicons/gazetteer.tsv), eg; "Jordan" -> "LOCATION PERSON"
+gazetteer = load_lexicon("gazetteer")
+
+# Number of distinct words whose features are remembered before the cache is reset
+cache_size = 200000
+
+# Sentence templates of the synthetic training data, a slot (PERSON, LOCATION or
+# ORGANIZATION) is replaced by a name of that class of the gazetteer. The other words are
+# O, capitalized ones included, so that a capital letter alone does not make a name
+templates = [
+    "PERSON PERSON visited LOCATION on Monday .",
+    "The ORGANIZATION office in LOCATION was closed .",
+    "PERSON said the ORGANIZATION report was late .",
+    "Yesterday PERSON moved from LOCATION to LOCATION !",
+    "Shares of ORGANIZATION rose after the news from LOCATION .",
+    "Did PERSON join ORGANIZATION last year ?",
+    "A new bridge opened near LOCATION this week .",
+    "Most people in LOCATION voted for PERSON .",
+    "The Report was Published by ORGANIZATION in March .",
+    "We met PERSON and PERSON at the airport .",
+    "According to PERSON , the Government of LOCATION will act soon .",
+    "ORGANIZATION announced a deal with ORGANIZATION on Friday .",
+    "In January , PERSON PERSON flew to LOCATION for the Summit .",
+    "The Prime Minister thanked PERSON for the work .",
+    "This Week in LOCATION : Rain , Traffic and Elections .",
+    "PERSON , who leads ORGANIZATION , lives in LOCATION .",
+    "Police in LOCATION said on Tuesday that PERSON was safe .",
+    "Read More about ORGANIZATION and its plans .",
+    "The study of 120 patients in 2020 found that HDRS scores fell by 12 % .",
+    "Table 3 shows the results of the MDD group ( n = 45 ) .",
+    "Within 6 weeks , Symptoms of Anxiety improved in LOCATION .",
+    "PERSON wrote about Schizophrenia and Depression in the Journal .",
+    "Figure 2 : Sales of ORGANIZATION from 2015 to 2019 .",
+]
+
+
+class CRFNERTagger:
+    """CRF based named entity tagger that runs in process, without a JVM
+
+    Same feature engineering as CRFPOSTagger (pos_using_crf/llm_crf): the word, its shape,
+    prefixes and suffixes, orthographic flags and the words around it, plus the gazetteer
+    classes of the word and of its neighbours. The features of a word do not depend on its
+    place in the sentence, so they are built once per distinct word
+    Tags are the ones of the Stanford 3 class model: PERSON, LOCATION, ORGANIZATION and O
+    """
+
+    def __init__(self, model_file=default_model):
+        self.tagger = None
+        self.model_file = None
+        self.model_id = None
+        self.cache = {}
+        self.params = {
+            "c1": 0.1,  # L1 regularization coefficient
+            "c2": 0.1,  # L2 regularization coefficient
+            "max_iterations": 100,
+            "feature.possible_transitions": True,
+        }
+        if model_file:
+            self.load(model_file)
+
+    def get_word_shape(self, word):
+        """Word shape, eg; 'Pune' -> 'Xxxx', '2020' -> 'dddd'"""
+        shape = re.sub(r"[A-Z]", "X", word)
+        shape = re.sub(r"[a-z]", "x", shape)
+        return re.sub(r"\d", "d", shape)
+
+    def get_short_shape(self, shape):
+        """Word shape without repeated characters, eg; 'Xxxx' -> 'Xx'"""
+        return re.sub(r"(.)\1+", r"\1", shape)
+
+    def word_features(self, word):
+        """Features of a word on its own, and as the previous and the next word
+        Features are "name=value" strings, a flag is only present when it is true"""
+        features = self.cache.get(word)
+        if features is not None:
+            return features
+        lower = word.lower()
+        shape = self.get_word_shape(word)
+        classes = gazetteer.get(word, gazetteer.get(word.capitalize(), "")).split()
+        own = [
+            "bias",
+            "word.lower()=" + lower,
+            "word.length=" + str(min(len(word), 10)),
+            "word.shape=" + shape,
+            "word.short_shape=" + self.get_short_shape(shape),
+        ]
+        own += [f"word.prefix-{n}=" + word[:n] for n in (1, 2, 3) if len(word) >= n]
+        own += [f"word.suffix-{n}=" + word[-n:] for n in (1, 2, 3, 4) if len(word) >= n]
+        flags = {
+            "word.isupper()": word.isupper(),
+            "word.istitle()": word.istitle(),
+            "word.isdigit()": word.isdigit(),
+            "word.isalpha()": word.isalpha(),
+            "has.digit": any(char.isdigit() for char in word),
+            "has.hyphen": "-" in word,
+            "has.punctuation": re.search(r"[^\w\s]", word) is not None,
+        }
+        own += [name for name, value in flags.items() if value]
+        own += ["gazetteer=" + entity_class for entity_class in classes]
+        context = [
+            "word.lower()=" + lower,
+            "word.suffix-3=" + word[-3:],
+            "word.short_shape=" + self.get_short_shape(shape),
+        ]
+        context += [
+            name for name in ("word.istitle()", "word.isupper()") if flags[name]
+        ]
+        context += ["gazetteer=" + entity_class for entity_class in classes]
+        features = (
+            tuple(own),
+            tuple("-1:" + feature for feature in context),
+            tuple("+1:" + feature for feature in context),
+            lower,
+        )
+        if len(self.cache) >= cache_size:
+            self.cache.clear()
+        self.cache[word] = features
+        return features
+
+    def sent2features(self, sent):
+        """Features of every word of a sentence (a list of words)"""
+        words = [self.word_features(word) for word in sent]
+        sequence = []
+        for i, (own, _, _, lower) in enumerate(words):
+            features = list(own)
+            if i > 0:
+                features += words[i - 1][1]
+                features.append("word[-1,0]=" + words[i - 1][3] + "_" + lower)
+            else:
+                features.append("BOS")
+            if i < len(words) - 1:
+                features += words[i + 1][2]
+                features.append("word[0,+1]=" + lower + "_" + words[i + 1][3])
+            else:
+                features.append("EOS")
+            sequence.append(features)
+        return sequence
+
+    def train(self, train_sentences, model_file, params=None):
+        """Trains the model on sentences of (word, tag) pairs, saves it and loads it"""
+        trainer = pycrfsuite.Trainer(verbose=False)
+        for sent in train_sentences:
+            words = [word for word, _ in sent]
+            labels = [label for _, label in sent]
+            trainer.append(self.sent2features(words), labels)
+        trainer.set_params(params or self.params)
+        trainer.train(model_file)
+        self.load(model_file)
+
+    def save(self, model_file):
+        """Copies the trained model to another file"""
+        shutil.copyfile(self.model_file, model_file)
+        return model_file
+
+    def load(self, model_file):
+        """Loads a trained model"""
+        if not os.path.exists(model_file):
+            raise FileNotFoundError(
+                f"No CRF NER model at {model_file}, train one with: "
+                "python crf_ner.py <training file> --model <model file> "
+                "(eg; the 612203120_NE-Dict.txt of a Stanford run), or try the demo "
+                f"model trained on synthetic sentences: TOKENIZER_CRF_NER_MODEL={demo_model}"
+            )
+        self.tagger = pycrfsuite.Tagger()
+        self.tagger.open(model_file)
+        self.model_file = model_file
+        with open(model_file, "rb") as f_in:
+            self.model_id = "crf " + hashlib.blake2b(f_in.read()).hexdigest()
+
+    def predict(self, sentences):
+        """Tags of every word of every sentence (lists of words)"""
+        return [self.tagger.tag(self.sent2features(sent)) for sent in sentences]
+
+    def tag(self, tokens):
+        """Tags a stream of tokens sentence by sentence, returns (token, tag) pairs
+        Same interface as the Stanford tagger of stanford_ner"""
+        tagged = []
+        for sentence in split_sentences(tokens):
+            tagged += zip(sentence, self.tagger.tag(self.sent2features(sentence)))
+        return tagged
+
+    def tag_sentences(self, sentences):
+        """(token, tag) pairs of every sentence (a list of tokens), each one tagged as a
+        whole even if it does not end with a sentence end"""
+        return [
+            list(zip(sentence, self.tagger.tag(self.sent2features(sentence))))
+            for sentence in sentences
+        ]
+
+    def close(self):
+        if self.tagger is not None:
+            self.tagger.close()
+            self.tagger = None
+
+
+# Synthetic tagged sentences built from the templates and the gazetteer
+def generate_sentences(count, seed=0):
+    rng = random.Random(seed)
+    names = {}
+    for word in gazetteer.keys():
+        for entity_class in gazetteer.get(word).split():
+            names.setdefault(entity_class, []).append(word)
+    sentences = []
+    for _ in range(count):
+        sentence = []
+        for word in rng.choice(templates).split():
+            if word in names:
+                sentence.append((rng.choice(names[word]), word))
+            else:
+                sentence.append((word, "O"))
+        sentences.append(sentence)
+    return sentences
+
+
+# Training sentences from a file of word_TAG lines (the format of the CRF POS tagger)
+def load_data(filename):
+    sentences = []
+    with open(filename, "r", encoding="utf-8") as f_in:
+        for line in f_in:
+            sentence = [
+                tuple(token.rsplit("_", 1)) for token in line.split() if "_" in token
+            ]
+            if sentence:
+                sentences.append(sentence)
+    return sentences
+
+
+# Training sentences from the NE dictionary of an earlier Stanford run
+# (612203120_NE-Dict.txt: the count, then one ('token', 'TAG') per line)
+def load_ne_dict(filename):
+    sentences = []
+    sentence = []
+    with open(filename, "r", encoding="utf-8") as f_in:
+        f_in.readline()
+        for line in f_in:
+            token, tag = ast.literal_eval(line)
+            sentence.append((token, tag))
+            if token in sentence_ends:
+                sentences.append(sentence)
+                sentence = []
+    if sentence:
+        sentences.append(sentence)
+    return sentences
+
+
+# Trains a model: python crf_ner.py 612203120_NE-Dict.txt --model crf_ner_model.crfsuite
+# The demo model shipped next to this file is the synthetic one: python crf_ner.py --synthetic 5000
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the CRF NER tagger")
+    parser.add_argument(
+        "train_file",
+        nargs="?",
+        help="NE dictionary of a Stanford run, or word_TAG lines",
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        metavar="SENTENCES",
+        help="train on sentences built from the templates and the gazetteer instead",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--model",
+        default=None,
+        help="model file (default: crf_ner_model.crfsuite, crf_ner_demo.crfsuite with --synthetic)",
+    )
+    args = parser.parse_args()
+    if not args.train_file and not args.synthetic:
+        parser.error("give a training file or --synthetic")
+
+    if args.synthetic:
+        train_sentences = generate_sentences(args.synthetic, args.seed)
+        model_file = args.model or demo_model
+    else:
+        model_file = args.model or default_model
+        with open(args.train_file, "r", encoding="utf-8") as f_in:
+            is_ne_dict = f_in.readline().strip().isdigit()
+        if is_ne_dict:
+            train_sentences = load_ne_dict(args.train_file)
+        else:
+            train_sentences = load_data(args.train_file)
+    print(f"Training on {len(train_sentences)} sentences...")
+    tagger = CRFNERTagger(model_file=None)
+    tagger.train(train_sentences, model_file)
+    print(f"Model saved to {model_file}")
@@ -1,7 +1,160 @@
-import re
-import string
+import argparse
 from tokenize_pipeline import tokenize
+from handlers.chunk_stream import default_chunk_size
+from disk_cache import default_cache_mb
+from feed_ingest import default_field
+from handlers.artifact_store import store_kinds
 
 # My main.py file for this project
 if __name__ == "__main__":
-    tokenize()
+    parser = argparse.ArgumentParser(description="Custom Tokenizer")
+    parser.add_argument(
+        "--single-pass",
+        action="store_true",
+        help="run the one pass lexer instead of the stage by stage pipeline",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="make every stage read its input in chunks (flat memory on large corpora)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="lex the input in shards with this many worker processes",
+    )
+    parser.add_argument(
+        "--graph",
+        action="store_true",
+        help="run the stages as a graph passing in memory buffers instead of files",
+    )
+    parser.add_argument(
+        "--spill",
+        action="store_true",
+        help="with --graph, also write the intermediate buffers to inter_files (debugging)",
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="keep the tokens as offsets into the input, saved to a token index file",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="cache the tokens of every paragraph on disk and only lex the changed ones",
+    )
+    parser.add_argument(
+        "--cache-mb",
+        type=int,
+        default=default_cache_mb,
+        help="size limit of the paragraph and NER caches, old entries are dropped first",
+    )
+    parser.add_argument(
+        "--html-parser",
+        action="store_true",
+        help="convert the input from HTML to text first (drops scripts, decodes entities)",
+    )
+    parser.add_argument(
+        "--feed",
+        action="append",
+        metavar="FILE",
+        help="tokenize the records of a CSV, TSV or JSONL file (no prompt), can be repeated",
+    )
+    parser.add_argument(
+        "--field",
+        default=default_field,
+        help="field of the feed records that holds their text",
+    )
+    parser.add_argument(
+        "--id-field",
+        default=None,
+        help="field of the feed records that holds their id (default: file:record number)",
+    )
+    parser.add_argument(
+        "--guarded",
+        action="store_true",
+        help="cut runs without blank spaces to 256 characters (no slow regex on bad pages)",
+    )
+    parser.add_argument(
+        "--store",
+        choices=store_kinds,
+        default=None,
+        help="keep the intermediate files in memory, on tmpfs or gzip compressed (deleted at the end)",
+    )
+    parser.add_argument(
+        "--store-quota-mb",
+        type=float,
+        default=None,
+        help="size limit of the intermediate files of --store, the run fails if it is reached",
+    )
+    parser.add_argument(
+        "--store-dir",
+        default=None,
+        help="folder of the tmpfs (default /dev/shm) or compressed (default inter_files) store",
+    )
+    parser.add_argument(
+        "--token-ids",
+        action="store_true",
+        help="also write the master output as a vocabulary and arrays of token ids",
+    )
+    parser.add_argument(
+        "--ner",
+        choices=["stanford", "crf"],
+        default=None,
+        help="NER tagger: the Stanford NER server (Java) or the in process CRF tagger (needs a model trained with crf_ner.py, the shipped crf_ner_demo.crfsuite is a demo)",
+    )
+    parser.add_argument(
+        "--sentences",
+        action="store_true",
+        help="split the input into sentences, NER then tags them in the order of the text (without it NER cuts the master output, grouped by type, at its . tokens)",
+    )
+    parser.add_argument(
+        "--ner-cache",
+        action="store_true",
+        help="cache the NER tags of every sentence on disk, only new sentences are tagged",
+    )
+    parser.add_argument(
+        "--metrics",
+        nargs="?",
+        const="basic",
+        choices=["basic", "memory", "off"],
+        default=None,
+        help="write a per stage metrics report, memory also traces peak memory (slower)",
+    )
+    parser.add_argument(
+        "--metrics-format",
+        choices=["json", "csv"],
+        default="json",
+        help="format of the metrics report",
+    )
+    args = parser.parse_args()
+    if args.ner_cache and not args.sentences:
+        parser.error(
+            "--ner-cache needs --sentences (the cache keeps the tags of sentences)"
+        )
+    chunk_size = default_chunk_size if args.stream else None
+    tokenize(
+        single_pass=args.single_pass,
+        chunk_size=chunk_size,
+        jobs=args.jobs,
+        metrics=args.metrics,
+        metrics_format=args.metrics_format,
+        graph=args.graph,
+        spill=args.spill,
+        index=args.index,
+        incremental=args.incremental,
+        cache_mb=args.cache_mb,
+        token_ids=args.token_ids,
+        ner=args.ner,
+        ner_cache=args.ner_cache,
+        html_parser=args.html_parser,
+        guarded=args.guarded,
+        feeds=args.feed,
+        feed_field=args.field,
+        feed_id_field=args.id_field,
+        store=args.store,
+        store_quota_mb=args.store_quota_mb,
+        store_dir=args.store_dir,
+        sentences=args.sentences,
+    )
@@ -0,0 +1,101 @@
+import sqlite3
+
+# Size of the cache files in MB when none is given
+default_cache_mb = 1024
+
+# Number of keys looked up or stored in a single query
+batch_size = 500
+
+
+class DiskCache:
+    """Persistent key value store in a SQLite file, bounded in size
+
+    Every entry records when it was last read or written. When the values go over
+    max_bytes the entries that were used the longest time ago are dropped first,
+    down to 90% of max_bytes so that eviction does not run on every write
+    """
+
+    def __init__(self, path, max_bytes=default_cache_mb * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key BLOB PRIMARY KEY, value BLOB, size INTEGER, used INTEGER)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS entries_used ON entries (used)"
+        )
+        used, total = self.connection.execute(
+            "SELECT MAX(used), SUM(size) FROM entries"
+        ).fetchone()
+        self.clock = (used or 0) + 1
+        self.total = total or 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get_many(self, keys):
+        """Values of the keys that are in the cache, as a dict, marked as used"""
+        found = {}
+        keys = list(keys)
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i : i + batch_size]
+            marks = ",".join("?" * len(batch))
+            found.update(
+                self.connection.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({marks})", batch
+                )
+            )
+        self.connection.executemany(
+            "UPDATE entries SET used = ? WHERE key = ?",
+            ((self.clock, key) for key in found),
+        )
+        self.clock += 1
+        self.connection.commit()
+        return found
+
+    def put_many(self, items):
+        """Stores (key, value) pairs, then drops old entries if the cache is too big"""
+        for i in range(0, len(items), batch_size):
+            batch = items[i : i + batch_size]
+            marks = ",".join("?" * len(batch))
+            keys = [key for key, _ in batch]
+            replaced = self.connection.execute(
+                f"SELECT SUM(size) FROM entries WHERE key IN ({marks})", keys
+            ).fetchone()[0]
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                ((key, value, len(value), self.clock) for key, value in batch),
+            )
+            self.total += sum(len(value) for _, value in batch) - (replaced or 0)
+        self.clock += 1
+        self.evict()
+        self.connection.commit()
+
+    def evict(self):
+        """Drops the least recently used entries until the cache fits in max_bytes"""
+        if self.total <= self.max_bytes:
+            return
+        target = self.max_bytes * 9 // 10
+        while self.total > target:
+            oldest = self.connection.execute(
+                "SELECT key, size FROM entries ORDER BY used LIMIT ?", (batch_size,)
+            ).fetchall()
+            if not oldest:
+                break
+            for key, size in oldest:
+                if self.total <= target:
+                    break
+                self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.total -= size
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,173 @@
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+from handlers.artifact_store import open_artifact
+from lexer import lex_text, group_tokens, std_out_parts, token_types
+from create_std_out import create_master_std_out
+from handlers.html_tag_handler import html_text
+from handlers.long_word_handler import split_long_words
+
+# Formats of the feed files, from their extension
+feed_formats = {
+    ".csv": "csv",
+    ".tsv": "tsv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+}
+
+# Field of a record that holds its text, the column written by the article scraper
+default_field = "body"
+
+# Token file of the feed mode: one "record id<TAB>token type<TAB>token" line per token
+records_file = "612203120_assign2_records.tsv"
+
+
+# Format of a feed file, given or from its extension
+def feed_format(feed_file, fmt=None):
+    fmt = fmt or feed_formats.get(os.path.splitext(feed_file)[1].lower())
+    if fmt not in ("csv", "tsv", "jsonl"):
+        raise ValueError(f"Unknown feed format for {feed_file}, use csv, tsv or jsonl")
+    return fmt
+
+
+# Value of a field of a JSON record, a dotted name looks into nested objects
+def json_field(record, field):
+    for key in field.split("."):
+        if not isinstance(record, dict) or key not in record:
+            return None
+        record = record[key]
+    return record
+
+
+# Records of a feed file as (record id, text), read one at a time
+# The text is the field given (all the columns joined, like csv_to_txt, if field is None)
+# The record id is the id field if given, else the file name and the record number
+def read_records(feed_file, field=default_field, id_field=None, fmt=None):
+    fmt = feed_format(feed_file, fmt)
+    name = os.path.basename(feed_file)
+    with open(feed_file, "r", newline="" if fmt != "jsonl" else None) as f_in:
+        if fmt == "jsonl":
+            rows = (json.loads(line) for line in f_in if line.strip())
+        else:
+            csv.field_size_limit(sys.maxsize)
+            rows = csv.DictReader(f_in, delimiter="\t" if fmt == "tsv" else ",")
+            if field and field not in (rows.fieldnames or []):
+                raise ValueError(
+                    f"No {field} column in {feed_file}, columns: {rows.fieldnames}"
+                )
+        skipped = 0
+        for number, row in enumerate(rows, 1):
+            if field is None:
+                values = row.values() if isinstance(row, dict) else [row]
+                text = " ".join(str(value) for value in values if value is not None)
+            elif fmt == "jsonl":
+                text = json_field(row, field)
+            else:
+                text = row[field]
+            if text is None:
+                skipped += 1
+                continue
+            record_id = None
+            if id_field:
+                record_id = (
+                    json_field(row, id_field) if fmt == "jsonl" else row.get(id_field)
+                )
+            if record_id is None:
+                record_id = f"{name}:{number}"
+            # The id is a column of the records file, it cannot hold a tab or a newline
+            record_id = " ".join(str(record_id).split())
+            yield record_id, str(text)
+    if skipped:
+        print(f"{skipped} records of {feed_file} without a {field} field skipped")
+
+
+# Tokenizes the records of one or more feed files, record by record
+# Writes the standard output files (like the other modes, over all the records) and the
+# records file, where every token keeps the id of its record. The lines of the standard
+# outputs are spooled to temporary files, only one record is held in memory at a time
+# html_parser and guarded work like the options of the same name of tokenize(), per record
+def tokenize_feeds(
+    feed_files,
+    out_dir="std_outs",
+    field=default_field,
+    id_field=None,
+    fmt=None,
+    output_file=records_file,
+    html_parser=False,
+    guarded=False,
+):
+    os.makedirs(out_dir, exist_ok=True)
+    counts = {token_type: 0 for token_type in token_types}
+    spools = {token_type: tempfile.TemporaryFile("w+") for token_type in token_types}
+    record_count = 0
+    try:
+        with open(output_file, "w") as f_records:
+            for feed_file in feed_files:
+                for record_id, text in read_records(feed_file, field, id_field, fmt):
+                    record_count += 1
+                    if html_parser:
+                        text = html_text(text)
+                    if guarded:
+                        text = split_long_words(text)
+                    typed_tokens = list(lex_text(text))
+                    f_records.write(
+                        "".join(
+                            f"{record_id}\t{token_type}\t{token}\n"
+                            for token_type, token in typed_tokens
+                        )
+                    )
+                    parts = std_out_parts(group_tokens(typed_tokens))
+                    for token_type, (count, lines) in parts.items():
+                        counts[token_type] += count
+                        spools[token_type].write("".join(line + "\n" for line in lines))
+        std_files = []
+        for token_type in token_types:
+            std_file = os.path.join(out_dir, f"std_out_{token_type}.txt")
+            spools[token_type].seek(0)
+            with open_artifact(std_file, "w") as f_out:
+                f_out.write(f"{counts[token_type]}" + "\n")
+                shutil.copyfileobj(spools[token_type], f_out)
+            std_files.append(std_file)
+    finally:
+        for spool in spools.values():
+            spool.close()
+    print(f"{record_count} records tokenized from {len(feed_files)} feed files")
+    return std_files, output_file
+
+
+# Tokenizes feed files without any prompt:
+# python feed_ingest.py output.csv more.jsonl --field body --id-field url
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tokenize CSV or JSONL feeds")
+    parser.add_argument("feed_files", nargs="+")
+    parser.add_argument(
+        "--field", default=default_field, help="field holding the text of a record"
+    )
+    parser.add_argument(
+        "--all-fields", action="store_true", help="join all the fields of a record"
+    )
+    parser.add_argument("--id-field", help="field holding the id of a record")
+    parser.add_argument("--format", choices=["csv", "tsv", "jsonl"])
+    parser.add_argument("--out-dir", default="std_outs")
+    parser.add_argument("--html-parser", action="store_true")
+    parser.add_argument("--guarded", action="store_true")
+    args = parser.parse_args()
+
+    std_files, token_file = tokenize_feeds(
+        args.feed_files,
+        args.out_dir,
+        None if args.all_fields else args.field,
+        args.id_field,
+        args.format,
+        html_parser=args.html_parser,
+        guarded=args.guarded,
+    )
+    for std_file in std_files:
+        print(f"Tokens extracted into: {std_file}")
+    print(f"Tokens with their record ids in: {token_file}")
+    master_output = create_master_std_out(std_files, "612203120_assign2_output.txt")
+    print(f"Final Tokenization result in: {master_output}")
@@ -1,15 +1,120 @@
 import re
+from handlers.artifact_store import open_artifact
+from handlers.chunk_stream import stream_findall, stream_std_out, stream_sub
+from handlers.lexicon import alternation, char_class, load_lexicon
+
+# Lexicon of the other abbreviations (lexicons/abbreviations.tsv) eg; e.g., Dr., Ph.D.
+abbreviations_lexicon = load_lexicon("abbreviations")
 
 # Regex pattern for extracting abbreviations of the type: U.S.A., CH.
-regex = r"(?:[A-Z]+\.)+"
+# A match never starts after a capital letter (it would have started at that letter), the
+# lookbehind keeps a long run of capitals from being scanned again from every letter
+regex = r"(?<![A-Z])(?:[A-Z]+\.)+"
+
+# Matches the slice given to its match method, turns a span into a match object
+whole = re.compile(".*", re.DOTALL)
+word_char = re.compile(r"\w")
+
+
+class AbbreviationPattern:
+    """Finds the abbreviations of a text with the methods of a compiled regex (finditer,
+    findall, sub, search, match, fullmatch)
+
+    The dotted capitals are found by regex, the words of the lexicon by walking its trie
+    from every word start that begins like a key. A key must be a whole word: it is not
+    preceded nor followed by a word character, the longest such key wins, also over the
+    dotted capitals found at the same start (eg; M.Sc. against M.). The scan costs
+    the length of the text whatever the size of the lexicon, and nothing is compiled from
+    the lexicon at startup
+    """
+
+    groups = 0
+
+    def __init__(self, lexicon):
+        self.lexicon = lexicon
+        self.capitals = re.compile(regex)
+        # A walk only starts where the first two characters begin a key
+        starts = []
+        for char in lexicon.next_chars():
+            follow = lexicon.next_chars(char)
+            if char in lexicon or not follow:
+                starts.append(re.escape(char))
+            else:
+                starts.append(re.escape(char) + char_class(follow))
+        scanner = f"(?P<capitals>{regex})"
+        if starts:
+            scanner += rf"|(?<!\w)(?={alternation(starts)})"
+        self.scanner = re.compile(scanner)
+
+    def word_end(self, text, pos):
+        """End of the longest key at pos that is not followed by a word character"""
+        found = None
+        for end in self.lexicon.ends(text, pos):
+            if end == len(text) or not word_char.match(text, end):
+                found = end
+        return found
+
+    def finditer(self, text):
+        pos = 0
+        while True:
+            match = self.scanner.search(text, pos)
+            if match is None:
+                return
+            if match.group("capitals") is None:
+                end = self.word_end(text, match.start())
+                if end is None:
+                    pos = match.start() + 1
+                    continue
+                match = whole.match(text, match.start(), end)
+            elif not match.start() or not word_char.match(text, match.start() - 1):
+                # The capitals branch is tried first, a longer key at the same start wins
+                end = self.word_end(text, match.start())
+                if end is not None and end > match.end():
+                    match = whole.match(text, match.start(), end)
+            yield match
+            pos = match.end()
+
+    def findall(self, text):
+        return [match.group() for match in self.finditer(text)]
+
+    def sub(self, repl, text):
+        """Replaces every abbreviation by repl (a plain string, no group references)"""
+        pieces = []
+        pos = 0
+        for match in self.finditer(text):
+            pieces.append(text[pos : match.start()])
+            pieces.append(repl)
+            pos = match.end()
+        pieces.append(text[pos:])
+        return "".join(pieces)
+
+    def search(self, text):
+        return next(self.finditer(text), None)
+
+    def match(self, text):
+        match = self.search(text)
+        return match if match is not None and match.start() == 0 else None
+
+    def fullmatch(self, text):
+        match = self.capitals.fullmatch(text)
+        if match is None and text in self.lexicon:
+            match = whole.fullmatch(text)
+        return match
+
+
+# Abbreviations of both kinds, used in place of a compiled regex by the stages
+pattern = AbbreviationPattern(abbreviations_lexicon)
 
 
 # Extract abbreviations
-def extract_abbreviations(input_file):
+def extract_abbreviations(input_file, chunk_size=None):
     output_file = "std_outs/std_out_abbreviations.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
-            abbreviations = re.findall(regex, f_in.read())
+    if chunk_size:
+        tokens = stream_findall(input_file, pattern, chunk_size)
+        return stream_std_out(output_file, tokens)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
+            abbreviations = pattern.findall(f_in.read())
         f_out.write(f"{len(abbreviations)}" + "\n")
         for abbr in abbreviations:
             f_out.write(abbr + "\n")
@@ -17,11 +122,13 @@ def extract_abbreviations(input_file):
 
 
 # Remove abbreviations from the file for further tokenization
-def remove_abbreviations(input_file):
+def remove_abbreviations(input_file, chunk_size=None):
     output_file = "inter_files/no_abbreviations.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
+    if chunk_size:
+        return stream_sub(input_file, output_file, pattern, chunk_size)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
             row = f_in.read()
-            mod_content = re.sub(regex, "", row)
+            mod_content = pattern.sub("", row)
             f_out.write(mod_content)
     return output_file
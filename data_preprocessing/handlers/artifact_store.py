@@ -0,0 +1,321 @@
+import errno
+import gzip
+import io
+import os
+import shutil
+import tempfile
+
+# Folder of the intermediate files, every file under it is an artifact of the active store
+artifact_dir = "inter_files"
+
+# Folder of the standard output files, also artifacts of the active store: they are only
+# read to build the master output, which stays a plain file
+std_out_dir = "std_outs"
+
+# Environment variable that picks the store when tokenize() is not given one
+store_env = "TOKENIZER_ARTIFACT_STORE"
+
+# Backends of the stores, without a store the intermediate files are plain files
+store_kinds = ("memory", "tmpfs", "compressed")
+
+# Folder of the tmpfs store: a RAM backed file system on Linux
+tmpfs_dir = "/dev/shm"
+
+# Store the handlers read and write their intermediate files through, None for plain files
+active_store = None
+
+
+class QuotaWriter(io.BufferedIOBase):
+    """Binary stream of an artifact being written, every write is charged to its store
+
+    stored returns the bytes the backend holds so far (less than the bytes written for a
+    compressed file), finish completes the file and returns its final stored size
+    """
+
+    def __init__(self, store, name, stream, stored, finish):
+        self.store = store
+        self.name = name
+        self.stream = stream
+        self.stored = stored
+        self.finish = finish
+        self.length = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.stream.write(data)
+        self.length += len(data)
+        self.store.charge(self.name, self.stored(), self.length)
+        return len(data)
+
+    def flush(self):
+        if not self.stream.closed:
+            self.stream.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.store.charge(self.name, self.finish(), self.length)
+        finally:
+            super().close()
+
+
+class ArtifactStore:
+    """Intermediate files of a run, kept by a backend and bounded by a size quota
+
+    Keeps the bytes held by every artifact (the quota is checked on every write), the
+    bytes written to and read from the store and the peak size of the store. Closing the
+    store deletes all its artifacts
+    """
+
+    kind = None
+
+    def __init__(self, quota_mb=None):
+        self.quota = int(quota_mb * 1024 * 1024) if quota_mb else None
+        self.sizes = {}
+        self.lengths = {}
+        self.total = 0
+        self.peak = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __contains__(self, name):
+        return name in self.sizes
+
+    def charge(self, name, stored, length):
+        """Records the size of an artifact, fails if the store goes over its quota"""
+        self.total += stored - self.sizes.get(name, 0)
+        self.bytes_written += length - self.lengths.get(name, 0)
+        self.sizes[name] = stored
+        self.lengths[name] = length
+        self.peak = max(self.peak, self.total)
+        if self.quota is not None and self.total > self.quota:
+            raise OSError(
+                errno.EDQUOT,
+                f"Quota of the {self.kind} store ({self.quota} bytes) exceeded by {name}",
+            )
+
+    def open(self, name, mode="r", encoding=None, newline=None):
+        """File object of an artifact: "r" or "w", in text or binary ("rb", "wb") mode"""
+        if mode.replace("b", "").replace("t", "") not in ("r", "w"):
+            raise ValueError(f"Artifacts are opened to read or write, not {mode!r}")
+        if "w" in mode:
+            self.remove(name)
+            self.charge(name, 0, 0)
+            stream = QuotaWriter(self, name, *self.writer(name))
+        else:
+            if name not in self.sizes:
+                raise FileNotFoundError(errno.ENOENT, "No such artifact", name)
+            self.bytes_read += self.lengths[name]
+            stream = self.reader(name)
+        if "b" in mode:
+            return stream
+        return io.TextIOWrapper(stream, encoding=encoding, newline=newline)
+
+    def size(self, name):
+        """Size of an artifact in bytes, before compression"""
+        if name not in self.lengths:
+            raise FileNotFoundError(errno.ENOENT, "No such artifact", name)
+        return self.lengths[name]
+
+    def remove(self, name):
+        if name in self.sizes:
+            self.delete(name)
+            self.total -= self.sizes.pop(name)
+            del self.lengths[name]
+
+    def path(self, name):
+        """Plain file holding an artifact, None if it is only in memory or compressed"""
+        return None
+
+    def close(self):
+        for name in list(self.sizes):
+            self.remove(name)
+
+    def summary(self):
+        quota = f" of {self.quota / (1024 * 1024):.1f} MB" if self.quota else ""
+        return (
+            f"Artifact store ({self.kind}): {self.bytes_written / (1024 * 1024):.1f} MB "
+            f"written, {self.bytes_read / (1024 * 1024):.1f} MB read, "
+            f"peak size {self.peak / (1024 * 1024):.1f} MB{quota}"
+        )
+
+
+class MemoryStore(ArtifactStore):
+    """Artifacts kept as bytes in the memory of the process"""
+
+    kind = "memory"
+
+    def __init__(self, quota_mb=None):
+        super().__init__(quota_mb)
+        self.data = {}
+
+    def writer(self, name):
+        buffer = io.BytesIO()
+
+        def finish():
+            self.data[name] = buffer.getvalue()
+            buffer.close()
+            return len(self.data[name])
+
+        return buffer, buffer.tell, finish
+
+    def reader(self, name):
+        return io.BytesIO(self.data[name])
+
+    def delete(self, name):
+        self.data.pop(name, None)
+
+
+class DirectoryStore(ArtifactStore):
+    """Artifacts kept as files of a folder, gzip compressed if compresslevel is given
+
+    The folder is created in root (a temporary one if root is None) and deleted on close
+    """
+
+    def __init__(self, root=None, quota_mb=None, compresslevel=None, kind="tmpfs"):
+        super().__init__(quota_mb)
+        self.kind = kind
+        self.compresslevel = compresslevel
+        if root:
+            os.makedirs(root, exist_ok=True)
+        self.root = tempfile.mkdtemp(prefix="artifacts_", dir=root)
+
+    def file(self, name):
+        path = os.path.join(self.root, name)
+        return path + ".gz" if self.compresslevel else path
+
+    def writer(self, name):
+        path = self.file(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        raw = open(path, "wb")
+        stream = raw
+        if self.compresslevel:
+            # mtime 0 so that the same text always gives the same compressed bytes
+            stream = gzip.GzipFile(
+                fileobj=raw, mode="wb", compresslevel=self.compresslevel, mtime=0
+            )
+
+        def finish():
+            stream.close()
+            raw.close()
+            return os.path.getsize(path)
+
+        return stream, raw.tell, finish
+
+    def reader(self, name):
+        if self.compresslevel:
+            return gzip.open(self.file(name), "rb")
+        return open(self.file(name), "rb")
+
+    def delete(self, name):
+        if os.path.exists(self.file(name)):
+            os.remove(self.file(name))
+
+    def path(self, name):
+        return None if self.compresslevel else self.file(name)
+
+    def close(self):
+        super().close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+# Store of a backend: "memory", "tmpfs" or "compressed" (gzip files, level 1 for speed)
+# kind is read from TOKENIZER_ARTIFACT_STORE if not given, None means plain files
+# root is the folder of the files of the tmpfs (/dev/shm by default) and compressed
+# (inter_files by default) stores
+def make_store(kind=None, quota_mb=None, root=None):
+    kind = (kind or os.environ.get(store_env, "")).strip().lower()
+    if kind in ("", "disk", "off"):
+        return None
+    if kind == "memory":
+        return MemoryStore(quota_mb)
+    if kind == "tmpfs":
+        if root is None and not os.access(tmpfs_dir, os.W_OK):
+            print(
+                f"No {tmpfs_dir} on this system, the tmpfs store uses {tempfile.gettempdir()}"
+            )
+        elif root is None:
+            root = tmpfs_dir
+        return DirectoryStore(root, quota_mb)
+    if kind == "compressed":
+        return DirectoryStore(root or artifact_dir, quota_mb, 1, "compressed")
+    raise ValueError(
+        f"Unknown artifact store: {kind} (one of {', '.join(store_kinds)})"
+    )
+
+
+# Makes a store the active one (None goes back to plain files), returns the previous one
+def set_store(store):
+    global active_store
+    previous = active_store
+    active_store = store
+    return previous
+
+
+# Name of a file in the store if it is under inter_files or std_outs and a store is active,
+# else None. The standard output files keep their folder in the name, so that they can not
+# clash with an intermediate file of the same name
+def artifact_name(path):
+    if active_store is None:
+        return None
+    parts = os.path.normpath(path).split(os.sep)
+    if len(parts) < 2 or parts[0] not in (artifact_dir, std_out_dir):
+        return None
+    if parts[0] == std_out_dir:
+        return "/".join(parts)
+    return "/".join(parts[1:])
+
+
+# Opens a file, through the active store if it is an intermediate file
+def open_artifact(path, mode="r", encoding=None, newline=None):
+    name = artifact_name(path)
+    if name is None:
+        return open(path, mode, encoding=encoding, newline=newline)
+    return active_store.open(name, mode, encoding, newline)
+
+
+# Deletes a file, through the active store if it is an intermediate file
+def remove_artifact(path):
+    name = artifact_name(path)
+    if name is None:
+        os.remove(path)
+    else:
+        active_store.remove(name)
+
+
+# Deletes an intermediate file that no later stage reads if it is in the active store, so
+# that the store (and its quota) only holds the files still needed. Plain files are kept
+# for the user to look at (and deleted at the end of the run if asked)
+def discard_artifact(path):
+    if artifact_name(path) is not None:
+        remove_artifact(path)
+
+
+# True if a file exists, in the active store if it is an intermediate file
+def artifact_exists(path):
+    name = artifact_name(path)
+    return os.path.exists(path) if name is None else name in active_store
+
+
+# Size of a file in bytes (before compression for a compressed store)
+def artifact_size(path):
+    name = artifact_name(path)
+    return os.path.getsize(path) if name is None else active_store.size(name)
+
+
+# Plain file with the bytes of a file, None if the store only has them in memory or compressed
+def artifact_path(path):
+    name = artifact_name(path)
+    return path if name is None else active_store.path(name)
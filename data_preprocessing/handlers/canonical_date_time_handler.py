@@ -1,108 +1,246 @@
+import calendar
 import re
-import os
+from handlers.artifact_store import open_artifact, remove_artifact
+from handlers.chunk_stream import (
+    word_run_cut,
+    stream_findall,
+    stream_std_out,
+    stream_sub,
+)
+
+month_mapping = {
+    "january": "01",
+    "february": "02",
+    "march": "03",
+    "april": "04",
+    "may": "05",
+    "june": "06",
+    "july": "07",
+    "august": "08",
+    "september": "09",
+    "october": "10",
+    "november": "11",
+    "december": "12",
+}
+
+# Month number from the first three letters of a month name (also for Jan, Sept, ...)
+month_numbers = {name[:3]: number for name, number in month_mapping.items()}
+
+# Month names, full or abbreviated, in any case
+month_name = (
+    r"(?i:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?"
+    r"|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b\.?"
+)
+
+# Time zones kept in the canonical format, IST is used when none is given
+timezones = "IST UTC GMT PST PDT EST EDT CST CDT MST MDT BST CET CEST JST AEST".split()
+timezone = r"(?:" + "|".join(timezones) + r")\b"
+# The dot after the m is only taken with the dotted form (p.m.), a sentence that ends on
+# "5pm." keeps its full stop
+am_pm = r"(?i:[ap](?:\.[ \t]?m\b\.?|[ \t]?m\b))"
+
+# Regex patterns for raw dates and times in the corpus, one named group per format
+# Dates: 2020-01-05, 5/1/2020, 05.01.20, 5 January 2020, 5th Jan 2020, January 5, 2020,
+# 2017 May 23
+# The leading lookahead lets the scan skip every position that cannot start a date or a time
+# A numeric date does not start inside a word or a dotted number (v1.2.20), and a date
+# with dots has a two digit day and month (05.01.20, not the version 3.10.12)
+date_regex = (
+    r"(?=\d|\b[JFMASONDjfmasond])(?<![\d:])(?<!CF:D:)(?:"
+    r"(?<![\w.])(?P<iso_year>\d{4})(?P<iso_sep>[-/.])(?P<iso_month>\d{1,2})(?P=iso_sep)(?P<iso_day>\d{1,2})"
+    rf"|(?<![\w.])(?P<ymd_year>\d{{4}})\s+(?P<ymd_month>{month_name})\s+(?P<ymd_day>\d{{1,2}})(?:st|nd|rd|th)?\b"
+    r"|(?<![\w.])(?P<dot_day>\d{2})\.(?P<dot_month>\d{2})\.(?P<dot_year>\d{4}|\d{2})(?!\.\d)"
+    r"|(?<![\w.])(?P<day>\d{1,2})(?:st|nd|rd|th)?(?:(?P<sep>-)|[/\s]+)"
+    rf"(?P<month>{month_name}|\d{{1,2}})(?(sep)(?P=sep)|[/\s]+)(?P<year>\d{{4}}|\d{{2}})"
+    rf"|(?P<name_month>{month_name})\s+(?P<name_day>\d{{1,2}})(?:st|nd|rd|th)?,?\s+(?P<name_year>\d{{4}})"
+    r")(?!\d)"
+)
+# Times: 19:00, 19:00:30, 7:00 pm, 7.00 p.m. IST, 7pm, 7 a.m., 19:00 UTC
+# A time never starts after a "-", so that the day of a date (CF:D:2020-05-12 PM, or an
+# invalid 2020-13-12 AM) is not read as an hour, and the am / pm and the time zone are on
+# the same line as the time ("January 5, 2020\nPM Modi" is no time)
+time_regex = (
+    r"(?=\d)(?<![\w:.-])(?<!CF:T:)(?P<hour>\d{1,2})"
+    rf"(?::(?P<minute>\d{{2}})(?::\d{{2}})?|\.(?P<dot_minute>\d{{2}})(?=[ \t]*(?:{am_pm}|{timezone}))|(?=[ \t]*{am_pm}))"
+    rf"(?!\d)(?:[ \t]*(?P<am_pm>{am_pm}))?(?:[ \t]*(?P<timezone>{timezone}))?"
+)
+
+# Regex patterns for the canonical formats of date and time
+canonical_date_regex = r"CF:D:\d{4}-\d{2}-\d{2}"
+canonical_time_regex = r"CF:T:\d{2}:\d{2}:[A-Z]{3,4}"
+
+# Two digit years up to this one are in the 2000s, the others in the 1900s
+century_pivot = 50
+
+
+# Canonical format of a date match -> CF:D:yyyy-mm-dd
+# A match that is not a valid date (eg; 45/13/2020, Feb 30, 2021) is left as it is
+def date_canonical(match):
+    if match.group("iso_year"):
+        year, month, day = match.group("iso_year", "iso_month", "iso_day")
+    elif match.group("dot_year"):
+        year, month, day = match.group("dot_year", "dot_month", "dot_day")
+    elif match.group("ymd_year"):
+        year, month, day = match.group("ymd_year", "ymd_month", "ymd_day")
+    elif match.group("name_year"):
+        year, month, day = match.group("name_year", "name_month", "name_day")
+    else:
+        year, month, day = match.group("year", "month", "day")
+    month_lower = month.lower()[:3]
+    if month_lower in month_numbers:
+        month = month_numbers[month_lower]
+    year, month, day = int(year), int(month), int(day)
+    if year < 100:
+        year += 2000 if year <= century_pivot else 1900
+    if not 1 <= month <= 12:
+        return match.group()
+    days = calendar.mdays[month] + (month == 2 and calendar.isleap(year))
+    if not 1 <= day <= days:
+        return match.group()
+    return f"CF:D:{year:04d}-{month:02d}-{day:02d} "
+
+
+# Canonical format of a time match -> CF:T:19:00:IST
+# A match that is not a valid time (eg; 25:70 or 13 pm) is left as it is
+def time_canonical(match):
+    hour = int(match.group("hour"))
+    minute = int(match.group("minute") or match.group("dot_minute") or 0)
+    am_pm = match.group("am_pm")
+
+    # Convert if 12 hour format is mentioned
+    if am_pm:
+        if not 1 <= hour <= 12:
+            return match.group()
+        am_pm = am_pm[0].lower()
+        if am_pm == "p" and hour != 12:
+            hour += 12
+        elif am_pm == "a" and hour == 12:
+            hour = 0
+    if hour > 23 or minute > 59:
+        return match.group()
+
+    # Default time zone setting
+    timezone = match.group("timezone") or "IST"
+    return f"CF:T:{hour:02d}:{minute:02d}:{timezone} "
+
+
+# Number of distinct matches remembered by a conversion before its cache is reset
+cache_size = 100000
+
+
+# Adds a cache on the matched text to a conversion, the same dates and times come back a lot
+def cached(to_canonical):
+    cache = {}
+
+    def convert(match):
+        text = match.group()
+        canonical = cache.get(text)
+        if canonical is None:
+            if len(cache) >= cache_size:
+                cache.clear()
+            canonical = cache[text] = to_canonical(match)
+        return canonical
+
+    return convert
+
+
+date_pattern = re.compile(date_regex)
+time_pattern = re.compile(time_regex)
+cached_date_canonical = cached(date_canonical)
+cached_time_canonical = cached(time_canonical)
+
+
+# Converts every date in a piece of text into its own canonical format, in one pass
+def convert_dates(row):
+    return date_pattern.sub(cached_date_canonical, row)
+
+
+# Converts every time in a piece of text into its own canonical format, in one pass
+def convert_times(row):
+    return time_pattern.sub(cached_time_canonical, row)
+
+
+# Streaming version of the conversion into a canonical format
+# A match spans at most "runs" words (split on blank spaces and separators), so the last
+# words of every chunk are carried over and a match crossing the cut is left for the next chunk
+# The last characters before the cut are carried too (not written again), so that the
+# lookbehinds of the pattern (eg; no date inside a dotted number) see the same text
+def stream_to_canonical(
+    input_file, output_file, pattern, to_canonical, runs, chunk_size, separators=""
+):
+    context = 5
+    carry = ""
+    start = 0
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
+            while True:
+                chunk = f_in.read(chunk_size)
+                buffer = carry + chunk
+                cut = word_run_cut(buffer, runs, separators) if chunk else len(buffer)
+                cut = max(cut, start)
+                pieces = []
+                pos = start
+                for match in pattern.finditer(buffer, start):
+                    if match.start() >= cut:
+                        break
+                    if match.end() > cut:
+                        cut = match.start()
+                        break
+                    pieces.append(buffer[pos : match.start()])
+                    pieces.append(to_canonical(match))
+                    pos = match.end()
+                pieces.append(buffer[pos:cut])
+                f_out.write("".join(pieces))
+                start = min(cut, context)
+                carry = buffer[cut - start :]
+                if not chunk:
+                    break
+    return output_file
 
 
 # Function to convert date into a canonical format given as -> CF:D:yyyy-mm-dd
-def date_to_canonical(input_file):
-    month_mapping = {
-        "january": "01",
-        "february": "02",
-        "march": "03",
-        "april": "04",
-        "may": "05",
-        "june": "06",
-        "july": "07",
-        "august": "08",
-        "september": "09",
-        "october": "10",
-        "november": "11",
-        "december": "12",
-    }
-    regex = r"(\d{1,2})[/\s]+(January|February|March|April|May|June|July|August|September|October|November|December|\d{1,2})[/\s]+(\d{2,4})"
-    output_file = "canonical_dates.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
-            row = f_in.read()
-            match = re.search(
-                regex,
-                row,
-                re.IGNORECASE,
-            )
-            if match:
-                day, month, year = match.groups()
-                month_lower = month.lower()
-                if month_lower in month_mapping:
-                    month = month_mapping[month_lower]
-                else:
-                    month = f"{int(month):02d}"
-
-                canonical_date = f"CF:D:{year}-{month}-{day} "
-            else:
-                canonical_date = ""
-
-            f_out.write(
-                re.sub(
-                    regex,
-                    canonical_date,
-                    row,
-                )
-            )
+def date_to_canonical(input_file, chunk_size=None):
+    output_file = "inter_files/canonical_dates.txt"
+    if chunk_size:
+        return stream_to_canonical(
+            input_file,
+            output_file,
+            date_pattern,
+            cached_date_canonical,
+            3,
+            chunk_size,
+            "/.-",
+        )
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
+            f_out.write(convert_dates(f_in.read()))
     return output_file
 
 
 # Function to convert time into a canonical format given as -> CF:T:19:00:IST (if time zone mention add otherwise don't)
-def time_to_canonical(input_file):
-    output_file = "canonical_times.txt"
-    regex = r"(?<!CF:D:)\b(\d{1,2})[.:]?(\d{2})\s*(?:(a|p).?m.?)?\s*(IST|PST)?\b"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
-            row = f_in.read()
-            match = re.search(
-                regex,
-                row,
-                re.IGNORECASE,
-            )
-            if match:
-                hour, minute, am_pm, timezone = match.groups()
-
-                hour = int(hour)
-
-                # Convert if 12 hour format is mentioned
-                if am_pm:
-                    am_pm = am_pm.lower()
-                    if am_pm == "p" and hour != 12:
-                        hour += 12
-                    elif am_pm == "a" and hour == 12:
-                        hour = 0
-
-                # Default time zone setting
-                if not timezone:
-                    timezone = "IST"
-                else:
-                    timezone = timezone.upper()
-                canonical_time = f"CF:T:{hour:02d}:{minute}:{timezone} "
-            else:
-                canonical_time = ""
-
-            f_out.write(
-                re.sub(
-                    regex,
-                    canonical_time,
-                    row,
-                )
-            )
+def time_to_canonical(input_file, chunk_size=None):
+    output_file = "inter_files/canonical_times.txt"
+    if chunk_size:
+        return stream_to_canonical(
+            input_file, output_file, time_pattern, cached_time_canonical, 4, chunk_size
+        )
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
+            f_out.write(convert_times(f_in.read()))
 
     return output_file
 
 
 # Extraction functions for creating standard outputs
 # A function that extracts canonical dates into a seperate file as a list
-def extract_canonical_dates(input_file):
+def extract_canonical_dates(input_file, chunk_size=None):
     output_file = "std_outs/std_out_dates.txt"
-    regex = r"CF:D:\d{4}-\d{2}-\d{2}"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
-            extracted_dates = re.findall(regex, f_in.read())
+    if chunk_size:
+        dates = stream_findall(input_file, canonical_date_regex, chunk_size)
+        return stream_std_out(output_file, dates)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
+            extracted_dates = re.findall(canonical_date_regex, f_in.read())
         f_out.write(f"{len(extracted_dates)}" + "\n")
         for date in extracted_dates:
             f_out.write(date + "\n")
@@ -110,12 +248,14 @@ def extract_canonical_dates(input_file):
 
 
 # Extracts canonical times into a seperate file as a list
-def extract_canonical_times(input_file):
+def extract_canonical_times(input_file, chunk_size=None):
     output_file = "std_outs/std_out_times.txt"
-    regex = r"CF:T:\d{2}:\d{2}:[A-Z]{3}"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
-            extracted_times = re.findall(regex, f_in.read())
+    if chunk_size:
+        times = stream_findall(input_file, canonical_time_regex, chunk_size)
+        return stream_std_out(output_file, times)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
+            extracted_times = re.findall(canonical_time_regex, f_in.read())
         f_out.write(f"{len(extracted_times)}" + "\n")
         for time in extracted_times:
             f_out.write(time + "\n")
@@ -123,22 +263,25 @@ def extract_canonical_times(input_file):
 
 
 # Removing these canonical formats from the file
-def remove_canonical_date_time(input_file):
-    inter_file = "no_date.txt"
+def remove_canonical_date_time(input_file, chunk_size=None):
+    inter_file = "inter_files/no_date.txt"
     output_file = "inter_files/no_date_time.txt"
-    regex_date = r"CF:D:\d{4}-\d{2}-\d{2}"
-    regex_time = r"CF:T:\d{2}:\d{2}:[A-Z]{3}"
-    with open(inter_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
+    if chunk_size:
+        stream_sub(input_file, inter_file, canonical_date_regex, chunk_size)
+        stream_sub(inter_file, output_file, canonical_time_regex, chunk_size)
+        remove_artifact(inter_file)
+        return output_file
+    with open_artifact(inter_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
             row = f_in.read()
-            mod_content = re.sub(regex_date, "", row)
+            mod_content = re.sub(canonical_date_regex, "", row)
             f_out.write(mod_content)
     f_out.close()
     f_in.close()
-    with open(output_file, "w") as f_out:
-        with open(inter_file, "r") as f_in:
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(inter_file, "r") as f_in:
             row = f_in.read()
-            mod_content = re.sub(regex_time, "", row)
+            mod_content = re.sub(canonical_time_regex, "", row)
             f_out.write(mod_content)
-    os.remove(inter_file)
+    remove_artifact(inter_file)
     return output_file
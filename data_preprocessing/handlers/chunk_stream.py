@@ -0,0 +1,99 @@
+import re
+import shutil
+import tempfile
+from handlers.artifact_store import open_artifact
+
+# Number of characters read from the input file at a time in streaming mode
+default_chunk_size = 1 << 20
+
+
+# Reads a file in fixed size chunks of text
+def read_chunks(f_in, chunk_size):
+    while True:
+        chunk = f_in.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+# Safe cut for the tokens that never contain a blank space (everything after the word split)
+# The buffer is cut right after its last blank space, the rest is carried to the next chunk
+def whitespace_cut(buffer):
+    return max(buffer.rfind("\n"), buffer.rfind(" "), buffer.rfind("\t")) + 1
+
+
+# Safe cut that keeps the last few words (and the spaces between them) for the next chunk
+# Used for the patterns that can span a bounded number of words, like dates and times
+# separators are extra characters that split words, besides the blank spaces
+def word_run_cut(buffer, runs, separators=""):
+    def is_separator(char):
+        return char.isspace() or char in separators
+
+    pos = len(buffer)
+    for _ in range(runs):
+        while pos > 0 and not is_separator(buffer[pos - 1]):
+            pos -= 1
+        if pos == 0:
+            return 0
+        while pos > 0 and is_separator(buffer[pos - 1]):
+            pos -= 1
+    while pos < len(buffer) and is_separator(buffer[pos]):
+        pos += 1
+    return pos
+
+
+# Splits a file into blocks of text that can be processed one after the other
+# A block always ends at a safe cut, so no token is ever split between two blocks
+# The file is decoded with encoding, the locale encoding if None (like open)
+def read_blocks(input_file, chunk_size, cut=whitespace_cut, encoding=None):
+    carry = ""
+    with open_artifact(input_file, "r", encoding) as f_in:
+        for chunk in read_chunks(f_in, chunk_size):
+            buffer = carry + chunk
+            pos = cut(buffer)
+            if pos:
+                yield buffer[:pos]
+            carry = buffer[pos:]
+    if carry:
+        yield carry
+
+
+# Compiles a regex, a pattern object (eg; abbreviation_handler.pattern) is used as it is
+def compile_pattern(regex):
+    return re.compile(regex) if isinstance(regex, str) else regex
+
+
+# Streaming version of re.sub over a whole file
+def stream_sub(input_file, output_file, regex, chunk_size, repl="", cut=whitespace_cut):
+    pattern = compile_pattern(regex)
+    with open_artifact(output_file, "w") as f_out:
+        for block in read_blocks(input_file, chunk_size, cut):
+            f_out.write(pattern.sub(repl, block))
+    return output_file
+
+
+# Streaming version of re.findall over a whole file
+def stream_findall(input_file, regex, chunk_size, cut=whitespace_cut):
+    pattern = compile_pattern(regex)
+    for block in read_blocks(input_file, chunk_size, cut):
+        yield from pattern.findall(block)
+
+
+# Writes a standard output file from a stream of tokens without keeping them in memory
+# The tokens are spooled to a temporary file since the count has to be written first
+# split_token maps a token to its output lines, weight is the count of every token
+def stream_std_out(output_file, tokens, split_token=None, weight=1):
+    count = 0
+    with tempfile.TemporaryFile("w+") as spool:
+        for token in tokens:
+            count += weight
+            if split_token is None:
+                spool.write(token + "\n")
+            else:
+                for line in split_token(token):
+                    spool.write(line + "\n")
+        spool.seek(0)
+        with open_artifact(output_file, "w") as f_out:
+            f_out.write(f"{count}" + "\n")
+            shutil.copyfileobj(spool, f_out)
+    return output_file
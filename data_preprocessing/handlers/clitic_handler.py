@@ -1,20 +1,20 @@
 import re
+from handlers.artifact_store import open_artifact
+from handlers.chunk_stream import stream_findall, stream_std_out, stream_sub
+from handlers.lexicon import load_lexicon
 
-# Dictionary to map clitics to their expanded forms
-clitics_dict = {
-    "don't": ["do", "not"],
-    "can't": ["can", "not"],
-    "won't": ["will", "not"],
-    "isn't": ["is", "not"],
-    "i'm": ["i", "am"],
-    "you're": ["you", "are"],
-    "it's": ["it", "is"],
-    "they're": ["they", "are"],
-    "we're": ["we", "are"],
-    "what's": ["what", "is"],
-    "who's": ["who", "is"],
-    "nlp's": ["nlp", "'s"],
-    "that's": ["that", "is"],
+# Lexicon that maps clitics to their expanded forms (lexicons/clitics.tsv)
+clitics_lexicon = load_lexicon("clitics")
+
+# Expansion of the clitics that are not in the lexicon, by the part after the apostrophe
+suffix_mapping = {
+    "t": "not",
+    "s": "'s",
+    "re": "are",
+    "ve": "have",
+    "ll": "will",
+    "d": "would",
+    "m": "am",
 }
 
 # Regex to match clitics
@@ -24,7 +24,7 @@ regex = r"\b(\w+'\w+)(?=\s|\b|$|[,.;?!:])"
 # Function to extract clitics as a single token
 def extract_clitics(input_file):
     clitics_list = []
-    with open(input_file, "r") as f_in:
+    with open_artifact(input_file, "r") as f_in:
         row = f_in.read()
         clitics = re.findall(regex, row)
         for clitic in clitics:
@@ -35,28 +35,43 @@ def extract_clitics(input_file):
 
 
 # Function to remove clitics from the file for further tokenization
-def remove_clitics(input_file):
+def remove_clitics(input_file, chunk_size=None):
     output_file = "inter_files/no_clitics.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
+    if chunk_size:
+        return stream_sub(input_file, output_file, regex, chunk_size)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
             row = f_in.read()
             mod_content = re.sub(regex, "", row)
             f_out.write(mod_content)
     return output_file
 
 
+# Function that maps a single clitic to the lines written in the standard output
+# Clitics missing from the lexicon are split with the suffix mapping (eg; "they've")
+def split_clitic(clitic):
+    clitic = clitic.lower()
+    parts = clitics_lexicon.get(clitic)
+    if parts is not None:
+        return parts.split(" ")
+    stem, suffix = clitic.split("'")
+    if suffix == "t" and stem.endswith("n"):
+        return [stem[:-1], "not"]
+    if suffix in suffix_mapping and suffix != "t":
+        return [stem, suffix_mapping[suffix]]
+    return ["Clitic: {" + clitic + "} not mapped!"]
+
+
 # Function that processes the clitics, maps them and them splits them into corresponding parts
-def process_clitics(input_file):
+def process_clitics(input_file, chunk_size=None):
     output_file = "std_outs/std_out_clitics.txt"
+    if chunk_size:
+        clitics = stream_findall(input_file, regex, chunk_size)
+        return stream_std_out(output_file, clitics, split_clitic, weight=2)
     clitics = extract_clitics(input_file)
-    with open(output_file, "w") as f_out:
+    with open_artifact(output_file, "w") as f_out:
         f_out.write(f"{2*len(clitics)}" + "\n")
         for clitic in clitics:
-            clitic = clitic.lower()
-            if clitic in clitics_dict:
-                clitic_list = clitics_dict[clitic]
-                for c in clitic_list:
-                    f_out.write(c + "\n")
-            else:
-                f_out.write("Clitic: {" + clitic + "} not mapped!\n")
+            for c in split_clitic(clitic):
+                f_out.write(c + "\n")
     return output_file
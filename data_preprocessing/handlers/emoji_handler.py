@@ -1,31 +1,71 @@
+import os
 import re
+import sys
+from handlers.artifact_store import open_artifact
+from handlers.chunk_stream import stream_findall, stream_std_out, stream_sub
+from handlers.lexicon import Lexicon, load_lexicon, lexicon_dir, merge_lexicons
 
-# Dictionary to map emojis to their semantics
-emojis_dict = {
-    ":)": "smiley face",
-    ":(": "sad face",
-    ":D": "laughing",
-    ":o": "surprised",
-    ";)": "winking",
-    ":P": "sticking out tongue",
-    "<3": "heart",
-    "8)": "nerd",
-    "^-^": "anime happy face",
-    ":|": "neutral face",
-    ":/": "disappointed face",
-    ":'(": "crying",
-    "XD": "laughing hard",
-}
-
-# Regex to match emoticons
-regex = r"(?:[:;]-?['\)\(DPp3o|/])|(?:<3)|(?:\^_?\^)|(?:[xX]D)|(?:8\))"
+# Lexicons of ASCII emoticons (lexicons/emoticons.tsv) and of the Unicode emoji sequences,
+# with ZWJ sequences and skin tones (lexicons/emoji.tsv), each entry mapped to its meaning
+emoticons_lexicon = load_lexicon("emoticons")
+emoji_lexicon = load_lexicon("emoji")
+
+# Emoji sequences missing from the list (eg; from a newer Unicode version): a pictograph
+# or a flag, with an optional presentation selector or skin tone, joined by ZWJ characters
+pictograph = r"[\u2600-\u27bf\U0001f000-\U0001faff](?:\ufe0f|[\U0001f3fb-\U0001f3ff])?"
+emoji_fallback = rf"[\U0001f1e6-\U0001f1ff]{{2}}|{pictograph}(?:\u200d{pictograph})*"
+
+# The ";" that closes an HTML entity (&gt; &amp; &#39; &#x27;) never starts an emoticon,
+# so that eg; ";3" is not found in "p&gt;3" while "thanks:)" and "wink;)" still match
+# One fixed width lookbehind per length of the entity name, up to max_entity_length, all
+# behind a ";" test so that the other positions only pay for one character comparison
+max_entity_length = 8
+entity_names = [
+    r"&[A-Za-z][A-Za-z0-9]",
+    r"&#[0-9][0-9]",
+    r"&#[xX][0-9A-Fa-f][0-9A-Fa-f]",
+]
+entity_end = "|".join(
+    f"(?<={name}{{{n}}};)" for n in range(max_entity_length) for name in entity_names
+)
+
+# Regex to match emoticons: both lexicons in a single trie shaped regex (the longest entry
+# wins), then the generic emoticon rule and the emoji fallback, none of them starting at
+# the ";" of an entity
+emoticon_rule = r"[:;]-?['\)\(DPp3o|/]|<3|\^_?\^|[xX]D|8\)"
+emoticons_trie = merge_lexicons(emoticons_lexicon, emoji_lexicon)
+regex = (
+    f"(?!;(?:{entity_end}))(?:"
+    + "|".join([emoticons_trie.regex(word_edges=True), emoticon_rule, emoji_fallback])
+    + ")"
+)
+
+
+# Reads the Unicode emoji-test.txt list into (sequence, name) pairs
+# Lines look like: 1F600 ; fully-qualified # 😀 E1.0 grinning face
+def read_emoji_test(input_file):
+    entries = []
+    with open(input_file, "r", encoding="utf-8") as f_in:
+        for line in f_in:
+            if line.startswith("#") or ";" not in line:
+                continue
+            codes, _, comment = line.partition("#")
+            sequence = "".join(
+                chr(int(code, 16)) for code in codes.split(";")[0].split()
+            )
+            name = comment.split(maxsplit=2)[-1].strip()
+            entries.append((sequence, name))
+    return entries
 
 
 # Extract emoticons in standard format
-def extract_emoticons(input_file):
+def extract_emoticons(input_file, chunk_size=None):
     output_file = "std_outs/std_out_emoticons.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
+    if chunk_size:
+        tokens = stream_findall(input_file, regex, chunk_size)
+        return stream_std_out(output_file, tokens)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
             emoticons = re.findall(regex, f_in.read())
         f_out.write(f"{len(emoticons)}" + "\n")
         for emoticon in emoticons:
@@ -34,11 +74,27 @@ def extract_emoticons(input_file):
 
 
 # Remove emoticons from file for further tokenization
-def remove_emoticons(input_file):
+def remove_emoticons(input_file, chunk_size=None):
     output_file = "inter_files/no_emoticons.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
+    if chunk_size:
+        return stream_sub(input_file, output_file, regex, chunk_size)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
             row = f_in.read()
             mod_content = re.sub(regex, "", row)
             f_out.write(mod_content)
     return output_file
+
+
+# Rebuilds lexicons/emoji.tsv from a newer emoji-test.txt
+# python -m handlers.emoji_handler emoji-test.txt
+if __name__ == "__main__":
+    entries = read_emoji_test(sys.argv[1])
+    output_file = os.path.join(lexicon_dir, "emoji.tsv")
+    with open(output_file, "w", encoding="utf-8") as f_out:
+        f_out.write("# Unicode emoji sequences with their names\n")
+        for sequence, name in entries:
+            f_out.write(f"{sequence}\t{name}\n")
+    print(
+        f"{len(Lexicon.from_entries(entries))} emoji sequences written to {output_file}"
+    )
@@ -1,14 +1,19 @@
 import re
+from handlers.artifact_store import open_artifact
+from handlers.chunk_stream import stream_findall, stream_std_out, stream_sub
 
 # Regex pattern for detecting hashtags of the type: #example_hashtag01
 regex = r"#\w+"
 
 
 # Extracts hashtags eg; #nlpisgreat and treats them as a single token
-def extract_hashtags(input_file):
+def extract_hashtags(input_file, chunk_size=None):
     output_file = "std_outs/std_out_hashtags.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
+    if chunk_size:
+        tokens = stream_findall(input_file, regex, chunk_size)
+        return stream_std_out(output_file, tokens)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
             hashtags = re.findall(regex, f_in.read())
         f_out.write(f"{len(hashtags)}" + "\n")
         for hashtag in hashtags:
@@ -17,10 +22,12 @@ def extract_hashtags(input_file):
 
 
 # Removes urls from files for further tokenization
-def remove_hashtags(input_file):
+def remove_hashtags(input_file, chunk_size=None):
     output_file = "inter_files/no_hashtags.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
+    if chunk_size:
+        return stream_sub(input_file, output_file, regex, chunk_size)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
             row = f_in.read()
             mod_content = re.sub(regex, "", row)
             f_out.write(mod_content)
@@ -28,7 +35,7 @@ def remove_hashtags(input_file):
 
 
 # Function that executes both the above functions
-def handle_hashtags(input_file):
-    extract_file = extract_hashtags(input_file)
-    remove_file = remove_hashtags(input_file)
+def handle_hashtags(input_file, chunk_size=None):
+    extract_file = extract_hashtags(input_file, chunk_size)
+    remove_file = remove_hashtags(input_file, chunk_size)
     return extract_file, remove_file
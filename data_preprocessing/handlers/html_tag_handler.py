@@ -1,16 +1,183 @@
 import re
+from html.parser import HTMLParser
+from handlers.artifact_store import open_artifact
+from handlers.chunk_stream import default_chunk_size, read_blocks, read_chunks
+
+# Longest open tag carried from one chunk to the next when a file is read in chunks: a
+# "<" with no ">" in the next max_tag_length characters is not held back, so that a stray
+# "<" never holds back the rest of the file. Only the cuts are bounded: a longer tag (eg;
+# an <img> with a data URI) is still removed, unless it crosses the cut of a chunk
+max_tag_length = 1 << 16
+
+# Regex pattern for matching HTML tags of the type: <p class="x">, </p>
+regex = r"<[^>]*>"
+tag_pattern = re.compile(regex)
+
+
+# Elements dropped with all of their content, they hold code or markup rather than text
+skipped_elements = {
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "svg",
+    "iframe",
+    "object",
+}
+
+# Elements that start a new line of text, so that the words of two paragraphs or two
+# cells are not glued together
+block_elements = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt",
+    "figcaption", "figure", "footer", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "hr", "li", "main", "nav", "ol", "p", "pre", "section", "table", "td", "th",
+    "title", "tr", "ul",
+}  # fmt: skip
+
+
+# Characters of the decoded text written back as entities: every mode still runs the tag
+# regex on the text, which would drop a decoded "&lt;div&gt;" or everything between the
+# "<" of "x &lt; 3" and a later ">" as if it were a tag
+escaped_chars = str.maketrans({"<": "&lt;", ">": "&gt;"})
+
+
+# Most characters of raw HTML kept back by the parser: an unfinished tag longer than this
+# is text, the body of a script or style is dropped as it comes once it is longer
+max_held_length = 1 << 18
+
+
+class HTMLTextParser(HTMLParser):
+    """Text of an HTML document, fed piece by piece (stdlib html.parser)
+
+    Tags, comments and doctypes are dropped, the entities are decoded (except "<" and ">",
+    written back as entities) and the content of the skipped elements (scripts,
+    styles...) is dropped with them. Text is handed out by
+    flush() as soon as it is parsed, only an unfinished tag or entity (or the body of a
+    script or style until its end tag) is kept back, up to max_held_length characters
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+
+    def feed(self, data):
+        # Fed in pieces of at most max_held_length, an unfinished tag is scanned again on
+        # every piece and the regex of the parser takes memory along the scanned text
+        for start in range(0, len(data), max_held_length):
+            super().feed(data[start : start + max_held_length])
+            while len(self.rawdata) > max_held_length:
+                self.release(max_tag_length)
+
+    def close(self):
+        # At the end an unfinished tag can only be text: its "<" is made text first, so
+        # that the parser does not scan from every "<" to the end of the data
+        while "<" in self.rawdata and not self.cdata_elem:
+            self.release(0)
+        super().close()
+
+    def release(self, tail):
+        """Frees the raw data kept back: the body of a script or style without its end
+        tag yet is handed out as data (dropped when skipped) except for a possible start
+        of the end tag, an unfinished tag (eg; a "<" with no ">" or an unclosed quote) is
+        parsed again with its "<" as text, like every "<" up to the next ">" (or up to the
+        last tail characters if there is none)"""
+        held = self.rawdata
+        if self.cdata_elem:
+            keep = held.rfind("<", max(len(held) - 256, 0))
+            keep = len(held) if keep == -1 else keep
+            self.rawdata = held[keep:]
+            self.handle_data(held[:keep])
+        else:
+            start = held.find("<")
+            end = held.find(">", start)
+            if end == -1:
+                end = max(len(held) - tail, start + 1)
+            self.rawdata = ""
+            super().feed(held[:end].replace("<", "&lt;") + held[end:])
+
+    def handle_starttag(self, tag, attrs):
+        if tag in skipped_elements:
+            self.skip_depth += 1
+        elif tag in block_elements and not self.skip_depth:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in skipped_elements:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+        elif tag in block_elements and not self.skip_depth:
+            self.parts.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in block_elements and not self.skip_depth:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data.translate(escaped_chars))
+
+    def flush(self):
+        """Text parsed since the last call"""
+        text = "".join(self.parts)
+        self.parts = []
+        return text
+
+
+# Text of a piece of HTML with the HTML parser
+def html_text(test_string):
+    parser = HTMLTextParser()
+    parser.feed(test_string)
+    parser.close()
+    return parser.flush()
+
+
+# HTML to text with the HTML parser, the file is fed to the parser chunk by chunk and the
+# text written as it comes, so the memory does not grow with the size of the file
+def html_to_text(
+    input_file, chunk_size=default_chunk_size, output_file="inter_files/html_text.txt"
+):
+    parser = HTMLTextParser()
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
+            for chunk in read_chunks(f_in, chunk_size):
+                parser.feed(chunk)
+                f_out.write(parser.flush())
+        parser.close()
+        f_out.write(parser.flush())
+    return output_file
+
+
+# Safe cut for HTML tags: a tag that can still be open at the end of the buffer (a "<"
+# after the last ">", in the last max_tag_length characters) is carried over to the next
+# chunk, so the carry is never longer than a tag
+def tag_cut(buffer):
+    start = max(buffer.rfind(">") + 1, len(buffer) - max_tag_length - 1)
+    pos = buffer.find("<", start)
+    return len(buffer) if pos == -1 else pos
+
+
+# End of the part of a text where a tag can be found: no tag ends after the last ">"
+# Scanning only up to there keeps a run of "<" without a ">" from being scanned again from
+# every "<" to the end of the text (quadratic time)
+def tag_scan_end(text):
+    return text.rfind(">") + 1
+
+
+# Removing HTML tags from a piece of text
+def strip_tags(test_string):
+    end = tag_scan_end(test_string)
+    return tag_pattern.sub("", test_string[:end]) + test_string[end:]
 
 
 # Removing HTML tags using Regular expression
-def remove_tags(input_file):
+def remove_tags(input_file, chunk_size=None):
     output_file = "inter_files/no_html.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
-            test_string = f_in.read()
-            new_string = re.sub(
-                r"<[^>]*>",
-                "",
-                test_string,
-            )
-            f_out.write(new_string)
+    if chunk_size:
+        with open_artifact(output_file, "w") as f_out:
+            for block in read_blocks(input_file, chunk_size, tag_cut):
+                f_out.write(strip_tags(block))
+        return output_file
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
+            f_out.write(strip_tags(f_in.read()))
     return output_file
@@ -1,4 +1,6 @@
 import re
+from handlers.artifact_store import open_artifact
+from handlers.chunk_stream import stream_findall, stream_std_out, stream_sub
 
 # Regex to match hyphenated words
 regex = r"\b[\w.]+(?:-[\w.]+)+\b"
@@ -7,7 +9,7 @@ regex = r"\b[\w.]+(?:-[\w.]+)+\b"
 # Extract hyphenated words as a single token
 def extract_hyphen_words(input_file):
     words_list = []
-    with open(input_file, "r") as f_in:
+    with open_artifact(input_file, "r") as f_in:
         row = f_in.read()
         hyphen_words = re.findall(regex, row)
         for word in hyphen_words:
@@ -16,25 +18,35 @@ def extract_hyphen_words(input_file):
 
 
 # Remove hyphenated words the file for further tokenization
-def remove_hyphen_words(input_file):
+def remove_hyphen_words(input_file, chunk_size=None):
     output_file = "inter_files/no_hyphen_words.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
+    if chunk_size:
+        return stream_sub(input_file, output_file, regex, chunk_size)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
             row = f_in.read()
             mod_content = re.sub(regex, "", row)
             f_out.write(mod_content)
     return output_file
 
 
+# Split a hyphenated word into its parts, keeping the hyphen with the right part
+def split_hyphen_word(word):
+    return re.split(r"(?<=[\w.])(?=-)", word)
+
+
 # Process hyphenated words for splitting and for generating standard output
-def process_hyphen_words(input_file):
+def process_hyphen_words(input_file, chunk_size=None):
     output_file = "std_outs/std_out_hyphen_words.txt"
+    if chunk_size:
+        words = stream_findall(input_file, regex, chunk_size)
+        return stream_std_out(output_file, words, split_hyphen_word, weight=2)
     hyphen_words = extract_hyphen_words(input_file)
     words_list = []
-    with open(output_file, "w") as f_out:
+    with open_artifact(output_file, "w") as f_out:
         f_out.write(f"{2*len(hyphen_words)}" + "\n")
         for word in hyphen_words:
-            split_words = re.split(r"(?<=[\w.])(?=-)", word)
+            split_words = split_hyphen_word(word)
             for split_word in split_words:
                 words_list.append(split_word)
         for word in words_list:
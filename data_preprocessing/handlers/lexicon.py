@@ -0,0 +1,297 @@
+import glob
+import os
+import re
+import sys
+from array import array
+from bisect import bisect_left
+
+# Folder of the lexicon files, can be moved to a folder of larger lists
+lexicon_dir = os.environ.get(
+    "TOKENIZER_LEXICON_DIR",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lexicons"
+    ),
+)
+
+# First bytes of a compiled lexicon file
+magic = b"LEXICON1"
+
+
+class Lexicon:
+    """Compact trie of single word entries, each with an optional value
+
+    The trie is kept in flat arrays: the edges of node n are labels[first[n]:first[n + 1]]
+    (sorted character codes) and targets[...] (child nodes), values[n] is the index of the
+    value of node n in value_strings or -1 if no entry ends at node n. A lookup walks one
+    edge per character, so it costs the length of the word whatever the size of the lexicon
+    """
+
+    def __init__(self, first, labels, targets, values, value_strings, size):
+        self.first = first
+        self.labels = labels
+        self.targets = targets
+        self.values = values
+        self.value_strings = value_strings
+        self.size = size
+        self.regex_cache = {}
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Builds the trie from (key, value) pairs, a later duplicate key wins"""
+        root = {}
+        for key, value in entries:
+            if not key or any(char.isspace() for char in key):
+                raise ValueError(f"Lexicon keys are single words, got: {key!r}")
+            node = root
+            for char in key:
+                node = node.setdefault(char, {})
+            node[None] = value
+        # Breadth first numbering, the children of a node are stored next to each other
+        first = array("I", [0])
+        labels = array("I")
+        targets = array("I")
+        values = array("i")
+        value_strings = []
+        value_index = {}
+        size = 0
+        queue = [root]
+        for node in queue:
+            if None in node:
+                size += 1
+                value = node[None]
+                if value not in value_index:
+                    value_index[value] = len(value_strings)
+                    value_strings.append(value)
+                values.append(value_index[value])
+            else:
+                values.append(-1)
+            for char in sorted(char for char in node if char is not None):
+                labels.append(ord(char))
+                targets.append(len(queue))
+                queue.append(node[char])
+            first.append(len(labels))
+        return cls(first, labels, targets, values, value_strings, size)
+
+    @classmethod
+    def from_file(cls, path):
+        """Reads a text lexicon: one entry per line, "key<TAB>value" or just "key"
+        Blank lines and comments (lines starting with "# ") are skipped"""
+        entries = []
+        with open(path, "r", encoding="utf-8") as f_in:
+            for line in f_in:
+                line = line.rstrip("\n")
+                if not line.strip() or line.startswith("# ") or line == "#":
+                    continue
+                key, _, value = line.partition("\t")
+                entries.append((key.strip(), value.strip()))
+        return cls.from_entries(entries)
+
+    def save(self, path):
+        """Writes the compiled lexicon: a header line with the sizes, then the raw arrays"""
+        blob = "\0".join(self.value_strings).encode("utf-8")
+        header = [self.size, len(self.first), len(self.labels), len(self.value_strings)]
+        with open(path, "wb") as f_out:
+            f_out.write(magic + " ".join(map(str, header)).encode() + b"\n")
+            f_out.write(b"L" if sys.byteorder == "little" else b"B")
+            for data in (self.first, self.labels, self.targets, self.values):
+                data.tofile(f_out)
+            f_out.write(blob)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Reads a compiled lexicon, the arrays are read as they are without any parsing"""
+        with open(path, "rb") as f_in:
+            line = f_in.readline()
+            if not line.startswith(magic):
+                raise ValueError(f"Not a compiled lexicon: {path}")
+            size, nodes, edges, strings = map(int, line[len(magic) :].split())
+            swap = f_in.read(1) != (b"L" if sys.byteorder == "little" else b"B")
+            arrays = []
+            for typecode, count in (
+                ("I", nodes),
+                ("I", edges),
+                ("I", edges),
+                ("i", nodes - 1),
+            ):
+                data = array(typecode)
+                data.fromfile(f_in, count)
+                if swap:
+                    data.byteswap()
+                arrays.append(data)
+            blob = f_in.read().decode("utf-8")
+        value_strings = blob.split("\0") if strings else []
+        return cls(*arrays, value_strings, size)
+
+    def __len__(self):
+        return self.size
+
+    def node(self, key):
+        """Node reached by walking the characters of key, None if the walk falls off"""
+        node = 0
+        first, labels = self.first, self.labels
+        for char in key:
+            lo, hi = first[node], first[node + 1]
+            pos = bisect_left(labels, ord(char), lo, hi)
+            if pos == hi or labels[pos] != ord(char):
+                return None
+            node = self.targets[pos]
+        return node
+
+    def ends(self, text, pos):
+        """End positions of the keys found in text at pos, shortest first. The walk
+        stops as soon as it falls off the trie, so it never reads past the longest key
+        """
+        node = 0
+        first, labels, values = self.first, self.labels, self.values
+        for end in range(pos, len(text)):
+            code = ord(text[end])
+            lo, hi = first[node], first[node + 1]
+            edge = bisect_left(labels, code, lo, hi)
+            if edge == hi or labels[edge] != code:
+                return
+            node = self.targets[edge]
+            if values[node] >= 0:
+                yield end + 1
+
+    def next_chars(self, prefix=""):
+        """Characters that follow prefix in the keys, the first characters by default"""
+        node = self.node(prefix)
+        if node is None:
+            return []
+        return [
+            chr(label) for label in self.labels[self.first[node] : self.first[node + 1]]
+        ]
+
+    def get(self, key, default=None):
+        node = self.node(key)
+        if node is None or self.values[node] < 0:
+            return default
+        return self.value_strings[self.values[node]]
+
+    def __contains__(self, key):
+        node = self.node(key)
+        return node is not None and self.values[node] >= 0
+
+    def keys(self, node=0, prefix=""):
+        """Every key of the lexicon in sorted order"""
+        if self.values[node] >= 0:
+            yield prefix
+        for edge in range(self.first[node], self.first[node + 1]):
+            yield from self.keys(self.targets[edge], prefix + chr(self.labels[edge]))
+
+    def regex(self, word_edges=False):
+        """Regex matching the keys, shaped like the trie so that a match attempt only
+        follows one branch per character, the longest key wins
+        Children with the same sub pattern share a branch with a character class
+        (eg; an emoji and its skin tones), which keeps the number of branches low, and a
+        lookahead on the first characters skips the positions where no key can start
+        With word_edges a key that starts (ends) with a word character cannot be preceded
+        (followed) by another word character, so that eg; "x3" is not found in "0x3F"
+        The regex is built once per lexicon. It is still compiled by re in every process
+        (about 1.3 s for 50k entries) and the scan slows down as the lexicon grows (about
+        half the speed at 50k entries), a large list is better used with get and in
+        """
+        if word_edges not in self.regex_cache:
+            self.regex_cache[word_edges] = self.node_regex(0, word_edges)
+        return self.regex_cache[word_edges]
+
+    def node_regex(self, node, word_edges, word_end=False):
+        """Regex of the keys below a node, word_end if the edge into it is a word
+        character"""
+        groups = {}
+        for edge in range(self.first[node], self.first[node + 1]):
+            char = chr(self.labels[edge])
+            is_word = word_edges and re.match(r"\w", char) is not None
+            tail = self.node_regex(self.targets[edge], word_edges, is_word)
+            groups.setdefault((tail, node == 0 and is_word), []).append(char)
+        end = r"(?!\w)" if word_end else ""
+        if not groups:
+            return end
+        if node:
+            branches = [char_class(chars) + tail for (tail, _), chars in groups.items()]
+            body = alternation(branches)
+        else:
+            # Positions that cannot start a key are skipped with a single class test,
+            # the keys starting with a word character share one (?<!\w) test
+            branches = []
+            for word_start in (True, False):
+                keys = [key for key in groups if key[1] == word_start]
+                if not keys:
+                    continue
+                first_chars = char_class([char for key in keys for char in groups[key]])
+                inner = alternation([char_class(groups[key]) + key[0] for key in keys])
+                prefix = r"(?<!\w)" if word_start else ""
+                branches.append(f"{prefix}(?={first_chars}){inner}")
+            body = alternation(branches)
+        if node and self.values[node] >= 0:
+            return "(?:" + body + "|" + end + ")"
+        return body
+
+
+# Regex for one of several branches
+def alternation(branches):
+    return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+
+# Regex for one of several characters, sorted runs of code points become ranges
+def char_class(chars):
+    if len(chars) == 1:
+        return re.escape(chars[0])
+    codes = sorted(ord(char) for char in chars)
+    parts = []
+    start = prev = codes[0]
+    for code in codes[1:] + [None]:
+        if code is not None and code == prev + 1:
+            prev = code
+            continue
+        part = re.escape(chr(start))
+        if prev > start:
+            part += ("-" if prev > start + 1 else "") + re.escape(chr(prev))
+        parts.append(part)
+        if code is not None:
+            start = prev = code
+    return "[" + "".join(parts) + "]"
+
+
+# Single lexicon with the entries of several lexicons, a later lexicon wins on a duplicate key
+def merge_lexicons(*lexicons):
+    return Lexicon.from_entries(
+        (key, lexicon.get(key)) for lexicon in lexicons for key in lexicon.keys()
+    )
+
+
+# Lexicons already loaded, by path of the text file
+loaded_lexicons = {}
+
+
+# Loads a lexicon by name from lexicon_dir (eg; "clitics" -> lexicons/clitics.tsv)
+# The compiled file (lexicons/clitics.lex) is used when it is newer than the text file,
+# otherwise the text file is read. Nothing is written: python -m handlers.lexicon compiles
+# the lists. A lexicon is loaded once per process, so its regex is also built once
+def load_lexicon(name, directory=None):
+    directory = directory or lexicon_dir
+    source = os.path.join(directory, f"{name}.tsv")
+    compiled = os.path.join(directory, f"{name}.lex")
+    if source in loaded_lexicons:
+        return loaded_lexicons[source]
+    if os.path.exists(compiled) and (
+        not os.path.exists(source)
+        or os.path.getmtime(compiled) >= os.path.getmtime(source)
+    ):
+        lexicon = Lexicon.load(compiled)
+    else:
+        lexicon = Lexicon.from_file(source)
+    loaded_lexicons[source] = lexicon
+    return lexicon
+
+
+# Compiles text lexicons: python -m handlers.lexicon [lexicons/clitics.tsv ...]
+# Without arguments every list of lexicon_dir is compiled
+if __name__ == "__main__":
+    sources = sys.argv[1:] or sorted(glob.glob(os.path.join(lexicon_dir, "*.tsv")))
+    for source in sources:
+        compiled = os.path.splitext(source)[0] + ".lex"
+        lexicon = Lexicon.from_file(source)
+        lexicon.save(compiled)
+        print(f"{source}: {len(lexicon)} entries compiled into {compiled}")
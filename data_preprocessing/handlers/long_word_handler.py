@@ -0,0 +1,57 @@
+import re
+from handlers.artifact_store import open_artifact
+from handlers.chunk_stream import default_chunk_size, read_chunks, whitespace_cut
+
+# Longest run of characters without a blank space that the patterns get to see in guarded
+# mode. Some patterns (hyphenated words, URLs) scan a run again from many of its positions,
+# which takes time quadratic in its length, so bounding the length keeps every stage linear
+max_word_length = 256
+
+# A run longer than a word can be, blank spaces are the ones the streaming cut uses
+long_run = re.compile(rf"[^ \t\n]{{{max_word_length + 1},}}")
+
+# End of the last non word character of a piece, where the piece is cut if it has one
+last_break = re.compile(r".*\W", re.DOTALL)
+
+
+# Pieces of a long run: at most max_word_length characters each, every piece but the last
+# one is cut right after its last punctuation (eg; after a "/" of a URL) if it has one
+def run_pieces(run):
+    pieces = []
+    start = 0
+    while len(run) - start > max_word_length:
+        window = run[start : start + max_word_length]
+        match = last_break.match(window)
+        cut = start + (match.end() if match else max_word_length)
+        pieces.append(run[start:cut])
+        start = cut
+    pieces.append(run[start:])
+    return pieces
+
+
+# Splits the runs longer than max_word_length of a piece of text into pieces
+def split_long_words(text):
+    return long_run.sub(lambda match: " ".join(run_pieces(match.group())), text)
+
+
+# Guarded mode: splits the long runs of a file, chunk by chunk
+# A run still open at the end of a chunk has its finished pieces written at once, only the
+# last piece is carried over, so a file that is a single huge run is still split in linear
+# time and memory. The result is the same as split_long_words on the whole text
+def guard_long_words(
+    input_file, chunk_size=default_chunk_size, output_file="inter_files/guarded.txt"
+):
+    carry = ""
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
+            for chunk in read_chunks(f_in, chunk_size):
+                buffer = carry + chunk
+                pos = whitespace_cut(buffer)
+                f_out.write(split_long_words(buffer[:pos]))
+                carry = buffer[pos:]
+                if len(carry) > max_word_length:
+                    pieces = run_pieces(carry)
+                    f_out.write(" ".join(pieces[:-1]) + " ")
+                    carry = pieces[-1]
+        f_out.write(split_long_words(carry))
+    return output_file
@@ -1,14 +1,19 @@
 import re
+from handlers.artifact_store import open_artifact
+from handlers.chunk_stream import stream_findall, stream_std_out, stream_sub
 
 # Regex pattern for extracting all types of punctuations leftover in the corpus
 regex = r'[!"#$%&\'()*+,-./:;<=>?@[\\\]^_`{|}~]+'
 
 
 # Extract punctuations
-def extract_puncts(input_file):
+def extract_puncts(input_file, chunk_size=None):
     output_file = "std_outs/std_out_punctuations.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
+    if chunk_size:
+        tokens = stream_findall(input_file, regex, chunk_size)
+        return stream_std_out(output_file, tokens)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
             punctuations = re.findall(regex, f_in.read())
         f_out.write(f"{len(punctuations)}" + "\n")
         for punct in punctuations:
@@ -17,10 +22,12 @@ def extract_puncts(input_file):
 
 
 # Remove punctuations from the file for further tokenization
-def remove_puncts(input_file):
+def remove_puncts(input_file, chunk_size=None):
     output_file = "inter_files/no_punctuations.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
+    if chunk_size:
+        return stream_sub(input_file, output_file, regex, chunk_size)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
             row = f_in.read()
             mod_content = re.sub(regex, "", row)
             f_out.write(mod_content)
@@ -1,13 +1,28 @@
+from handlers.artifact_store import open_artifact
+from handlers.chunk_stream import read_chunks, stream_std_out
+
+
+# Stream of the non empty lines of a file
+def read_remaining(input_file):
+    with open_artifact(input_file, "r") as f_in:
+        for line in f_in:
+            token = line.strip()
+            if token:
+                yield token
+
+
 # Extract all remaining tokens
-def extract_remaining(input_file):
+def extract_remaining(input_file, chunk_size=None):
     output_file = "std_outs/std_out_remaining.txt"
+    if chunk_size:
+        return stream_std_out(output_file, read_remaining(input_file))
     tokens = []
-    with open(input_file, "r") as f_in:
+    with open_artifact(input_file, "r") as f_in:
         for line in f_in:
             token = line.strip()
             if token:
                 tokens.append(token)
-    with open(output_file, "w") as f_out:
+    with open_artifact(output_file, "w") as f_out:
         f_out.write(f"{len(tokens)}" + "\n")
         for token in tokens:
             f_out.write(token + "\n")
@@ -15,10 +30,14 @@ def extract_remaining(input_file):
 
 
 # Remove all remaining tokens - empty corpus for consistency and error checking
-def remove_remaining(input_file):
+def remove_remaining(input_file, chunk_size=None):
     output_file = "inter_files/no_remaining.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
+            if chunk_size:
+                for chunk in read_chunks(f_in, chunk_size):
+                    f_out.write(chunk[0:0])
+                return output_file
             row = f_in.read()
             f_out.write(row[0:0])
     return output_file
@@ -1,13 +1,18 @@
 import re
+from handlers.artifact_store import open_artifact
+from handlers.chunk_stream import stream_findall, stream_std_out, stream_sub
 
 regex = r"\bhttps?://\S+\b"
 
 
 # Extracts urls eg; https://www.apple.com/in/ and treats them as a single token
-def extract_urls(input_file):
+def extract_urls(input_file, chunk_size=None):
     output_file = "std_outs/std_out_urls.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
+    if chunk_size:
+        tokens = stream_findall(input_file, regex, chunk_size)
+        return stream_std_out(output_file, tokens)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
             urls = re.findall(regex, f_in.read())
         f_out.write(f"{len(urls)}" + "\n")
         for url in urls:
@@ -16,10 +21,12 @@ def extract_urls(input_file):
 
 
 # Removes urls from file for further tokenization
-def remove_urls(input_file):
+def remove_urls(input_file, chunk_size=None):
     output_file = "inter_files/no_urls.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
+    if chunk_size:
+        return stream_sub(input_file, output_file, regex, chunk_size)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
             row = f_in.read()
             mod_content = re.sub(regex, "", row)
             f_out.write(mod_content)
@@ -27,7 +34,7 @@ def remove_urls(input_file):
 
 
 # Combined function that executes both the above functions
-def handle_urls(input_file):
-    extract_file = extract_urls(input_file)
-    remove_file = remove_urls(input_file)
+def handle_urls(input_file, chunk_size=None):
+    extract_file = extract_urls(input_file, chunk_size)
+    remove_file = remove_urls(input_file, chunk_size)
     return extract_file, remove_file
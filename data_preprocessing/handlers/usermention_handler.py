@@ -1,12 +1,19 @@
 import re
+from handlers.artifact_store import open_artifact
+from handlers.chunk_stream import stream_findall, stream_std_out, stream_sub
+
+# Regex pattern for detecting user mentions of the type: @elonmusk
+regex = r"@\w+"
 
 
 # Extracts user mentions eg; @elonmusk and they are treated as a single token
-def extract_usermentions(input_file):
+def extract_usermentions(input_file, chunk_size=None):
     output_file = "std_outs/std_out_usermentions.txt"
-    regex = r"@\w+"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
+    if chunk_size:
+        tokens = stream_findall(input_file, regex, chunk_size)
+        return stream_std_out(output_file, tokens)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
             mentions = re.findall(regex, f_in.read())
         f_out.write(f"{len(mentions)}" + "\n")
         for mention in mentions:
@@ -15,11 +22,12 @@ def extract_usermentions(input_file):
 
 
 # Removes user mentions from file for further tokenization
-def remove_usermentions(input_file):
+def remove_usermentions(input_file, chunk_size=None):
     output_file = "inter_files/no_usermentions.txt"
-    regex = r"@\w+"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
+    if chunk_size:
+        return stream_sub(input_file, output_file, regex, chunk_size)
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
             row = f_in.read()
             mod_content = re.sub(regex, "", row)
             f_out.write(mod_content)
@@ -27,7 +35,7 @@ def remove_usermentions(input_file):
 
 
 # Function that executes botht the above functions
-def handle_usermentions(input_file):
-    extract_file = extract_usermentions(input_file)
-    remove_file = remove_usermentions(input_file)
+def handle_usermentions(input_file, chunk_size=None):
+    extract_file = extract_usermentions(input_file, chunk_size)
+    remove_file = remove_usermentions(input_file, chunk_size)
     return extract_file, remove_file
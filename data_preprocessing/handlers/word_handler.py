@@ -1,21 +1,33 @@
-import re
+from handlers.artifact_store import open_artifact
+from handlers.chunk_stream import read_chunks, default_chunk_size
+
+# Blank space characters other than the new line and the space (everything \s matches)
+other_spaces = (
+    "\t\x0b\x0c\r\x1c\x1d\x1e\x1f\x85\xa0\u1680"
+    "\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a"
+    "\u2028\u2029\u202f\u205f\u3000"
+)
+ascii_table = str.maketrans({char: "\n" for char in other_spaces if char.isascii()})
+
+
+# Every blank space becomes a new line and every new line becomes an empty line
+# Works on the whole piece of text at once with the str methods, no loop per character
+def split_words(text):
+    text = text.replace("\n", "\n\n").replace(" ", "\n")
+    if text.isascii():
+        return text.translate(ascii_table)
+    for char in other_spaces:
+        if char in text:
+            text = text.replace(char, "\n")
+    return text
 
 
 # Converts every blank space to a new line character
 # Output is a word / word-composition on a single line
-def word_new_line(input_file):
+def word_new_line(input_file, chunk_size=None):
     output_file = "inter_files/split_words.txt"
-    with open(output_file, "w") as f_out:
-        with open(input_file, "r") as f_in:
-            [
-                f_out.write(
-                    re.sub(
-                        r"^\s*$",
-                        "\n",
-                        row,
-                        flags=re.MULTILINE,
-                    )
-                )
-                for row in f_in.read()
-            ]
+    with open_artifact(output_file, "w") as f_out:
+        with open_artifact(input_file, "r") as f_in:
+            for chunk in read_chunks(f_in, chunk_size or default_chunk_size):
+                f_out.write(split_words(chunk))
     return output_file
@@ -0,0 +1,140 @@
+import glob
+import hashlib
+import os
+import zlib
+from disk_cache import DiskCache, default_cache_mb
+from handlers.artifact_store import open_artifact
+from handlers.lexicon import lexicon_dir
+from lexer import (
+    crosses_date_time,
+    lex_text,
+    group_tokens,
+    std_out_parts,
+    token_types,
+    write_std_out_parts,
+)
+
+# Paragraph cache, in the folder the tokenizer is run from
+cache_file = "tokenizer_cache.sqlite"
+
+# A paragraph is cut at the end of a line once it is paragraph_size characters long, at a
+# blank line or at a line picked by its content (about 1 line in cut_lines), so that a
+# long block without blank lines is still cut at the same lines when its text changes
+paragraph_size = 4096
+cut_lines = 4
+
+
+# Hash of the tokenizer code, the lexicons and the cache format (this file), the cached
+# tokens of an older tokenizer are never used since every key depends on it
+def tokenizer_version():
+    here = os.path.dirname(os.path.abspath(__file__))
+    sources = [os.path.abspath(__file__), os.path.join(here, "lexer.py")]
+    sources += sorted(glob.glob(os.path.join(here, "handlers", "*.py")))
+    sources += sorted(glob.glob(os.path.join(lexicon_dir, "*.tsv")))
+    digest = hashlib.blake2b(digest_size=16)
+    for source in sources:
+        with open(source, "rb") as f_in:
+            digest.update(f_in.read())
+    return digest.digest()
+
+
+# True if a line ends a paragraph: a blank line or one of the lines picked by their content
+def cut_line(line):
+    return not line.strip() or zlib.crc32(line.encode("utf-8")) % cut_lines == 0
+
+
+# Splits the text into paragraphs, returns their bounds
+# Like the shards of the parallel mode, a cut never splits an HTML tag, a date or a time
+def find_paragraph_bounds(text):
+    bounds = [0]
+    # Last "<" and ">" before the position checked last, so that finding whether a
+    # position is inside a tag only looks at the text after the previous one
+    last_open = last_close = -1
+    checked = 0
+
+    def outside_tag(pos):
+        nonlocal last_open, last_close, checked
+        last_open = max(last_open, text.rfind("<", checked, pos))
+        last_close = max(last_close, text.rfind(">", checked, pos))
+        checked = pos
+        return last_open < last_close or last_open == -1
+
+    end = text.find("\n", paragraph_size - 1)
+    while end != -1 and end + 1 < len(text):
+        pos = end + 1
+        line = text[text.rfind("\n", 0, end) + 1 : end]
+        if cut_line(line) and outside_tag(pos) and not crosses_date_time(text, pos):
+            bounds.append(pos)
+            end = text.find("\n", pos + paragraph_size - 1)
+        else:
+            end = text.find("\n", pos)
+    if bounds[-1] < len(text):
+        bounds.append(len(text))
+    return bounds
+
+
+# Cache key of a paragraph: its hash, keyed with the tokenizer version
+def paragraph_key(paragraph, version):
+    return hashlib.blake2b(
+        paragraph.encode("utf-8"), digest_size=16, key=version
+    ).digest()
+
+
+# Standard output parts of a paragraph to and from their cached form: a header line with
+# the count and the length of the lines of every token type, then the lines
+# The lines of a token type are kept as a single block, written to the file at once
+def encode_parts(parts):
+    blocks = [
+        "".join(line + "\n" for line in parts[token_type][1])
+        for token_type in token_types
+    ]
+    header = " ".join(
+        f"{parts[token_type][0]} {len(block)}"
+        for token_type, block in zip(token_types, blocks)
+    )
+    return zlib.compress((header + "\n" + "".join(blocks)).encode("utf-8"), 1)
+
+
+def decode_parts(value):
+    header, _, body = zlib.decompress(value).decode("utf-8").partition("\n")
+    numbers = list(map(int, header.split()))
+    parts = {}
+    pos = 0
+    for token_type, count, length in zip(token_types, numbers[::2], numbers[1::2]):
+        parts[token_type] = (count, [body[pos : pos + length - 1]] if length else [])
+        pos += length
+    return parts
+
+
+# Tokenizes a file paragraph by paragraph. A paragraph seen in an earlier run (same text,
+# same tokenizer) is taken from the cache, only the new or changed ones are lexed
+# The standard outputs are the same as the ones of a full run
+def tokenize_incremental(
+    input_file, out_dir="std_outs", cache_path=cache_file, cache_mb=default_cache_mb
+):
+    with open_artifact(input_file, "r") as f_in:
+        text = f_in.read()
+    bounds = find_paragraph_bounds(text)
+    version = tokenizer_version()
+    keys = [
+        paragraph_key(text[start:end], version)
+        for start, end in zip(bounds, bounds[1:])
+    ]
+    parts_list = []
+    with DiskCache(cache_path, cache_mb * 1024 * 1024) as cache:
+        cached = cache.get_many(set(keys))
+        fresh = {}
+        for key, start, end in zip(keys, bounds, bounds[1:]):
+            value = cached.get(key) or fresh.get(key)
+            if value is None:
+                parts = std_out_parts(group_tokens(lex_text(text[start:end])))
+                fresh[key] = encode_parts(parts)
+                parts_list.append(parts)
+            else:
+                parts_list.append(decode_parts(value))
+        cache.put_many(list(fresh.items()))
+    print(
+        f"{len(keys) - len(fresh)} of {len(keys)} paragraphs taken from the cache, "
+        f"{len(fresh)} tokenized"
+    )
+    return write_std_out_parts(parts_list, out_dir)
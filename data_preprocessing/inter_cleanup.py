@@ -1,10 +1,10 @@
-import os
+from handlers.artifact_store import artifact_exists, remove_artifact
 
 
 def clean_up_files(inter_files):
     for file in inter_files:
-        if os.path.exists(file):
-            os.remove(file)
+        if artifact_exists(file):
+            remove_artifact(file)
             print(f"File: {file} deleted successfully")
         else:
             print(f"File: {file} does not exist")
@@ -0,0 +1,303 @@
+import os
+import re
+import shutil
+import tempfile
+from handlers.artifact_store import open_artifact
+from handlers.chunk_stream import (
+    compile_pattern,
+    default_chunk_size,
+    read_blocks,
+)
+from handlers.html_tag_handler import max_tag_length, strip_tags
+from handlers.canonical_date_time_handler import (
+    convert_dates,
+    convert_times,
+    canonical_date_regex,
+    canonical_time_regex,
+)
+from handlers.url_handler import regex as url_regex
+from handlers.usermention_handler import regex as usermention_regex
+from handlers.hashtag_handler import regex as hashtag_regex
+from handlers.clitic_handler import regex as clitic_regex, split_clitic
+from handlers.emoji_handler import regex as emoticon_regex
+from handlers.hyphen_handler import regex as hyphen_regex, split_hyphen_word
+from handlers.abbreviation_handler import pattern as abbreviation_pattern
+from handlers.punctuation_handler import regex as punct_regex
+from create_std_out import write_std_out
+from sentence_segmenter import SentenceSplitter, sentences_file
+
+# Stages of the word level pipeline in their order of precedence
+# Each stage extracts all of its token types first and then removes them
+stages = [
+    [("dates", canonical_date_regex), ("times", canonical_time_regex)],
+    [("urls", url_regex)],
+    [("usermentions", usermention_regex)],
+    [("hashtags", hashtag_regex)],
+    [("clitics", clitic_regex)],
+    [("emoticons", emoticon_regex)],
+    [("hyphen_words", hyphen_regex)],
+    [("abbreviations", abbreviation_pattern)],
+    [("punctuations", punct_regex)],
+]
+
+# Token types in the order of the standard output files, "remaining" is always last
+token_types = [name for stage in stages for name, _ in stage] + ["remaining"]
+
+patterns = {name: compile_pattern(regex) for stage in stages for name, regex in stage}
+
+# Token types found by a pattern object instead of a regex (the abbreviations, found by a
+# trie walk), they are checked one by one next to the scanners below
+walked_types = [name for name in patterns if not isinstance(patterns[name], re.Pattern)]
+
+# Single prioritized scanner: one named group per token type
+master_regex = re.compile(
+    "|".join(
+        f"(?P<{name}>{regex})"
+        for stage in stages
+        for name, regex in stage
+        if name not in walked_types
+    )
+    + "|(?P<remaining>.+)"
+)
+
+# For every token type, a scanner for all the token types with a higher precedence,
+# and the walked token types with a higher precedence
+higher_regex = {}
+higher_walked = {}
+for i, name in enumerate(token_types):
+    higher = [
+        f"(?:{patterns[n].pattern})"
+        for n in token_types[:i]
+        if n in patterns and n not in walked_types
+    ]
+    higher_regex[name] = re.compile("|".join(higher)) if higher else None
+    higher_walked[name] = [n for n in token_types[:i] if n in walked_types]
+
+# Number of distinct words remembered before the classification cache is reset
+cache_size = 200000
+
+
+# Runs the stages one after the other on a single word, exactly like the file pipeline
+def cascade_word(word):
+    typed = []
+    for stage in stages:
+        for name, _ in stage:
+            for token in patterns[name].findall(word):
+                typed.append((name, token))
+        for name, _ in stage:
+            word = patterns[name].sub("", word)
+    if word:
+        typed.append(("remaining", word))
+    return tuple(typed)
+
+
+# Token type of a word that is a single token: no token type with a higher precedence
+# occurs inside it, None if the word has to go through the full cascade
+def single_token_type(word):
+    name = master_regex.fullmatch(word).lastgroup
+    for other in walked_types:
+        rank = token_types.index(other)
+        if rank < token_types.index(name) and patterns[other].fullmatch(word):
+            name = other
+            break
+    higher = higher_regex[name]
+    if any(patterns[n].search(word) for n in higher_walked[name]):
+        return None
+    if higher is None or not higher.search(word):
+        if name == "remaining":
+            return name
+        match = patterns[name].match(word)
+        if match.end() == len(word):
+            return name
+    return None
+
+
+# Classifies a word into typed tokens
+# Fast path: the word is a single token, otherwise the word goes through the full cascade
+def classify_word(word):
+    name = single_token_type(word)
+    if name is not None:
+        return ((name, word),)
+    return cascade_word(word)
+
+
+# Converts dates and times and drops HTML tags, the steps that work on the whole text
+def normalize_text(text):
+    return convert_times(convert_dates(strip_tags(text)))
+
+
+# Characters looked at on both sides of a cut (a shard or a block boundary) when checking
+# dates and times
+junction_window = 4096
+small_window = 256
+
+
+# True if no HTML tag is left open at position pos of the text
+def outside_tag(text, pos):
+    start = max(0, pos - max_tag_length - 1)
+    start = max(text.rfind(">", start, pos) + 1, start)
+    return text.find("<", start, pos) == -1
+
+
+# True if cutting the text at position pos would change its normalized text (a date or a
+# time crossing pos, or one whose lookbehind sees the text before pos, eg; "M.Sc.2017 May
+# 23 12/05/2020" where the "." keeps 2017 May 23 from being a date and 23 12/05 is one)
+# The two sides of a window around pos are normalized on their own and together, the cut
+# is safe only if both give the same text. pos is outside a tag. The window is cut short
+# at positions that are outside a tag too (right after a ">", or with no tag between them
+# and pos), so that tags are removed the same as in the whole text, the full window is
+# only used if a side has 4 words or less once its tags are removed
+def crosses_date_time(text, pos):
+    start, end = max(0, pos - junction_window), pos + junction_window
+    near_start, near_end = max(0, pos - small_window), pos + small_window
+    if "<" in text[near_start:pos] or ">" in text[near_start:pos]:
+        near_start = text.rfind(">", start, near_start) + 1 or start
+    if "<" in text[pos:near_end] or ">" in text[pos:near_end]:
+        found = text.find(">", near_end, end)
+        near_end = end if found == -1 else found + 1
+    tail = text[near_start:pos]
+    head = text[pos:near_end]
+    if near_start > 0 and len(strip_tags(tail).split()) <= 4:
+        tail = text[start:pos]
+    if near_end < len(text) and len(strip_tags(head).split()) <= 4:
+        head = text[pos:end]
+    return normalize_text(tail) + normalize_text(head) != normalize_text(tail + head)
+
+
+# Safe cut for the lexer: after the last blank space that does not split an HTML tag, a
+# date or a time, and at least a junction window before the end of the buffer so that the
+# checks see the same text as in the whole file. The text before the cut is lexed the same
+# on its own as in the whole file. Only the junction window before that is searched, 0 if
+# it has no such cut (the buffer is then carried to the next chunk)
+def lex_cut(buffer):
+    end = len(buffer) - junction_window
+    stop = max(0, end - junction_window)
+    while end > stop:
+        pos = max(
+            buffer.rfind("\n", stop, end),
+            buffer.rfind(" ", stop, end),
+            buffer.rfind("\t", stop, end),
+        )
+        if pos == -1:
+            break
+        if outside_tag(buffer, pos + 1) and not crosses_date_time(buffer, pos + 1):
+            return pos + 1
+        end = pos
+    return 0
+
+
+# Typed token stream of a text that is already normalized, yields (token_type, token)
+def lex_words(text):
+    cache = {}
+    for match in re.finditer(r"\S+", text):
+        word = match.group()
+        typed = cache.get(word)
+        if typed is None:
+            if len(cache) >= cache_size:
+                cache.clear()
+            typed = cache[word] = classify_word(word)
+        yield from typed
+
+
+# Typed token stream of a piece of text, yields (token_type, token) in one pass
+def lex_text(text):
+    yield from lex_words(normalize_text(text))
+
+
+# Normalized text and sentence stage: the text of a file as the lexer sees it, with the
+# HTML tags dropped and the dates and times converted, and the offsets of its sentences
+# The file is normalized block by block (cut by lex_cut, so a block ends after a blank
+# space like the segmenter needs) and every block is fed to the segmenter before the next
+# one is read, so the memory does not grow with the size of the file
+def normalize_file(input_file, chunk_size=default_chunk_size):
+    output_file = "inter_files/normalized.txt"
+    splitter = SentenceSplitter()
+    with open_artifact(output_file, "w") as f_out, open_artifact(
+        sentences_file, "w"
+    ) as f_spans:
+        for block in read_blocks(input_file, chunk_size, lex_cut):
+            text = normalize_text(block)
+            f_out.write(text)
+            for start, end in splitter.feed(text):
+                f_spans.write(f"{start}\t{end}\n")
+        for start, end in splitter.close():
+            f_spans.write(f"{start}\t{end}\n")
+    return output_file, sentences_file
+
+
+# Typed token stream of a file
+def lex_file(input_file):
+    with open_artifact(input_file, "r") as f_in:
+        text = f_in.read()
+    return lex_text(text)
+
+
+# Groups a typed token stream by token type
+def group_tokens(typed_tokens):
+    grouped = {name: [] for name in token_types}
+    for token_type, token in typed_tokens:
+        grouped[token_type].append(token)
+    return grouped
+
+
+# Count and lines of the standard output file of a token type
+def std_out_lines(token_type, tokens):
+    if token_type == "clitics":
+        lines = [line for clitic in tokens for line in split_clitic(clitic)]
+        return 2 * len(tokens), lines
+    if token_type == "hyphen_words":
+        lines = [part for word in tokens for part in split_hyphen_word(word)]
+        return 2 * len(tokens), lines
+    return len(tokens), tokens
+
+
+# Count and lines of the standard output file of every token type
+def std_out_parts(grouped):
+    return {name: std_out_lines(name, grouped[name]) for name in token_types}
+
+
+# Writes the standard output files from the parts of one or more pieces of text
+# The parts are merged in order: counts are added and lines are concatenated
+def write_std_out_parts(parts_list, out_dir="std_outs"):
+    os.makedirs(out_dir, exist_ok=True)
+    std_files = []
+    for token_type in token_types:
+        count = sum(parts[token_type][0] for parts in parts_list)
+        lines = (line for parts in parts_list for line in parts[token_type][1])
+        output_file = os.path.join(out_dir, f"std_out_{token_type}.txt")
+        std_files.append(write_std_out(output_file, count, lines))
+    return std_files
+
+
+# Writes the standard output files of a typed token stream
+# Returns them in the same order as the file pipeline so they can be merged
+def write_std_outs(typed_tokens, out_dir="std_outs"):
+    parts = std_out_parts(group_tokens(typed_tokens))
+    return write_std_out_parts([parts], out_dir)
+
+
+# Lexes a file and writes its standard output files
+# The file is lexed block by block (cut by lex_cut) and the lines of every token type are
+# spooled to a temporary file, so the memory does not grow with the size of the file
+def lex_file_std_outs(input_file, out_dir="std_outs", chunk_size=default_chunk_size):
+    os.makedirs(out_dir, exist_ok=True)
+    counts = dict.fromkeys(token_types, 0)
+    spools = {name: tempfile.TemporaryFile("w+") for name in token_types}
+    try:
+        for block in read_blocks(input_file, chunk_size, lex_cut):
+            parts = std_out_parts(group_tokens(lex_text(block)))
+            for token_type, (count, lines) in parts.items():
+                counts[token_type] += count
+                spools[token_type].write("".join(line + "\n" for line in lines))
+        std_files = []
+        for token_type in token_types:
+            output_file = os.path.join(out_dir, f"std_out_{token_type}.txt")
+            spools[token_type].seek(0)
+            with open_artifact(output_file, "w") as f_out:
+                f_out.write(f"{counts[token_type]}" + "\n")
+                shutil.copyfileobj(spools[token_type], f_out)
+            std_files.append(output_file)
+    finally:
+        for spool in spools.values():
+            spool.close()
+    return std_files
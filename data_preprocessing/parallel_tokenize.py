@@ -0,0 +1,50 @@
+from concurrent.futures import ProcessPoolExecutor
+from handlers.artifact_store import open_artifact
+from lexer import (
+    crosses_date_time,
+    lex_text,
+    group_tokens,
+    outside_tag,
+    std_out_parts,
+    write_std_out_parts,
+)
+
+# Number of shards per worker, more shards than workers keeps every worker busy
+shards_per_job = 4
+
+
+# Splits the text into shards at line boundaries
+# A boundary is moved to the next line if it would split an HTML tag, a date or a time
+def find_shard_bounds(text, count):
+    bounds = [0]
+    for i in range(1, count):
+        pos = max(bounds[-1], len(text) * i // count)
+        while True:
+            pos = text.find("\n", pos) + 1
+            if pos == 0 or pos >= len(text):
+                break
+            if outside_tag(text, pos) and not crosses_date_time(text, pos):
+                bounds.append(pos)
+                break
+        if pos == 0 or pos >= len(text):
+            break
+    bounds.append(len(text))
+    return bounds
+
+
+# Worker: runs the lexer on a single shard and returns its standard output parts
+def lex_shard(shard):
+    return std_out_parts(group_tokens(lex_text(shard)))
+
+
+# Tokenizes a file with a pool of processes and merges the shards in order
+# The standard outputs are the same as the ones of a serial run
+def tokenize_parallel(input_file, jobs, out_dir="std_outs"):
+    with open_artifact(input_file, "r") as f_in:
+        text = f_in.read()
+    bounds = find_shard_bounds(text, jobs * shards_per_job)
+    shards = [text[start:end] for start, end in zip(bounds, bounds[1:])]
+    del text
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        parts_list = list(executor.map(lex_shard, shards))
+    return write_std_out_parts(parts_list, out_dir)
@@ -0,0 +1,148 @@
+import csv
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from handlers.artifact_store import artifact_exists, artifact_size, open_artifact
+
+# Environment variable that switches the metrics on: "1" for the cheap metrics,
+# "memory" to also trace the peak memory of every stage with tracemalloc
+metrics_env = "TOKENIZER_METRICS"
+
+
+# Metrics level from the --metrics flag or from the environment variable
+# Returns None (metrics off), "basic" or "memory"
+def metrics_level(flag=None):
+    level = (flag or os.environ.get(metrics_env, "")).strip().lower()
+    if level in ("", "0", "off", "no", "false"):
+        return None
+    if level == "memory":
+        return "memory"
+    return "basic"
+
+
+# Peak resident memory of the process so far in bytes (KB on Linux, bytes on macOS)
+def peak_rss():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+# CPU time of the process and of its finished child processes (the parallel workers)
+def cpu_time():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+# File names in a stage argument or result: a file name, a pair of them or a list
+def output_files(result):
+    if isinstance(result, str):
+        return [result]
+    if isinstance(result, (tuple, list)):
+        return [name for name in result if isinstance(name, str)]
+    return []
+
+
+# Size of a file in bytes (an intermediate file can be in the artifact store), 0 if it
+# does not exist
+def file_size(name):
+    try:
+        return artifact_size(name)
+    except OSError:
+        return 0
+
+
+# Number of tokens in a standard output file (its first line)
+def std_out_count(name):
+    if not os.path.basename(name).startswith("std_out"):
+        return 0
+    with open_artifact(name, "r") as f_in:
+        count = f_in.readline().strip()
+    return int(count) if count.isdigit() else 0
+
+
+class StageRecorder:
+    """Records wall time, CPU time, bytes, tokens and memory for every pipeline stage"""
+
+    def __init__(self, level=None):
+        self.level = level
+        self.stages = []
+        self.started = time.perf_counter()
+        if level == "memory" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @property
+    def enabled(self):
+        return self.level is not None
+
+    def run(self, name, function, *args):
+        """Runs a stage and records its metrics, the stage runs as is when metrics are off"""
+        if not self.enabled:
+            return function(*args)
+        # Input files are the arguments that name a file (or a list of files)
+        bytes_read = sum(
+            file_size(name)
+            for arg in args
+            for name in output_files(arg)
+            if artifact_exists(name) and not os.path.isdir(name)
+        )
+        if self.level == "memory":
+            tracemalloc.reset_peak()
+        wall = time.perf_counter()
+        cpu = cpu_time()
+        result = None
+        # A failing stage is still recorded (with failed set) before the error goes on
+        try:
+            result = function(*args)
+        finally:
+            record = {
+                "stage": name,
+                "failed": result is None,
+                "wall_time": time.perf_counter() - wall,
+                "cpu_time": cpu_time() - cpu,
+                "bytes_read": bytes_read,
+                "bytes_written": sum(file_size(f) for f in output_files(result)),
+                "tokens": sum(std_out_count(f) for f in output_files(result)),
+                "peak_rss": peak_rss(),
+            }
+            if self.level == "memory":
+                record["peak_traced_memory"] = tracemalloc.get_traced_memory()[1]
+            self.stages.append(record)
+        return result
+
+    def totals(self):
+        """Sums of the metrics over all the stages"""
+        return {
+            "wall_time": time.perf_counter() - self.started,
+            "cpu_time": sum(stage["cpu_time"] for stage in self.stages),
+            "bytes_read": sum(stage["bytes_read"] for stage in self.stages),
+            "bytes_written": sum(stage["bytes_written"] for stage in self.stages),
+            "tokens": sum(stage["tokens"] for stage in self.stages),
+            "peak_rss": peak_rss(),
+        }
+
+    def write_report(self, master_output, report_format="json"):
+        """Writes the report next to the master output file, returns its name"""
+        if not self.enabled:
+            return None
+        report_file = f"{os.path.splitext(master_output)[0]}_metrics.{report_format}"
+        if report_format == "csv":
+            fields = list(self.stages[0]) if self.stages else ["stage"]
+            with open(report_file, "w", newline="") as f_out:
+                writer = csv.DictWriter(f_out, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(self.stages)
+                writer.writerow({"stage": "total", **self.totals()})
+        else:
+            with open(report_file, "w") as f_out:
+                json.dump(
+                    {
+                        "level": self.level,
+                        "stages": self.stages,
+                        "total": self.totals(),
+                    },
+                    f_out,
+                    indent=2,
+                )
+        return report_file
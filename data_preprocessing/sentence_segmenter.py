@@ -0,0 +1,180 @@
+import re
+from handlers.artifact_store import open_artifact
+from handlers.chunk_stream import default_chunk_size, read_blocks
+from handlers.lexicon import load_lexicon
+
+# Abbreviations that do not end a sentence (lexicons/abbreviations.tsv, the lexicon of the
+# abbreviation stage) eg; Mr., e.g., Jan.
+abbreviations_lexicon = load_lexicon("abbreviations")
+
+# Sentence offsets file: one "start<TAB>end" line per sentence, character offsets into the
+# normalized text, end excluded (written by lexer.normalize_file)
+sentences_file = "inter_files/sentences.tsv"
+
+# Places where a sentence can end: a word ending with . ! or ? (and closing quotes or
+# brackets) followed by blank space, or a new line. A match only starts at the start of a
+# word or of a run of blank spaces, which is then scanned once, so the scan is linear even
+# on long runs of dots or of spaces
+boundary_pattern = re.compile(
+    r"(?<!\S)(?P<word>\S*?[.!?])[\"'”’)\]]*(?P<gap>\s+)"
+    r"|(?<![ \t\r\f\v])[ \t\r\f\v]*\n\s*"
+)
+
+# Dotted letters like U.S. or a.m., a single letter with a dot is an initial like J.
+dotted_pattern = re.compile(r"(?:[^\W\d_]\.)+")
+
+# Opening quotes and brackets before the first word of a sentence
+openers = "\"'“‘(["
+
+
+# True if a word ending with a period is an abbreviation (from the lexicon), an initial or
+# dotted letters: the period does not end the sentence
+def is_abbreviation(word):
+    word = word.lstrip(openers)
+    return word in abbreviations_lexicon or dotted_pattern.fullmatch(word) is not None
+
+
+# True if a sentence ends at a gap of blank space: the gap has a new line (the corpus has a
+# paragraph per line, other files a sentence per line), or the word before it ends with
+# . ! or ? and the next character is not a lower case letter (and the word is not an
+# abbreviation if it ends with a period). word is None if it does not end with . ! or ?
+def is_boundary(word, newlines, next_char):
+    if newlines:
+        return True
+    if word is None or next_char.islower():
+        return False
+    return not word.endswith(".") or not is_abbreviation(word)
+
+
+class SentenceSplitter:
+    """Finds the sentences of a text fed block by block, as (start, end) offsets
+
+    A block must end right after a blank space or at the end of the text (eg; from
+    read_blocks), so that no word is split between two blocks. When a block ends with a
+    gap of blank space, the sentence can only be ended once the next character is known:
+    the end of the word before the gap, the word and the new lines of the gap are kept
+    for the next block, the text itself is never scanned twice
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self.start = None
+        self.pending = None
+        self.last_end = 0
+
+    def feed(self, block):
+        """Offsets of the sentences that end in this block"""
+        base = self.offset
+        self.offset += len(block)
+        pos = len(block) - len(block.lstrip())
+        if pos == len(block):
+            if self.pending:
+                end, word, newlines = self.pending
+                self.pending = (end, word, newlines + block.count("\n"))
+            return []
+        sentences = []
+        if self.start is None:
+            self.start = base + pos
+        elif self.pending:
+            end, word, newlines = self.pending
+            if is_boundary(word, newlines + block.count("\n", 0, pos), block[pos]):
+                sentences.append((self.start, end))
+                self.start = base + pos
+        self.pending = None
+        for match in boundary_pattern.finditer(block, pos):
+            word = match.group("word")
+            end = base + (match.start("gap") if word else match.start())
+            gap = match.group("gap") if word else match.group()
+            if match.end() == len(block):
+                # The next character is in the next block
+                self.pending = (end, word, gap.count("\n"))
+                break
+            if is_boundary(word, gap.count("\n"), block[match.end()]):
+                sentences.append((self.start, end))
+                self.start = base + match.end()
+        else:
+            stripped = len(block.rstrip())
+            if stripped < len(block):
+                self.pending = (base + stripped, None, block.count("\n", stripped))
+        self.last_end = base + len(block.rstrip())
+        return sentences
+
+    def close(self):
+        """Offsets of the last sentence, if any"""
+        sentences = []
+        if self.start is not None:
+            end = self.pending[0] if self.pending else self.last_end
+            sentences.append((self.start, end))
+        self.start = None
+        self.pending = None
+        return sentences
+
+
+# Sentence offsets of a text
+def sentence_spans(text):
+    splitter = SentenceSplitter()
+    spans = splitter.feed(text)
+    return spans + splitter.close()
+
+
+# Sentence offsets of a file, read in chunks: the same as sentence_spans of the whole text
+def stream_sentence_spans(input_file, chunk_size=default_chunk_size):
+    splitter = SentenceSplitter()
+    for block in read_blocks(input_file, chunk_size):
+        yield from splitter.feed(block)
+    yield from splitter.close()
+
+
+# Sentences of a file as text, read in chunks: the same as the sentences of sentence_spans
+# Only the text from the start of the current sentence is kept between two chunks
+# With max_length a sentence is cut at the end of a chunk (after a blank space) once it
+# has max_length characters, so the text kept stays bounded on a file without sentence
+# ends (eg; a lower case corpus on one line). The file is decoded with encoding, the
+# locale encoding if None
+def stream_sentences(
+    input_file, chunk_size=default_chunk_size, max_length=None, encoding=None
+):
+    splitter = SentenceSplitter()
+    buffer = ""
+    base = 0
+    for block in read_blocks(input_file, chunk_size, encoding=encoding):
+        buffer += block
+        spans = splitter.feed(block)
+        if (
+            max_length
+            and splitter.start is not None
+            and splitter.offset - splitter.start >= max_length
+        ):
+            spans += splitter.close()
+        for start, end in spans:
+            yield buffer[start - base : end - base]
+        keep = splitter.offset if splitter.start is None else splitter.start
+        buffer = buffer[keep - base :]
+        base = keep
+    for start, end in splitter.close():
+        yield buffer[start - base : end - base]
+
+
+# Reads a sentence offsets file
+def read_sentence_spans(input_file):
+    with open_artifact(input_file, "r") as f_in:
+        for line in f_in:
+            start, end = line.split("\t")
+            yield int(start), int(end)
+
+
+# Sentences of a file as text, from its offsets file, read in chunks of about chunk_size
+def read_sentences(input_file, spans_file, chunk_size=default_chunk_size):
+    with open_artifact(input_file, "r") as f_in:
+        buffer = ""
+        base = 0
+        for start, end in read_sentence_spans(spans_file):
+            while end > base + len(buffer):
+                chunk = f_in.read(chunk_size)
+                if not chunk:
+                    break
+                # Drop what is before the sentence, it is never read again
+                keep = min(start - base, len(buffer))
+                buffer = buffer[keep:] + chunk
+                base += keep
+            yield buffer[start - base : end - base]
@@ -0,0 +1,107 @@
+import os
+from handlers.artifact_store import open_artifact
+from handlers.html_tag_handler import strip_tags
+from handlers.canonical_date_time_handler import convert_dates, convert_times
+from handlers.word_handler import split_words
+from create_std_out import write_std_out
+from lexer import stages, patterns, std_out_lines
+
+
+# Stage that writes the standard output file of a token type from a piece of text
+def extract_stage(token_type, out_dir):
+    def extract(text):
+        if token_type == "remaining":
+            tokens = [line.strip() for line in text.split("\n") if line.strip()]
+        else:
+            tokens = patterns[token_type].findall(text)
+        count, lines = std_out_lines(token_type, tokens)
+        output_file = os.path.join(out_dir, f"std_out_{token_type}.txt")
+        return write_std_out(output_file, count, lines)
+
+    return extract
+
+
+# Stage that removes the tokens of one or more token types from a piece of text
+def remove_stage(token_types):
+    def remove(text):
+        for token_type in token_types:
+            text = patterns[token_type].sub("", text)
+        return text
+
+    return remove
+
+
+# Dependency graph of the tokenizer: (node, stage function, input nodes)
+# Text nodes are in memory buffers, std_out nodes are the standard output files
+# The extraction and the removal of a stage only depend on the previous removal, which
+# is dropped once both are done. Same order of precedence as the file pipeline
+def tokenizer_graph(out_dir="std_outs"):
+    graph = [
+        ("no_html", strip_tags, ["input"]),
+        ("canonical_dates", convert_dates, ["no_html"]),
+        ("canonical_times", convert_times, ["canonical_dates"]),
+        ("split_words", split_words, ["canonical_times"]),
+    ]
+    previous = "split_words"
+    for stage in stages:
+        names = [name for name, _ in stage]
+        for name in names:
+            graph.append((f"std_out_{name}", extract_stage(name, out_dir), [previous]))
+        removed = "no_" + "_".join(names)
+        graph.append((removed, remove_stage(names), [previous]))
+        previous = removed
+    graph.append(("std_out_remaining", extract_stage("remaining", out_dir), [previous]))
+    return graph
+
+
+# Writes an in memory buffer to the spill directory, for debugging
+def spill(spill_dir, node, text):
+    output_file = os.path.join(spill_dir, f"{node}.txt")
+    with open_artifact(output_file, "w") as f_out:
+        f_out.write(text)
+    return output_file
+
+
+# Runs a dependency graph one node at a time, a node runs as soon as its inputs are ready
+# The stages are regex bound and hold the GIL, so running them in threads gave no speedup
+# and kept more buffers alive at once, for more cores use the parallel mode (--jobs)
+# A buffer is dropped once every node reading it is done, unless it is one of the outputs
+# With a spill directory every text buffer is also written to disk
+# Returns the buffers of the output nodes and the spilled files
+def run_graph(graph, sources, outputs, spill_dir=None):
+    buffers = dict(sources)
+    readers = {}
+    for _, _, inputs in graph:
+        for name in inputs:
+            readers[name] = readers.get(name, 0) + 1
+    waiting = list(graph)
+    spilled = []
+    while waiting:
+        ready = [node for node in waiting if all(i in buffers for i in node[2])]
+        if not ready:
+            raise ValueError(f"Missing inputs for: {[node[0] for node in waiting]}")
+        for node in ready:
+            name, function, inputs = node
+            waiting.remove(node)
+            buffers[name] = function(*[buffers[i] for i in inputs])
+            if spill_dir and not name.startswith("std_out"):
+                spilled.append(spill(spill_dir, name, buffers[name]))
+            for i in inputs:
+                readers[i] -= 1
+                if readers[i] == 0 and i not in outputs:
+                    del buffers[i]
+    return {name: buffers[name] for name in outputs}, spilled
+
+
+# Tokenizes a file with the stage graph, intermediates stay in memory unless spill_dir is set
+# Returns the standard output files in the order of the file pipeline and the spilled files
+def tokenize_graph(input_file, out_dir="std_outs", spill_dir=None):
+    os.makedirs(out_dir, exist_ok=True)
+    if spill_dir:
+        os.makedirs(spill_dir, exist_ok=True)
+    with open_artifact(input_file, "r") as f_in:
+        sources = {"input": f_in.read()}
+    graph = tokenizer_graph(out_dir)
+    outputs = [name for name, _, _ in graph if name.startswith("std_out")]
+    results, spilled = run_graph(graph, sources, outputs, spill_dir=spill_dir)
+    return [results[name] for name in outputs], spilled
@@ -1,8 +1,22 @@
+import hashlib
+import importlib
 import os
-from nltk.tag import StanfordNERTagger
+import queue
+import shutil
+import socket
+import subprocess
+import threading
+import time
+import unicodedata
+from create_std_out import std_out_tokens
+from disk_cache import DiskCache, default_cache_mb
+from lexer import lex_words, std_out_lines
+from sentence_segmenter import read_sentences
 
-# Defining paths to Stanford NER files
-stanford_ner_path = "/Users/admin/stanford-ner-2020-11-17"
+# Defining paths to Stanford NER files (STANFORD_NER_PATH points to another install)
+stanford_ner_path = os.environ.get(
+    "STANFORD_NER_PATH", "/Users/admin/stanford-ner-2020-11-17"
+)
 stanford_ner_jar = os.path.join(
     stanford_ner_path,
     "stanford-ner-4.2.0.jar",
@@ -12,33 +26,409 @@ stanford_ner_model = os.path.join(
     "classifiers/english.all.3class.distsim.crf.ser.gz",
 )
 
+# Tagger used for NER, "module:factory" of a callable returning an object with
+# tag(tokens) -> [(token, tag), ...] and close(), eg; a fake tagger for tests without Java
+ner_tagger_env = "TOKENIZER_NER_TAGGER"
+
+# Taggers that can be named instead of their "module:factory"
+ner_taggers = {
+    "stanford": "stanford_ner:StanfordNERServer",
+    "crf": "crf_ner:CRFNERTagger",
+}
+
+# Batches waiting to be tagged, the file is not read further ahead than that
+queue_size = 4
+
+# Tokens that end a sentence
+sentence_ends = {".", "!", "?"}
+
+# Seconds to wait for the NER server to load its model
+server_timeout = 300
+
+# NER cache, in the folder the tokenizer is run from
+ner_cache_file = "ner_cache.sqlite"
+
+
+class StanfordNERServer:
+    """Stanford NER classifier kept running in a single JVM (Stanford's NERServer)
+
+    The model is loaded once and every batch is sent over a local socket, instead of
+    starting a JVM and loading the model for every call. The tokens are sent on one line
+    and split on spaces only, so that they come back as they were sent. NERServer reads a
+    single line per connection, so every call opens its own connection: the sentences of
+    a batch tagged one by one (tag_sentences) are one connection each
+    """
+
+    def __init__(
+        self, model=stanford_ner_model, jar=stanford_ner_jar, java_options="-mx4g"
+    ):
+        with socket.socket() as probe:
+            probe.bind(("localhost", 0))
+            self.port = probe.getsockname()[1]
+        self.process = subprocess.Popen(
+            [
+                "java",
+                java_options,
+                "-cp",
+                jar,
+                "edu.stanford.nlp.ie.NERServer",
+                "-loadClassifier",
+                model,
+                "-port",
+                str(self.port),
+                "-outputFormat",
+                "tsv",
+                "-tokenizerFactory",
+                "edu.stanford.nlp.process.WhitespaceTokenizer",
+                "-tokenizerOptions",
+                "tokenizeNLs=false",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        model_stat = os.stat(model)
+        self.model_id = (
+            f"stanford {model} {model_stat.st_size} {model_stat.st_mtime_ns}"
+        )
+        deadline = time.monotonic() + server_timeout
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError("Stanford NER server exited while loading the model")
+            try:
+                socket.create_connection(("localhost", self.port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    self.close()
+                    raise RuntimeError("Stanford NER server did not start in time")
+                time.sleep(0.5)
+
+    def tag(self, tokens):
+        with socket.create_connection(("localhost", self.port)) as connection:
+            connection.sendall((" ".join(tokens) + "\n").encode("utf-8"))
+            connection.shutdown(socket.SHUT_WR)
+            with connection.makefile("r", encoding="utf-8") as f_in:
+                lines = f_in.read().split("\n")
+        return [tuple(line.rsplit("\t", 1)) for line in lines if "\t" in line]
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+
+
+class CachedTagger:
+    """NER tagger behind a persistent cache of the tags of every sentence
+
+    The sentences are the ones of the sentence segmenter (--sentences), given by their
+    lengths. A sentence is looked up by the hash of its tokens (NFC normalized), keyed
+    with the identity of the model, so the tags of another model are never used. Only the
+    sentences that are not in the cache are sent to the tagger, each of them once per
+    batch. A sentence of one token and the pieces of a sentence cut by the batch size are
+    tagged without the cache. hits and misses count the sentences found and not found in
+    the cache
+    """
+
+    def __init__(self, tagger, cache):
+        self.tagger = tagger
+        self.cache = cache
+        self.model_key = hashlib.blake2b(
+            tagger_identity(tagger).encode("utf-8"), digest_size=16
+        ).digest()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def sentence_key(self, sentence):
+        text = unicodedata.normalize("NFC", "\n".join(sentence))
+        return hashlib.blake2b(
+            text.encode("utf-8"), digest_size=16, key=self.model_key
+        ).digest()
+
+    def tag(self, tokens, lengths=()):
+        """Tags of tokens made of whole sentences of the given lengths, the tokens after
+        them (a piece of a long sentence) are tagged without the cache"""
+        sentences = split_lengths(tokens, lengths)
+        # A sentence tagged without the cache is keyed by its index instead of its hash
+        keys = [
+            self.sentence_key(sentence) if len(sentence) > 1 and i < len(lengths) else i
+            for i, sentence in enumerate(sentences)
+        ]
+        tags = {
+            key: value.decode("utf-8").split("\n")
+            for key, value in self.cache.get_many(
+                {key for key in keys if isinstance(key, bytes)}
+            ).items()
+        }
+        missing = {}
+        for key, sentence in zip(keys, sentences):
+            if key not in tags:
+                missing.setdefault(key, sentence)
+        missed = sum(isinstance(key, bytes) and key in missing for key in keys)
+        self.hits += sum(isinstance(key, bytes) for key in keys) - missed
+        self.misses += missed
+        if missing:
+            # Every sentence is tagged on its own, so that the tags cached for it do not
+            # depend on the sentences missing with it in this batch
+            tagged = tag_sentences(self.tagger, list(missing.values()))
+            # The tags can only be matched with the tokens if every token got one
+            if any(
+                len(pairs) != len(sentence)
+                for pairs, sentence in zip(tagged, missing.values())
+            ):
+                return self.tagger.tag(tokens)
+            for key, pairs in zip(missing, tagged):
+                tags[key] = [tag for _, tag in pairs]
+            self.cache.put_many(
+                [
+                    (key, "\n".join(tags[key]).encode("utf-8"))
+                    for key in missing
+                    if isinstance(key, bytes)
+                ]
+            )
+        return [
+            pair
+            for key, sentence in zip(keys, sentences)
+            for pair in zip(sentence, tags[key])
+        ]
+
+    def close(self):
+        self.tagger.close()
+        self.cache.close()
+
+
+# Identity of the model of a tagger: its model_id, or its class if it has none
+def tagger_identity(tagger):
+    model_id = getattr(tagger, "model_id", None)
+    if model_id:
+        return model_id
+    return f"{type(tagger).__module__}.{type(tagger).__qualname__}"
+
+
+# Splits tokens into sentences of the given lengths, the tokens after them (if any) are
+# the last one
+def split_lengths(tokens, lengths):
+    sentences = []
+    pos = 0
+    for length in lengths:
+        sentences.append(tokens[pos : pos + length])
+        pos += length
+    if pos < len(tokens):
+        sentences.append(tokens[pos:])
+    return sentences
+
+
+# (token, tag) pairs of every sentence (a list of tokens), each sentence tagged on its own:
+# a sentence of the segmenter can end at a new line, without . ! or ?, and a tagger given
+# several sentences at once would join it to the next one, so its tags would depend on
+# the sentence that follows it. The tag_sentences method of the tagger is used if it has
+# one (eg; the CRF tagger), otherwise tag is called once per sentence
+def tag_sentences(tagger, sentences):
+    if hasattr(tagger, "tag_sentences"):
+        return tagger.tag_sentences(sentences)
+    return [tagger.tag(sentence) for sentence in sentences]
+
+
+# Splits tokens into sentences, the last one may not end with a sentence end
+def split_sentences(tokens):
+    sentences = []
+    sentence = []
+    for token in tokens:
+        sentence.append(token)
+        if token in sentence_ends:
+            sentences.append(sentence)
+            sentence = []
+    if sentence:
+        sentences.append(sentence)
+    return sentences
+
+
+# Tagger used for NER: the one given, else the one named in TOKENIZER_NER_TAGGER, else the
+# Stanford server. A tagger is a name of ner_taggers or a "module:factory"
+def make_tagger(tagger_name=None):
+    factory = tagger_name or os.environ.get(ner_tagger_env) or "stanford"
+    factory = ner_taggers.get(factory, factory)
+    module_name, _, name = factory.partition(":")
+    return getattr(importlib.import_module(module_name), name)()
+
+
+# Batches of whole sentences of at most batch_size tokens, from the master output
+# The master output has its tokens grouped by type (all the URLs, then all the hashtags,
+# ...) and its punctuations together, so its "sentences" are not the ones of the text and
+# a batch is mostly cut every batch_size tokens. Only used without the sentences of the
+# text (without --sentences, and for feeds), see text_sentence_batches
+# A sentence longer than batch_size is cut
+def sentence_batches(input_file, batch_size):
+    batch = []
+    sentence_start = 0
+    for tokens in std_out_tokens(input_file):
+        for token in tokens:
+            batch.append(token)
+            if token in sentence_ends:
+                sentence_start = len(batch)
+            if len(batch) < batch_size:
+                continue
+            cut = sentence_start or len(batch)
+            yield batch[:cut]
+            batch = batch[cut:]
+            sentence_start = 0
+    if batch:
+        yield batch
+
+
+# Batches of whole sentences of at most batch_size tokens, from the sentences found by the
+# segmenter in the normalized text (lexer.normalize_file). Every sentence is lexed on its
+# own, with the same words as the master output (tags dropped, dates converted), so the
+# tokens come in the order of the text (the master output has them grouped by type), split
+# into lines like in the master output. Yields the tokens of a batch and the lengths of
+# its sentences. A sentence longer than batch_size is cut into batches of its own, with no
+# lengths as they are not whole sentences
+def text_sentence_batches(source_file, spans_file, batch_size):
+    batch = []
+    lengths = []
+    for sentence in read_sentences(source_file, spans_file):
+        tokens = [
+            line
+            for token_type, token in lex_words(sentence)
+            for line in std_out_lines(token_type, [token])[1]
+        ]
+        if batch and len(batch) + len(tokens) > batch_size:
+            yield batch, lengths
+            batch = []
+            lengths = []
+        if len(tokens) > batch_size:
+            for start in range(0, len(tokens), batch_size):
+                yield tokens[start : start + batch_size], []
+        elif tokens:
+            batch += tokens
+            lengths.append(len(tokens))
+    if batch:
+        yield batch, lengths
+
+
+# Reads the batches in a thread and hands them over through a bounded queue, so that the
+# next batches are read while the tagger works and the file is not read too far ahead
+# If the batches are not all taken (eg; the tagger failed), closing the generator stops
+# the reader and drains the queue, so that the thread never stays blocked on the queue
+def queued(batches):
+    pending = queue.Queue(maxsize=queue_size)
+    done = object()
+    stop = threading.Event()
+    failure = []
+
+    def read():
+        try:
+            for batch in batches:
+                if stop.is_set():
+                    break
+                pending.put(batch)
+        except Exception as error:
+            failure.append(error)
+        finally:
+            pending.put(done)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    batch = None
+    try:
+        while True:
+            batch = pending.get()
+            if batch is done:
+                break
+            yield batch
+    finally:
+        stop.set()
+        while batch is not done:
+            batch = pending.get()
+        reader.join()
+    if failure:
+        raise failure[0]
+
 
 # Perform NER on the master output file
-def ner_tagging(input_file):
-    output_file = "612203120_NE-Dict.txt"
-    total_tags = []
+# With a cache path the tags of the sentences seen in earlier runs come from the cache
+# With a sentence offsets file (spans_file) of the normalized text (source_file), the
+# batches are made of the sentences of the text instead of the master output
+def ner_tagging(
+    input_file,
+    tagger_name=None,
+    cache_path=None,
+    cache_mb=default_cache_mb,
+    source_file=None,
+    spans_file=None,
+):
+    if cache_path and not spans_file:
+        raise ValueError("The NER cache needs the sentences of the text (--sentences)")
     try:
-        st = StanfordNERTagger(
-            stanford_ner_model,
-            stanford_ner_jar,
-            encoding="utf-8",
-            java_options="-mx4g",
-        )
-        print("StanfordNERTagger Initialised!")
-    except:
-        print(f"Error initializing StanfordNERTagger: {e}")
-        print("Please check your file paths and Java installation.")
+        tagger = make_tagger(tagger_name)
+        if cache_path:
+            tagger = CachedTagger(tagger, DiskCache(cache_path, cache_mb * 1024 * 1024))
+        print("NER tagger Initialised!")
+    except Exception as e:
+        print(f"Error initializing the NER tagger: {e}")
+        print("Please check your file paths and Java installation (or the CRF model).")
         exit()
-    with open(input_file, "r") as f_in:
-        text = f_in.readlines()
-        tagged_entities = st.tag(text)
-        total_tags.extend(tagged_entities)
-    with open(output_file, "w") as f_out:
-        f_out.write(f"{len(tagged_entities)}" + "\n")
-        for entity in tagged_entities:
-            f_out.write(str(entity) + "\n")
-    return output_file
+    try:
+        return batch_ner_tagging(
+            input_file, tagger=tagger, source_file=source_file, spans_file=spans_file
+        )
+    finally:
+        tagger.close()
+        if cache_path:
+            print(
+                f"NER cache: {tagger.hits} of {tagger.hits + tagger.misses} sentences "
+                f"taken from the cache ({tagger.hit_rate:.1%}), {tagger.misses} tagged"
+            )
 
 
-def batch_ner_tagging(input_file, batch_size=10000):
+# Tags the tokens of the master output in batches of whole sentences with a long lived
+# tagger, and streams the tags to the NE dictionary: the tag count, then one tag per line
+# The batches come from the sentences of source_file if a spans_file is given
+def batch_ner_tagging(
+    input_file, batch_size=10000, tagger=None, source_file=None, spans_file=None
+):
     output_file = "612203120_NE-Dict.txt"
+    part_file = output_file + ".part"
+    own_tagger = tagger is None
+    tagger = tagger or make_tagger()
+    count = 0
+    if spans_file:
+        batches = text_sentence_batches(source_file, spans_file, batch_size)
+    else:
+        batches = ((batch, []) for batch in sentence_batches(input_file, batch_size))
+    batches = queued(batches)
+    try:
+        # The count is only known at the end, so the tags go to a part file first
+        with open(part_file, "w") as f_part:
+            for batch, lengths in batches:
+                if isinstance(tagger, CachedTagger):
+                    tagged_entities = tagger.tag(batch, lengths)
+                elif lengths:
+                    tagged_entities = [
+                        pair
+                        for pairs in tag_sentences(
+                            tagger, split_lengths(batch, lengths)
+                        )
+                        for pair in pairs
+                    ]
+                else:
+                    tagged_entities = tagger.tag(batch)
+                count += len(tagged_entities)
+                f_part.write("".join(str(entity) + "\n" for entity in tagged_entities))
+        with open(output_file, "w") as f_out:
+            f_out.write(f"{count}" + "\n")
+            with open(part_file, "r") as f_part:
+                shutil.copyfileobj(f_part, f_out)
+    finally:
+        # Also when the tagger fails: the reader thread is stopped and the part file is
+        # deleted
+        batches.close()
+        if own_tagger:
+            tagger.close()
+        if os.path.exists(part_file):
+            os.remove(part_file)
+    return output_file
@@ -0,0 +1,94 @@
+import mmap
+import os
+import sys
+from array import array
+from create_std_out import std_out_tokens
+from lexer import token_types
+
+# File extensions of a token id corpus
+ids_ext = ".ids"
+types_ext = ".types"
+vocab_ext = ".vocab"
+
+
+# Type id of a standard output file, from its name (std_out_<token type>.txt)
+def std_file_type(std_file):
+    name = os.path.splitext(os.path.basename(std_file))[0]
+    return token_types.index(name[len("std_out_") :])
+
+
+# Appends an array to a file, always in little endian order
+def write_array(f_out, data):
+    if sys.byteorder == "big":
+        data.byteswap()
+    data.tofile(f_out)
+
+
+# Writes the tokens of the standard output files as a token id corpus, in the order of the
+# master output:
+# - output_prefix.vocab: the vocabulary, one token per line, line n is the token of id n
+# - output_prefix.ids: the id of every token (uint32, little endian)
+# - output_prefix.types: the type id of every token (uint8, index in lexer.token_types)
+# The files are read and the ids written block by block, only the vocabulary is in memory
+def create_master_token_ids(std_files, output_prefix):
+    vocab = {}
+    output_files = [output_prefix + ext for ext in (ids_ext, types_ext, vocab_ext)]
+    with open(output_files[0], "wb") as f_ids, open(
+        output_files[1], "wb"
+    ) as f_types, open(output_files[2], "w", encoding="utf-8") as f_vocab:
+        for std_file in std_files:
+            type_id = std_file_type(std_file)
+            for tokens in std_out_tokens(std_file):
+                ids = array("I")
+                for token in tokens:
+                    token_id = vocab.get(token)
+                    if token_id is None:
+                        token_id = vocab[token] = len(vocab)
+                        f_vocab.write(token + "\n")
+                    ids.append(token_id)
+                write_array(f_ids, ids)
+                write_array(f_types, array("B", [type_id]) * len(ids))
+    return output_files
+
+
+# Memory maps an array file written by write_array
+def map_array(input_file, typecode):
+    with open(input_file, "rb") as f_in:
+        if os.fstat(f_in.fileno()).st_size == 0:
+            return array(typecode)
+        buffer = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+    if sys.byteorder == "big":
+        data = array(typecode, buffer)
+        data.byteswap()
+        return data
+    return memoryview(buffer).cast(typecode)
+
+
+class TokenIds:
+    """Token id corpus written by create_master_token_ids
+
+    The id and type arrays are memory mapped: ids[i] is the id of token i in vocab and
+    types[i] the index of its token type in lexer.token_types. The vocabulary is read in
+    memory, it is small next to the corpus
+    """
+
+    def __init__(self, output_prefix):
+        with open(output_prefix + vocab_ext, "r", encoding="utf-8") as f_in:
+            self.vocab = f_in.read().split("\n")[:-1]
+        self.ids = map_array(output_prefix + ids_ext, "I")
+        self.types = map_array(output_prefix + types_ext, "B")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        return self.vocab[self.ids[i]]
+
+    def token_type(self, i):
+        return token_types[self.types[i]]
+
+    def tokens(self):
+        """Every token in order, as in the master output"""
+        vocab = self.vocab
+        for token_id in self.ids:
+            yield vocab[token_id]
@@ -0,0 +1,339 @@
+import mmap
+import os
+import re
+import sys
+from array import array
+from bisect import bisect_right
+from handlers.artifact_store import open_artifact, artifact_path
+from handlers.html_tag_handler import regex as tag_regex, tag_scan_end
+from handlers.canonical_date_time_handler import (
+    date_pattern,
+    time_pattern,
+    cached_date_canonical,
+    cached_time_canonical,
+)
+from lexer import (
+    stages,
+    patterns,
+    token_types,
+    single_token_type,
+    cache_size,
+    std_out_parts,
+    write_std_out_parts,
+)
+
+# First bytes of a saved token index
+magic = b"TOKINDEX1"
+
+# Steps that change the text before it is split into words, in the order of normalize_text
+# Newlines are translated first, like a file opened in text mode
+# The third item gives the end of the part of the text a step has to scan, if bounded
+normalize_steps = [
+    (re.compile(r"\r\n?"), "\n", None),
+    (re.compile(tag_regex), "", tag_scan_end),
+    (date_pattern, cached_date_canonical, None),
+    (time_pattern, cached_time_canonical, None),
+]
+
+
+class TokenIndex:
+    """Typed tokens of a file kept as offsets into the file instead of string copies
+
+    Token i is the bytes starts[i]:ends[i] of the memory mapped input, its type is
+    token_types[types[i]]. A token that is not a plain slice of the input (a canonical date,
+    a word with an HTML tag inside it, what is left of a word after a token was cut out of
+    its middle) keeps the input span it came from and its text in the overflow table
+    """
+
+    def __init__(self, source, starts, ends, types, overflow):
+        self.source = source
+        self.starts = starts
+        self.ends = ends
+        self.types = types
+        self.overflow = overflow
+        self.buffer = map_file(source)
+
+    def __len__(self):
+        return len(self.types)
+
+    def view(self, i):
+        """Input bytes of token i, a view on the memory mapped file (no copy)"""
+        return memoryview(self.buffer)[self.starts[i] : self.ends[i]]
+
+    def token(self, i):
+        """Text of token i"""
+        text = self.overflow.get(i)
+        if text is None:
+            text = str(self.buffer[self.starts[i] : self.ends[i]], "utf-8")
+        return text
+
+    def tokens(self, token_type=None):
+        """(token_type, token) pairs in the order of the input, only one type if given"""
+        type_id = None if token_type is None else token_types.index(token_type)
+        for i, current in enumerate(self.types):
+            if type_id is None or current == type_id:
+                yield token_types[current], self.token(i)
+
+    def grouped(self):
+        """Tokens of every type, in the order of the input"""
+        grouped = {name: [] for name in token_types}
+        for token_type, token in self.tokens():
+            grouped[token_type].append(token)
+        return grouped
+
+    def write_std_outs(self, out_dir="std_outs"):
+        """Exports the index to the standard output files, the same as the lexer's"""
+        return write_std_out_parts([std_out_parts(self.grouped())], out_dir)
+
+    def save(self, path):
+        """Writes the index: a header line, the input file, then the raw arrays and the
+        overflow table (token numbers, then the texts)"""
+        overflow_ids = array("Q", sorted(self.overflow))
+        blob = "\0".join(self.overflow[i] for i in overflow_ids).encode("utf-8")
+        header = [len(self), len(overflow_ids), len(self.buffer), self.starts.typecode]
+        with open(path, "wb") as f_out:
+            f_out.write(magic + " ".join(map(str, header)).encode() + b"\n")
+            f_out.write(os.path.abspath(self.source).encode("utf-8") + b"\n")
+            f_out.write(b"L" if sys.byteorder == "little" else b"B")
+            for data in (self.starts, self.ends, self.types, overflow_ids):
+                data.tofile(f_out)
+            f_out.write(blob)
+        return path
+
+    @classmethod
+    def load(cls, path, source=None):
+        """Reads a saved index, the input file is mapped again (from source if it moved)"""
+        with open(path, "rb") as f_in:
+            line = f_in.readline()
+            if not line.startswith(magic):
+                raise ValueError(f"Not a token index: {path}")
+            count, overflow_count, size, offsets = line[len(magic) :].decode().split()
+            count, overflow_count, size = int(count), int(overflow_count), int(size)
+            saved_source = f_in.readline().rstrip(b"\n").decode("utf-8")
+            swap = f_in.read(1) != (b"L" if sys.byteorder == "little" else b"B")
+            arrays = []
+            for typecode, length in (
+                (offsets, count),
+                (offsets, count),
+                ("B", count),
+                ("Q", overflow_count),
+            ):
+                data = array(typecode)
+                data.fromfile(f_in, length)
+                if swap:
+                    data.byteswap()
+                arrays.append(data)
+            blob = f_in.read().decode("utf-8")
+        starts, ends, types, overflow_ids = arrays
+        texts = blob.split("\0") if overflow_count else []
+        index = cls(
+            source or saved_source, starts, ends, types, dict(zip(overflow_ids, texts))
+        )
+        if len(index.buffer) != size:
+            raise ValueError(f"{index.source} changed since the index was built")
+        return index
+
+
+# Memory maps a file for reading, an empty file cannot be mapped
+# An intermediate file that is not a plain file (memory or compressed store) is read instead
+def map_file(input_file):
+    path = artifact_path(input_file)
+    if path is None:
+        with open_artifact(input_file, "rb") as f_in:
+            return f_in.read()
+    with open(path, "rb") as f_in:
+        if os.fstat(f_in.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+# Substitution that also returns the runs of the text it copied unchanged,
+# as (new start, old start, length) triples; the result is the same as pattern.sub
+def tracked_sub(pattern, repl, text, endpos=None):
+    pieces = []
+    runs = []
+    pos = new_pos = 0
+    for match in pattern.finditer(text, 0, len(text) if endpos is None else endpos):
+        start, end = match.span()
+        replacement = repl(match) if callable(repl) else repl
+        if replacement == match.group():
+            continue
+        if start > pos:
+            runs.append((new_pos, pos, start - pos))
+            pieces.append(text[pos:start])
+            new_pos += start - pos
+        pieces.append(replacement)
+        new_pos += len(replacement)
+        pos = end
+    if pos < len(text):
+        runs.append((new_pos, pos, len(text) - pos))
+        pieces.append(text[pos:])
+    return "".join(pieces), runs
+
+
+# Runs of a text copied from an older text, given the runs of each step
+# (outer maps the newest text to a middle one, inner maps the middle text to the oldest)
+def compose_runs(outer, inner):
+    composed = []
+    j = 0
+    for new, old, length in outer:
+        end = old + length
+        while j < len(inner) and inner[j][0] + inner[j][2] <= old:
+            j += 1
+        k = j
+        while k < len(inner) and inner[k][0] < end:
+            inner_new, inner_old, inner_length = inner[k]
+            start = max(old, inner_new)
+            stop = min(end, inner_new + inner_length)
+            composed.append(
+                (new + start - old, inner_old + start - inner_new, stop - start)
+            )
+            k += 1
+    return composed
+
+
+# Normalizes a text like lexer.normalize_text, with the runs copied from the original text
+def tracked_normalize(text):
+    runs = [(0, 0, len(text))] if text else []
+    for pattern, repl, scan_end in normalize_steps:
+        endpos = scan_end(text) if scan_end else None
+        text, step_runs = tracked_sub(pattern, repl, text, endpos)
+        runs = compose_runs(step_runs, runs)
+    return text, runs
+
+
+# Span of a piece of a word as (start, end, text), text is None when the piece is the
+# word slice start:end, positions holds the place in the word of every character left
+def piece_span(word, positions, start, end):
+    first, last = positions[start], positions[end - 1] + 1
+    return first, last, None if last - first == end - start else word[start:end]
+
+
+# Typed pieces of a word, like lexer.cascade_word but with their place in the word
+def cascade_word_spans(word):
+    typed = []
+    positions = list(range(len(word)))
+    for stage in stages:
+        for name, _ in stage:
+            group = 1 if patterns[name].groups else 0
+            for match in patterns[name].finditer(word):
+                typed.append((name,) + piece_span(word, positions, *match.span(group)))
+        for name, _ in stage:
+            kept = []
+            pos = 0
+            for match in patterns[name].finditer(word):
+                kept.append((pos, match.start()))
+                pos = match.end()
+            if not kept:
+                continue
+            kept.append((pos, len(word)))
+            word = "".join(word[start:end] for start, end in kept)
+            positions = [p for start, end in kept for p in positions[start:end]]
+    if word:
+        typed.append(("remaining",) + piece_span(word, positions, 0, len(word)))
+    return tuple(typed)
+
+
+# Typed pieces of a word as (type id, start, end, text, byte start, byte end),
+# see cascade_word_spans, the byte offsets are from the start of the word
+def classify_word_spans(word):
+    name = single_token_type(word)
+    if name is not None:
+        pieces = [(name, 0, len(word), None)]
+    else:
+        pieces = cascade_word_spans(word)
+    ascii_only = word.isascii()
+    return tuple(
+        (
+            token_types.index(name),
+            start,
+            end,
+            text,
+            start if ascii_only else len(word[:start].encode("utf-8")),
+            end if ascii_only else len(word[:end].encode("utf-8")),
+        )
+        for name, start, end, text in pieces
+    )
+
+
+# Builds the token index of a file: the same tokens as the lexer, as offsets into the file
+def build_token_index(input_file):
+    buffer = map_file(input_file)
+    original = str(buffer, "utf-8")
+    ascii_only = original.isascii()
+    text, runs = tracked_normalize(original)
+    run_starts = [run[0] for run in runs]
+    # 4 byte offsets are enough below 4 GB
+    typecode = "I" if len(buffer) < 2**32 else "Q"
+    starts = array(typecode)
+    ends = array(typecode)
+    types = array("B")
+    overflow = {}
+    cache = {}
+
+    # Original position of a position of the normalized text. A start (end) position
+    # inside a change goes to the start (end) of that change in the original text
+    def original_position(pos, is_end):
+        r = bisect_right(run_starts, pos - 1 if is_end else pos) - 1
+        if r >= 0 and pos - runs[r][0] <= runs[r][2]:
+            return runs[r][1] + pos - runs[r][0]
+        if not is_end:
+            return 0 if r < 0 else runs[r][1] + runs[r][2]
+        return runs[r + 1][1] if r + 1 < len(runs) else len(original)
+
+    # Whether a span of the normalized text was copied as it is from the original text
+    def copied(start, end):
+        r = bisect_right(run_starts, start) - 1
+        return r >= 0 and end <= runs[r][0] + runs[r][2]
+
+    # Byte offsets of character offsets that only go forward (word by word)
+    char_pos = byte_pos = 0
+
+    def byte_offset(pos):
+        if ascii_only:
+            return pos
+        return byte_pos + len(original[char_pos:pos].encode("utf-8"))
+
+    run = 0
+    for match in re.finditer(r"\S+", text):
+        word = match.group()
+        typed = cache.get(word)
+        if typed is None:
+            if len(cache) >= cache_size:
+                cache.clear()
+            typed = cache[word] = classify_word_spans(word)
+        word_start, word_end = match.span()
+        while run < len(runs) and runs[run][0] + runs[run][2] <= word_start:
+            run += 1
+        # Fast path, the word was copied as it is: its pieces are at the same place
+        if run < len(runs) and runs[run][0] <= word_start:
+            new, old, length = runs[run]
+            if word_end <= new + length:
+                first = old + word_start - new
+                if not ascii_only:
+                    byte_pos += len(original[char_pos:first].encode("utf-8"))
+                    char_pos = first
+                word_byte = byte_pos if not ascii_only else first
+                for type_id, _, _, piece, byte_start, byte_end in typed:
+                    if piece is not None:
+                        overflow[len(types)] = piece
+                    starts.append(word_byte + byte_start)
+                    ends.append(word_byte + byte_end)
+                    types.append(type_id)
+                continue
+        # The word was changed (a canonical value, an HTML tag inside it)
+        first = original_position(word_start, False)
+        if not ascii_only:
+            byte_pos += len(original[char_pos:first].encode("utf-8"))
+            char_pos = first
+        for type_id, start, end, piece, _, _ in typed:
+            start += word_start
+            end += word_start
+            if piece is None and not copied(start, end):
+                piece = text[start:end]
+            if piece is not None:
+                overflow[len(types)] = piece
+            starts.append(byte_offset(original_position(start, False)))
+            ends.append(byte_offset(original_position(end, True)))
+            types.append(type_id)
+    return TokenIndex(input_file, starts, ends, types, overflow)
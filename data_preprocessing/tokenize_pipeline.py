@@ -1,3 +1,4 @@
+import os
 from handlers.canonical_date_time_handler import (
     date_to_canonical,
     time_to_canonical,
@@ -5,7 +6,9 @@ from handlers.canonical_date_time_handler import (
     extract_canonical_times,
     remove_canonical_date_time,
 )
-from handlers.html_tag_handler import remove_tags
+from handlers.artifact_store import discard_artifact, make_store, set_store
+from handlers.html_tag_handler import remove_tags, html_to_text
+from handlers.long_word_handler import guard_long_words
 from handlers.word_handler import word_new_line
 from handlers.url_handler import handle_urls
 from handlers.usermention_handler import handle_usermentions
@@ -39,122 +42,413 @@ from create_std_out import (
 )
 from stanford_ner import (
     ner_tagging,
+    ner_cache_file,
 )
 from inter_cleanup import clean_up_files
+from lexer import lex_file_std_outs, normalize_file
+from parallel_tokenize import tokenize_parallel
+from stage_graph import tokenize_graph
+from token_index import build_token_index
+from incremental_tokenize import tokenize_incremental, cache_file
+from disk_cache import default_cache_mb
+from token_ids import create_master_token_ids
+from feed_ingest import tokenize_feeds, default_field
+from pipeline_metrics import StageRecorder, metrics_level
 
 
-# Complete pipeline for tokenization
-def tokenize():
+# Stage by stage pipeline: every handler reads the previous file and writes a new one
+# With a chunk size every handler streams its input instead of reading it at once
+# With an artifact store every intermediate file is deleted once the stages that read it
+# are done
+def cascade_stages(input_file, chunk_size=None, recorder=None):
+    recorder = recorder or StageRecorder()
     inter_files = []
     std_files = []
-    print("----Custom Tokenizer----")
-    input_file = input("Enter the name of the input file: ")
-    # Stage 1: Removing HTML tags (if they are present)
-    no_html = remove_tags(input_file)  # Does not contain any html tags
+    # Stage 1: Removing HTML tags (if they are present), no_html does not contain any html tags
+    no_html = recorder.run("remove_tags", remove_tags, input_file, chunk_size)
     print("Removal of HTML Tags complete")
     print(f"File generated: {no_html}")
     inter_files.append(no_html)
     # Stage 2: Convert dates to canonical format
-    canonical_dates = date_to_canonical(no_html)
+    canonical_dates = recorder.run(
+        "date_to_canonical", date_to_canonical, no_html, chunk_size
+    )
     print("Conversion of date to Canonical format done")
     print(f"File generated: {canonical_dates}")
     inter_files.append(canonical_dates)
+    discard_artifact(no_html)
     # Stage 3: Convert time to canonical format
-    canonical_times = time_to_canonical(canonical_dates)
+    canonical_times = recorder.run(
+        "time_to_canonical", time_to_canonical, canonical_dates, chunk_size
+    )
     print("Conversion of time to Canonical format done")
     print(f"File generated: {canonical_times}")
     inter_files.append(canonical_times)
+    discard_artifact(canonical_dates)
     # Stage 4: Split words / word composition into new lines and create a seperate file to work on
-    split_words = word_new_line(canonical_times)
+    split_words = recorder.run(
+        "word_new_line", word_new_line, canonical_times, chunk_size
+    )
     print("Word / word compositions are now split into new lines")
     print(f"File generated: {split_words}")
     inter_files.append(split_words)
+    discard_artifact(canonical_times)
     # Stage 5a: Extract dates as a single token into a seperate file
-    std_out_dates = extract_canonical_dates(split_words)
+    std_out_dates = recorder.run(
+        "extract_canonical_dates", extract_canonical_dates, split_words, chunk_size
+    )
     print(f"Canonical date format extracted into: {std_out_dates}")
     std_files.append(std_out_dates)
     # Stage 5b: Extract time as a single token into a seperate file
-    std_out_times = extract_canonical_times(split_words)
+    std_out_times = recorder.run(
+        "extract_canonical_times", extract_canonical_times, split_words, chunk_size
+    )
     print(f"Canonical time format extracted into: {std_out_times}")
     std_files.append(std_out_times)
     # Stage 5c: Remove these canonical formats from the original file
-    no_date_time = remove_canonical_date_time(split_words)
+    no_date_time = recorder.run(
+        "remove_canonical_date_time",
+        remove_canonical_date_time,
+        split_words,
+        chunk_size,
+    )
     print("Removed canonical formats of date and time")
     print(f"File generated: {no_date_time}")
     inter_files.append(no_date_time)
+    discard_artifact(split_words)
     # Stage 6: Extract and Remove urls
-    std_out_urls, no_urls = handle_urls(no_date_time)
+    std_out_urls, no_urls = recorder.run(
+        "handle_urls", handle_urls, no_date_time, chunk_size
+    )
     print(f"URLs extracted into: {std_out_urls}")
     std_files.append(std_out_urls)
     print(f"File generated: {no_urls}")
     inter_files.append(no_urls)
+    discard_artifact(no_date_time)
     # Stage 7: Extract and Remove usermentions
-    std_out_usermentions, no_usermentions = handle_usermentions(no_urls)
+    std_out_usermentions, no_usermentions = recorder.run(
+        "handle_usermentions", handle_usermentions, no_urls, chunk_size
+    )
     print(f"Extracted usermentions into: {std_out_usermentions}")
     std_files.append(std_out_usermentions)
     print(f"File generated: {no_usermentions}")
     inter_files.append(no_usermentions)
+    discard_artifact(no_urls)
     # Stage 8: Extract and remove hashtags
-    std_out_hashtags, no_hashtags = handle_hashtags(no_usermentions)
+    std_out_hashtags, no_hashtags = recorder.run(
+        "handle_hashtags", handle_hashtags, no_usermentions, chunk_size
+    )
     print(f"Hashtags extracted into: {std_out_hashtags}")
     std_files.append(std_out_hashtags)
     print(f"File generated: {no_hashtags}")
     inter_files.append(no_hashtags)
+    discard_artifact(no_usermentions)
     # Stage 9a: Extract clitics and then process them as two tokens
-    std_out_clitics = process_clitics(no_hashtags)
+    std_out_clitics = recorder.run(
+        "process_clitics", process_clitics, no_hashtags, chunk_size
+    )
     print(f"Clitics extracted into: {std_out_clitics}")
     std_files.append(std_out_clitics)
     # Stage 9b: Remove clitics from the original file
-    no_clitics = remove_clitics(no_hashtags)
+    no_clitics = recorder.run("remove_clitics", remove_clitics, no_hashtags, chunk_size)
     print(f"File generated: {no_clitics}")
     inter_files.append(no_clitics)
+    discard_artifact(no_hashtags)
     # Stage 10a: Extract emoticons as a single token
-    std_out_emotes = extract_emoticons(no_clitics)
+    std_out_emotes = recorder.run(
+        "extract_emoticons", extract_emoticons, no_clitics, chunk_size
+    )
     print(f"Emoticons extracted into: {std_out_emotes}")
     std_files.append(std_out_emotes)
     # Stage 10b: Remove emoticons from file for further processing
-    no_emotes = remove_emoticons(no_clitics)
+    no_emotes = recorder.run(
+        "remove_emoticons", remove_emoticons, no_clitics, chunk_size
+    )
     print(f"File generated: {no_emotes}")
     inter_files.append(no_emotes)
+    discard_artifact(no_clitics)
     # Stage 11a: Extract hyphenated words as a single token and process them
-    std_out_hyphen_words = process_hyphen_words(no_emotes)
+    std_out_hyphen_words = recorder.run(
+        "process_hyphen_words", process_hyphen_words, no_emotes, chunk_size
+    )
     print(f"Hyphenated words extracted into: {std_out_hyphen_words}")
     std_files.append(std_out_hyphen_words)
     # Stage 11b: Remove hyphenated words from the file for further processing
-    no_hyphen_words = remove_hyphen_words(no_emotes)
+    no_hyphen_words = recorder.run(
+        "remove_hyphen_words", remove_hyphen_words, no_emotes, chunk_size
+    )
     print(f"File generated: {no_hyphen_words}")
     inter_files.append(no_hyphen_words)
+    discard_artifact(no_emotes)
     # Stage 12a: Extract abbreviations as a single token
-    std_out_abbr = extract_abbreviations(no_hyphen_words)
+    std_out_abbr = recorder.run(
+        "extract_abbreviations", extract_abbreviations, no_hyphen_words, chunk_size
+    )
     print(f"Abbreviations extracted into: {std_out_abbr}")
     std_files.append(std_out_abbr)
     # Stage 12b: Remove abbreviations from the file for further processing
-    no_abbr = remove_abbreviations(no_hyphen_words)
+    no_abbr = recorder.run(
+        "remove_abbreviations", remove_abbreviations, no_hyphen_words, chunk_size
+    )
     print(f"File generated: {no_abbr}")
     inter_files.append(no_abbr)
+    discard_artifact(no_hyphen_words)
     # Stage 13a: Extract punctuations as a single token
-    std_out_puncts = extract_puncts(no_abbr)
+    std_out_puncts = recorder.run("extract_puncts", extract_puncts, no_abbr, chunk_size)
     print(f"Punctuations extracted into: {std_out_puncts}")
     std_files.append(std_out_puncts)
     # Stage 13b: Remove punctuations from the file for further processing
-    no_puncts = remove_puncts(no_abbr)
+    no_puncts = recorder.run("remove_puncts", remove_puncts, no_abbr, chunk_size)
     print(f"File generated: {no_puncts}")
     inter_files.append(no_puncts)
+    discard_artifact(no_abbr)
     # Stage 14a: Extract all the remaining token
-    std_out_remaining = extract_remaining(no_puncts)
+    std_out_remaining = recorder.run(
+        "extract_remaining", extract_remaining, no_puncts, chunk_size
+    )
     print(f"All the remaining tokens extracted into: {std_out_remaining}")
     std_files.append(std_out_remaining)
     # Stage 14b: Remove all the remaining tokens
-    no_remaining = remove_remaining(no_puncts)
+    no_remaining = recorder.run(
+        "remove_remaining", remove_remaining, no_puncts, chunk_size
+    )
     print(f"File generated: {no_remaining}")
     inter_files.append(no_remaining)
-    # Create the master output file
-    master_output = create_master_std_out(std_files, "612203120_assign2_output.txt")
-    print(f"Final Tokenization result in: {master_output}")
-    # Stanford NER Stage
-    ner_tags = ner_tagging(master_output)
-    print(f"NER output in: {ner_tags}")
+    discard_artifact(no_puncts)
+    discard_artifact(no_remaining)
+    return std_files, inter_files
+
+
+# Single pass pipeline: the input is read once and scanned once by the lexer
+def single_pass_stages(input_file, recorder=None):
+    recorder = recorder or StageRecorder()
+    std_files = recorder.run("lex_file", lex_file_std_outs, input_file)
+    print("Single pass lexing complete")
+    for std_file in std_files:
+        print(f"Tokens extracted into: {std_file}")
+    return std_files, []
+
+
+# Parallel pipeline: the input is split into shards that are lexed by a pool of processes
+def parallel_stages(input_file, jobs, recorder=None):
+    recorder = recorder or StageRecorder()
+    std_files = recorder.run("tokenize_parallel", tokenize_parallel, input_file, jobs)
+    print(f"Parallel lexing complete with {jobs} workers")
+    for std_file in std_files:
+        print(f"Tokens extracted into: {std_file}")
+    return std_files, []
+
+
+# Stage graph pipeline: the stages pass in memory buffers instead of files
+# With spill the intermediate buffers are also written to inter_files for debugging
+def graph_stages(input_file, spill=False, recorder=None):
+    recorder = recorder or StageRecorder()
+    spill_dir = "inter_files" if spill else None
+    std_files, inter_files = recorder.run(
+        "tokenize_graph", tokenize_graph, input_file, "std_outs", spill_dir
+    )
+    print("Stage graph complete")
+    for inter_file in inter_files:
+        print(f"File generated: {inter_file}")
+    for std_file in std_files:
+        print(f"Tokens extracted into: {std_file}")
+    return std_files, inter_files
+
+
+# Token index pipeline: the tokens are kept as offsets into the input file and saved to
+# index_file, the standard output files are then exported from the index
+def index_stages(input_file, index_file, recorder=None):
+    recorder = recorder or StageRecorder()
+    index = recorder.run("build_token_index", build_token_index, input_file)
+    recorder.run("save_token_index", index.save, index_file)
+    print(f"Token index of {len(index)} tokens saved to {index_file}")
+    std_files = recorder.run("export_std_outs", index.write_std_outs, "std_outs")
+    for std_file in std_files:
+        print(f"File generated: {std_file}")
+    return std_files, []
+
+
+# Incremental pipeline: the input is lexed paragraph by paragraph and the tokens of every
+# paragraph are cached on disk, so that a later run only lexes the new or changed ones
+def incremental_stages(input_file, cache_mb=default_cache_mb, recorder=None):
+    recorder = recorder or StageRecorder()
+    std_files = recorder.run(
+        "tokenize_incremental",
+        tokenize_incremental,
+        input_file,
+        "std_outs",
+        cache_file,
+        cache_mb,
+    )
+    for std_file in std_files:
+        print(f"File generated: {std_file}")
+    return std_files, []
+
+
+# Feed pipeline: the records of CSV or JSONL files are tokenized one by one, without a
+# text copy of the corpus, and every token is also written with the id of its record
+def feed_stages(
+    feed_files,
+    field=default_field,
+    id_field=None,
+    html_parser=False,
+    guarded=False,
+    recorder=None,
+):
+    recorder = recorder or StageRecorder()
+    std_files, records = recorder.run(
+        "tokenize_feeds",
+        tokenize_feeds,
+        feed_files,
+        "std_outs",
+        field,
+        id_field,
+        None,
+        "612203120_assign2_records.tsv",
+        html_parser,
+        guarded,
+    )
+    for std_file in std_files:
+        print(f"Tokens extracted into: {std_file}")
+    print(f"Tokens with their record ids in: {records}")
+    return std_files, []
+
+
+# Complete pipeline for tokenization
+# metrics is the metrics level ("basic" or "memory"), TOKENIZER_METRICS is used if not given
+# ner is the NER tagger ("stanford" or "crf"), TOKENIZER_NER_TAGGER is used if not given
+# html_parser converts the input from HTML to text with the HTML parser before the stages
+# guarded cuts the words longer than max_word_length before the stages (linear time)
+# feeds are CSV or JSONL files tokenized record by record instead of an input file
+# store keeps the intermediate files and the standard output files in "memory", "tmpfs" or
+# "compressed" files instead of inter_files and std_outs (TOKENIZER_ARTIFACT_STORE is used
+# if not given), within store_quota_mb, and deletes them at the end of the run
+# sentences writes the normalized text of the input and its sentence offsets, the NER stage
+# then tags the tokens sentence by sentence in the order of the text. Without it (the
+# default, and for feeds) NER batches the master output, whose tokens are grouped by type
+def tokenize(
+    single_pass=False,
+    chunk_size=None,
+    jobs=None,
+    metrics=None,
+    metrics_format="json",
+    graph=False,
+    spill=False,
+    index=False,
+    incremental=False,
+    cache_mb=default_cache_mb,
+    token_ids=False,
+    ner=None,
+    ner_cache=False,
+    html_parser=False,
+    guarded=False,
+    feeds=None,
+    feed_field=default_field,
+    feed_id_field=None,
+    store=None,
+    store_quota_mb=None,
+    store_dir=None,
+    sentences=False,
+):
+    print("----Custom Tokenizer----")
+    # Feed files are given on the command line, there is nothing to ask
+    input_file = None if feeds else input("Enter the name of the input file: ")
+    recorder = StageRecorder(metrics_level(metrics))
+    artifact_store = make_store(store, store_quota_mb, store_dir)
+    set_store(artifact_store)
+    master_file = "612203120_assign2_output.txt"
+    index_file = "612203120_assign2_output.idx"
+    # The metrics report is written even if a stage fails, up to the failing stage
+    try:
+        # HTML to text first (scripts and styles dropped, entities decoded), every mode
+        # then runs on the text
+        pre_files = []
+        if html_parser and not feeds:
+            input_file = recorder.run("html_to_text", html_to_text, input_file)
+            print(f"File generated: {input_file}")
+            pre_files.append(input_file)
+        # Guarded mode: runs of text without blank spaces are cut to a bounded length, so
+        # that no pattern can take quadratic time on a malformed page
+        if guarded and not feeds:
+            guarded_file = recorder.run(
+                "guard_long_words", guard_long_words, input_file
+            )
+            discard_artifact(input_file)
+            input_file = guarded_file
+            print(f"File generated: {input_file}")
+            pre_files.append(input_file)
+        if feeds:
+            std_files, inter_files = feed_stages(
+                feeds, feed_field, feed_id_field, html_parser, guarded, recorder
+            )
+        elif jobs:
+            std_files, inter_files = parallel_stages(input_file, jobs, recorder)
+        elif single_pass:
+            std_files, inter_files = single_pass_stages(input_file, recorder)
+        elif incremental:
+            std_files, inter_files = incremental_stages(input_file, cache_mb, recorder)
+        elif index:
+            std_files, inter_files = index_stages(input_file, index_file, recorder)
+        elif graph:
+            std_files, inter_files = graph_stages(input_file, spill, recorder)
+        else:
+            std_files, inter_files = cascade_stages(input_file, chunk_size, recorder)
+        # Sentence offsets of the text the modes ran on, once its tags are dropped and its
+        # dates and times converted, so that the sentences have the tokens of the master
+        text_file = spans_file = None
+        if sentences and not feeds:
+            text_file, spans_file = recorder.run(
+                "normalize_file", normalize_file, input_file
+            )
+            print(f"Sentence offsets in: {spans_file}")
+            pre_files.extend([text_file, spans_file])
+        if input_file:
+            discard_artifact(input_file)
+        inter_files = pre_files + inter_files
+        # Create the master output file
+        master_output = recorder.run(
+            "create_master_std_out", create_master_std_out, std_files, master_file
+        )
+        print(f"Final Tokenization result in: {master_output}")
+        # Binary token id corpus next to the master output (vocabulary, ids and types)
+        if token_ids:
+            id_files = recorder.run(
+                "create_master_token_ids",
+                create_master_token_ids,
+                std_files,
+                os.path.splitext(master_file)[0],
+            )
+            print(f"Token id files generated: {', '.join(id_files)}")
+        # No later stage reads the standard output files
+        for std_file in std_files:
+            discard_artifact(std_file)
+        # NER Stage (Stanford NER server, or the in process CRF tagger)
+        ner_tags = recorder.run(
+            "ner_tagging",
+            ner_tagging,
+            master_output,
+            ner,
+            ner_cache_file if ner_cache else None,
+            cache_mb,
+            text_file,
+            spans_file,
+        )
+        print(f"NER output in: {ner_tags}")
+    finally:
+        # Per stage metrics report next to the master output
+        report = recorder.write_report(master_file, metrics_format)
+        if report:
+            print(f"Pipeline metrics in: {report}")
+        # The intermediate files of a store are always deleted, even if a stage failed
+        if artifact_store is not None:
+            print(artifact_store.summary())
+            artifact_store.close()
+            set_store(None)
+            print(f"Intermediate files deleted from the {artifact_store.kind} store")
     # Clean up stage to save memory in case of large corpus
+    if not inter_files or artifact_store is not None:
+        print("Tokenization complete.")
+        return
     inter_clean = input(
         "Tokenization complete. Do you want to delete the intermediate files? [y/n]: "
     )
@@ -0,0 +1,147 @@
+import argparse
+import contextlib
+import filecmp
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+llm_ngrams_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, llm_ngrams_dir)
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(llm_ngrams_dir)),
+        "data_preprocessing",
+        "benchmarks",
+    ),
+)
+
+from build_model import generate_ngram_model, generate_ngram_model_out_of_core
+from ngram_counts import n_values
+from synthetic_corpus import write_corpus
+
+mis_no = "612203120"
+
+# Model builder of every mode of build_model.py, serial is the one without any flag
+modes = {
+    "serial": lambda input_file, args: generate_ngram_model(input_file, mis_no),
+    "parallel": lambda input_file, args: generate_ngram_model(
+        input_file, mis_no, args.jobs
+    ),
+    "out-of-core": lambda input_file, args: generate_ngram_model_out_of_core(
+        input_file, mis_no, args.memory_mb
+    ),
+}
+
+
+# Builds the models of a mode in work_dir and writes its time and peak RSS (of the main
+# process and of its worker processes) to a report file
+# Runs in its own process, so that the peak RSS is the one of this mode only
+def run_mode(mode, input_file, work_dir, args):
+    os.chdir(work_dir)
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        modes[mode](input_file, args)
+    report = {
+        "wall_time": time.perf_counter() - start,
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "workers_peak_rss": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        * 1024,
+    }
+    with open("report.json", "w") as f_out:
+        json.dump(report, f_out)
+
+
+# Report of a mode run in a fresh process
+def measure(mode, input_file, work_dir, args):
+    os.makedirs(work_dir)
+    process = multiprocessing.get_context("spawn").Process(
+        target=run_mode, args=(mode, input_file, work_dir, args)
+    )
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"The {mode} mode failed (exit code {process.exitcode})")
+    with open(os.path.join(work_dir, "report.json"), "r") as f_in:
+        return json.load(f_in)
+
+
+# Model files that differ from the ones of the reference run
+def compare_outputs(work_dir, reference_dir):
+    names = [f"{mis_no}_{name}-output.txt" for name in n_values]
+    return [
+        name
+        for name in names
+        if not os.path.exists(os.path.join(work_dir, name))
+        or not filecmp.cmp(
+            os.path.join(work_dir, name), os.path.join(reference_dir, name), False
+        )
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="N-gram model builder benchmark")
+    parser.add_argument("--size-mb", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--input", help="benchmark on this file instead")
+    parser.add_argument(
+        "--modes",
+        default="serial,parallel,out-of-core",
+        help="comma separated modes, the first one is the reference of the output check",
+    )
+    parser.add_argument("--jobs", type=int, default=2, help="workers of parallel mode")
+    parser.add_argument(
+        "--memory-mb", type=float, default=16, help="memory budget of out-of-core mode"
+    )
+    parser.add_argument("--keep", action="store_true", help="keep the output folders")
+    args = parser.parse_args()
+
+    mode_names = args.modes.split(",")
+    for mode in mode_names:
+        if mode not in modes:
+            parser.error(f"unknown mode: {mode} (one of {', '.join(modes)})")
+    work_root = tempfile.mkdtemp(prefix="bench_build_model_")
+    try:
+        if args.input:
+            input_file = os.path.abspath(args.input)
+        else:
+            input_file = write_corpus(
+                os.path.join(work_root, "input.txt"), args.size_mb, None, args.seed
+            )
+        size = os.path.getsize(input_file)
+        print(f"Input: {size / (1024 * 1024):.1f} MB ({input_file})")
+
+        different_modes = []
+        for mode in mode_names:
+            work_dir = os.path.join(work_root, mode)
+            report = measure(mode, input_file, work_dir, args)
+            different = compare_outputs(
+                work_dir, os.path.join(work_root, mode_names[0])
+            )
+            if mode == mode_names[0]:
+                check = "reference"
+            elif different:
+                check = f"DIFFERENT: {', '.join(different)}"
+                different_modes.append(mode)
+            else:
+                check = "same counts"
+            seconds = report["wall_time"]
+            print(
+                f"{mode:12} {seconds:8.2f} s "
+                f"{size / (1024 * 1024) / seconds if seconds else 0.0:8.2f} MB/s"
+                f"  peak RSS {report['peak_rss'] / (1024 * 1024):7.1f} MB"
+                f" (workers {report['workers_peak_rss'] / (1024 * 1024):7.1f} MB)"
+                f"  {check}"
+            )
+        if different_modes:
+            sys.exit(1)
+    finally:
+        if args.keep:
+            print(f"Outputs kept in: {work_root}")
+        else:
+            shutil.rmtree(work_root)
@@ -1,11 +1,37 @@
+import argparse
+import os
 import sys
-import re
-from collections import Counter
-import nltk
-from nltk.util import ngrams
+import tempfile
+from external_counts import (
+    default_memory_mb,
+    ngram_counts_by_position,
+    read_chunk_size,
+    spill_ngram_runs,
+)
+from ngram_counts import (
+    count_ngrams,
+    n_values,
+    ngram_lines,
+    ngram_rows,
+    sentence_tokens,
+    token_ids,
+    write_ngram_model,
+)
+from parallel_counts import parallel_count_ngrams
 
+# Sentence segmenter shared with the tokenizer (data_preprocessing)
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        "data_preprocessing",
+    ),
+)
+from sentence_segmenter import sentence_spans, stream_sentences
 
-def generate_ngram_model(input_file_path, mis_no):
+
+# Builds the n-gram models of a text in memory, with jobs worker processes if given
+def generate_ngram_model(input_file_path, mis_no, jobs=None):
     try:
         with open(input_file_path, "r", encoding="utf-8") as f:
             text = f.read()
@@ -14,45 +40,113 @@ def generate_ngram_model(input_file_path, mis_no):
         return
 
     # Normalize and tokenize the text into sentences and then words
-    # Using a simple regex to split into sentences
-    sentences = re.split(r"(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s", text)
-    all_tokens = [
-        word.lower() for sentence in sentences for word in nltk.word_tokenize(sentence)
-    ]
+    # Sentences from the segmenter of the tokenizer: one linear scan, abbreviations aware
+    sentences = [text[start:end] for start, end in sentence_spans(text)]
+    if jobs:
+        # Map-reduce: shards of sentences tokenized and counted by worker processes
+        print(f"Counting n-grams with {jobs} worker processes...")
+        vocab, ngram_counts = parallel_count_ngrams(sentences, n_values.values(), jobs)
+    else:
+        # Every token is mapped to an integer id once, the n-grams are counted on the ids
+        vocab, ids = token_ids(sentence_tokens(sentences))
 
-    # Define the range of n-grams you want to create
-    n_values = {"bigram": 2, "trigram": 3, "four-gram": 4, "five-gram": 5}
+        # Count the n-grams of all the orders (bigram to five-gram) with one sort
+        ngram_counts = {
+            n: (ngram_rows(ids, n, positions), positions, counts)
+            for n, (positions, counts) in count_ngrams(ids, n_values.values()).items()
+        }
 
     for name, n in n_values.items():
         print(f"Generating {name} model...")
 
-        # Generate n-grams
-        n_grams = ngrams(all_tokens, n)
-
-        # Count the frequency of each n-gram
-        ngram_counts = Counter(n_grams)
-
-        # Prepare the output lines
-        output_lines = []
-        for ngram, count in ngram_counts.items():
-            # Format: "word1 word2... count"
-            output_lines.append(f"{' '.join(ngram)} {count}")
+        # Prepare the output lines, format: "word1 word2... count"
+        rows, _, counts = ngram_counts[n]
+        output_lines = ngram_lines(vocab, rows, counts)
 
         # Write to the output file
         output_file_name = f"{mis_no}_{name}-output.txt"
         try:
-            with open(output_file_name, "w", encoding="utf-8") as f:
-                # Join with newline to avoid extra line at the end
-                f.write("\n".join(output_lines))
+            write_ngram_model(output_file_name, output_lines)
             print(f"Successfully created '{output_file_name}'")
         except IOError:
             print(f"Error: Could not write to file '{output_file_name}'.")
 
 
+# Out of core version of generate_ngram_model for corpora larger than the memory: the
+# corpus is read in chunks and the counts are spilled to sorted run files in temp_dir
+# (the system temp folder by default) whenever about memory_mb of tokens are counted,
+# then merged. Writes the same model files as generate_ngram_model
+def generate_ngram_model_out_of_core(
+    input_file_path, mis_no, memory_mb=default_memory_mb, temp_dir=None
+):
+    if not os.path.isfile(input_file_path):
+        print(f"Error: The file '{input_file_path}' was not found.")
+        return
+
+    # Decoded as UTF-8 like the corpus of generate_ngram_model, whatever the locale
+    chunk_size = read_chunk_size(memory_mb)
+    sentences = stream_sentences(input_file_path, chunk_size, chunk_size, "utf-8")
+    tokens = sentence_tokens(sentences)
+
+    with tempfile.TemporaryDirectory(prefix="ngram_runs_", dir=temp_dir) as work_dir:
+        print(f"Counting n-grams in runs of about {memory_mb} MB...")
+        runs = spill_ngram_runs(tokens, n_values.values(), work_dir, memory_mb)
+
+        for name, n in n_values.items():
+            print(f"Generating {name} model from {len(runs[n])} runs...")
+
+            # Merge the runs into the output lines, in the order the n-grams first occur
+            output_lines = (
+                f"{ngram} {count}"
+                for ngram, count in ngram_counts_by_position(
+                    runs[n], work_dir, memory_mb
+                )
+            )
+
+            output_file_name = f"{mis_no}_{name}-output.txt"
+            try:
+                write_ngram_model(output_file_name, output_lines)
+                print(f"Successfully created '{output_file_name}'")
+            except IOError:
+                print(f"Error: Could not write to file '{output_file_name}'.")
+
+
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python build_model.py <your_mis_no> <input_dataset.txt>")
+    parser = argparse.ArgumentParser(
+        description="Builds the bigram to five-gram models of a text",
+        usage="python build_model.py <your_mis_no> <input_dataset.txt> [--jobs N | --out-of-core]",
+    )
+    parser.add_argument("mis_no")
+    parser.add_argument("input_file")
+    parser.add_argument(
+        "--out-of-core",
+        action="store_true",
+        help="count in sorted runs on disk, for corpora larger than the memory",
+    )
+    parser.add_argument(
+        "--memory-mb",
+        type=float,
+        default=default_memory_mb,
+        help="memory budget of --out-of-core, in MB",
+    )
+    parser.add_argument(
+        "--temp-dir", default=None, help="folder of the run files of --out-of-core"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="worker processes: tokenize and count shards of the text in parallel",
+    )
+    args = parser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.jobs and args.out_of_core:
+        parser.error("--jobs and --out-of-core cannot be used together")
+
+    if args.out_of_core:
+        generate_ngram_model_out_of_core(
+            args.input_file, args.mis_no, args.memory_mb, args.temp_dir
+        )
     else:
-        mis_number = sys.argv[1]
-        input_file = sys.argv[2]
-        generate_ngram_model(input_file, mis_number)
+        generate_ngram_model(args.input_file, args.mis_no, args.jobs)
@@ -0,0 +1,134 @@
+import heapq
+import os
+import tempfile
+from itertools import groupby, islice
+from operator import itemgetter
+from ngram_counts import count_ngrams, ngram_rows, row_texts, token_ids
+
+# Memory budget in MB of the out of core mode
+default_memory_mb = 256
+
+# Estimated memory of a token of a batch in bytes: the token, its id and its row of ids in
+# the sort, and its share of the n-grams of every order sorted for the runs
+token_bytes = 600
+
+# Estimated memory of a record (n-gram, position, count) in bytes, besides its text
+record_bytes = 180
+
+# Largest number of characters read from the corpus at a time
+max_chunk_size = 1 << 20
+
+# Most run files merged at once, more runs are first merged into fewer, longer runs
+merge_width = 64
+
+
+# Characters read from the corpus at a time for a memory budget: a chunk and its copies
+# (up to 4 bytes a character) take a small part of the budget
+def read_chunk_size(memory_mb=default_memory_mb):
+    return min(max(int(memory_mb * 1024 * 1024) // 128, 4096), max_chunk_size)
+
+
+# Writes records (n-gram, position, count) to a new run file of work_dir
+def write_run(records, work_dir):
+    fd, path = tempfile.mkstemp(suffix=".run", dir=work_dir)
+    with open(fd, "w", encoding="utf-8") as f:
+        for ngram, position, count in records:
+            f.write(f"{ngram}\t{position}\t{count}\n")
+    return path
+
+
+# Records of a run file, the n-grams never contain a tab or a new line (tokens are words)
+def read_run(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            ngram, position, count = line.rstrip("\n").split("\t")
+            yield ngram, int(position), int(count)
+
+
+# Adds up the counts of the records of the same n-gram in records sorted by n-gram, with
+# the first position of the n-gram
+def combine_records(records):
+    for ngram, group in groupby(records, itemgetter(0)):
+        _, position, count = next(group)
+        for _, other, more in group:
+            position = min(position, other)
+            count += more
+        yield ngram, position, count
+
+
+# Merges run files sorted by key into one stream of records sorted by key (k-way merge)
+# With more than merge_width runs, groups of runs are first merged into new runs so that
+# only merge_width files are open at a time. The run files are deleted once merged
+def merge_runs(paths, key, work_dir, combine=None):
+    combine = combine or iter
+    while len(paths) > merge_width:
+        merged = []
+        for i in range(0, len(paths), merge_width):
+            group = paths[i : i + merge_width]
+            records = heapq.merge(*map(read_run, group), key=key)
+            merged.append(write_run(combine(records), work_dir))
+            for path in group:
+                os.remove(path)
+        paths = merged
+    yield from combine(heapq.merge(*map(read_run, paths), key=key))
+    for path in paths:
+        os.remove(path)
+
+
+# Counts the n-grams of a stream of tokens in batches of about memory_mb, the counts of
+# every batch are spilled to a run file per order, sorted by n-gram. The last tokens of a
+# batch are carried over to the next one, so an n-gram across two batches is counted once
+# Returns {order: run files}, the positions of the records are positions in the stream
+def spill_ngram_runs(tokens, orders, work_dir, memory_mb=default_memory_mb):
+    orders = sorted(set(orders))
+    batch_size = max(int(memory_mb * 1024 * 1024) // token_bytes, orders[-1])
+    runs = {n: [] for n in orders}
+    tokens = iter(tokens)
+    carry = []
+    offset = 0
+    while True:
+        batch = carry + list(islice(tokens, batch_size))
+        if len(batch) == len(carry):
+            break
+        vocab, ids = token_ids(batch)
+        counts = count_ngrams(ids, orders, len(carry))
+        for n, (positions, ngram_counts) in counts.items():
+            records = list(
+                zip(
+                    row_texts(vocab, ngram_rows(ids, n, positions)),
+                    (positions + offset).tolist(),
+                    ngram_counts.tolist(),
+                )
+            )
+            if records:
+                records.sort(key=itemgetter(0))
+                runs[n].append(write_run(records, work_dir))
+        keep = min(orders[-1] - 1, len(batch))
+        carry = batch[len(batch) - keep :]
+        offset += len(batch) - len(carry)
+    return runs
+
+
+# Counts of the n-grams of the runs of one order as (n-gram, count), in the order the
+# n-grams first occur. The merged counts are spilled again sorted by position, in runs of
+# about memory_mb, and merged back by position
+def ngram_counts_by_position(paths, work_dir, memory_mb=default_memory_mb):
+    budget = memory_mb * 1024 * 1024
+    position_runs = []
+    buffer = []
+    size = 0
+    for record in merge_runs(paths, itemgetter(0), work_dir, combine_records):
+        buffer.append(record)
+        size += len(record[0]) + record_bytes
+        if size >= budget:
+            buffer.sort(key=itemgetter(1))
+            position_runs.append(write_run(buffer, work_dir))
+            buffer = []
+            size = 0
+    buffer.sort(key=itemgetter(1))
+    if position_runs:
+        if buffer:
+            position_runs.append(write_run(buffer, work_dir))
+        buffer = merge_runs(position_runs, itemgetter(1), work_dir)
+    for ngram, _, count in buffer:
+        yield ngram, count
@@ -0,0 +1,129 @@
+import nltk
+import numpy as np
+
+# Orders of the n-gram models and the names of their output files
+n_values = {"bigram": 2, "trigram": 3, "four-gram": 4, "five-gram": 5}
+
+
+# Tokens of sentences: the lower case words of nltk's word tokenizer
+def sentence_tokens(sentences):
+    for sentence in sentences:
+        for word in nltk.word_tokenize(sentence):
+            yield word.lower()
+
+
+# Integer id of every token, the ids are given in the order the tokens first occur
+# Returns the vocabulary (the token of every id) and the array of the ids of the tokens
+def token_ids(tokens):
+    vocab = {}
+    ids = np.fromiter(
+        (vocab.setdefault(token, len(vocab)) for token in tokens), dtype=np.uint32
+    )
+    return list(vocab), ids
+
+
+# Sorts the rows of top ids that start at every position. Returns the sorting and a
+# function giving a key of the sorted rows for k = 1..top: rows have the same first k ids
+# if no key up to k changes between them. If a row fits in 64 bits it is packed into one
+# integer and sorted once, else the rows are sorted column by column
+def sort_rows(padded, total, top):
+    bits = max(int(padded.max()).bit_length(), 1)
+    columns = [padded[i : i + total] for i in range(top)]
+    if bits * top <= 64:
+        packed = np.zeros(total, dtype=np.uint64)
+        for column in columns:
+            packed <<= np.uint64(bits)
+            packed |= column
+        order = np.argsort(packed)
+        packed = packed[order]
+        return order, lambda k: packed >> np.uint64(bits * (top - k))
+    order = np.lexsort(columns[::-1])
+    return order, lambda k: columns[k - 1][order]
+
+
+# Counts the n-grams of every order with a single sort of the token positions
+# Every position starts a row of the ids of the highest order (the end of the ids is padded
+# with an id past the vocabulary): sorted rows also put the n-grams of every lower order,
+# their first ids, next to each other, so the counts of all the orders come from one sort
+# Returns {order: (positions, counts)}, the position of the first occurrence of every
+# n-gram and its count, in the order the n-grams first occur (the order of a Counter)
+# The n-grams that start in the first skip ids and end in them too are left out: the ids
+# carried over from the previous batch of a stream, whose n-grams are already counted
+def count_ngrams(ids, orders=n_values.values(), skip=0):
+    orders = sorted(set(orders))
+    total = len(ids)
+    if total == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return {n: (empty, empty) for n in orders}
+    top = orders[-1]
+    pad = np.full(top - 1, int(ids.max()) + 1, dtype=ids.dtype)
+    order, key = sort_rows(np.concatenate([ids, pad]), total, top)
+    counts = {}
+    # A group of equal n-grams starts where any of the first n ids change
+    starts = np.zeros(total, dtype=bool)
+    starts[0] = True
+    for n in range(1, top + 1):
+        sorted_key = key(n)
+        starts[1:] |= sorted_key[1:] != sorted_key[:-1]
+        if n not in orders:
+            continue
+        group_starts = np.flatnonzero(starts)
+        # The rows are sorted on all their ids, the first occurrence of an n-gram is the
+        # smallest position of its group
+        if skip > n - 1:
+            new = order > skip - n
+            first = np.minimum.reduceat(np.where(new, order, total), group_starts)
+            count = np.add.reduceat(new.astype(np.int64), group_starts)
+        else:
+            first = np.minimum.reduceat(order, group_starts)
+            count = np.diff(np.append(group_starts, total))
+        # Rows with the padding are the last n - 1 positions, each in a group of its own
+        kept = first <= total - n
+        first, count = first[kept], count[kept]
+        by_position = np.argsort(first)
+        counts[n] = (first[by_position], count[by_position])
+    return counts
+
+
+# Adds up the counts of equal n-grams, given as rows of ids (one n-gram per row) with the
+# position of their first occurrence and their count, eg; the counts of parts of a text
+# Returns the rows, first positions and counts of the distinct n-grams, in the order the
+# n-grams first occur
+def merge_ngram_counts(rows, positions, counts):
+    if len(rows) == 0:
+        return rows, positions, counts
+    order = np.lexsort(rows.T[::-1])
+    rows = rows[order]
+    starts = np.ones(len(rows), dtype=bool)
+    starts[1:] = (rows[1:] != rows[:-1]).any(axis=1)
+    starts = np.flatnonzero(starts)
+    first = np.minimum.reduceat(positions[order], starts)
+    count = np.add.reduceat(counts[order], starts)
+    by_position = np.argsort(first)
+    return rows[starts][by_position], first[by_position], count[by_position]
+
+
+# Rows of ids of the n-grams starting at positions, one n-gram per row
+def ngram_rows(ids, n, positions):
+    return np.stack([ids[positions + i] for i in range(n)], axis=1)
+
+
+# Text of the n-grams of rows of ids: "word1 word2..."
+def row_texts(vocab, rows):
+    words = np.array(vocab, dtype=object)
+    return map(" ".join, zip(*(words[column] for column in rows.T)))
+
+
+# Lines of an n-gram model: "word1 word2... count" for every n-gram, in the order of the rows
+def ngram_lines(vocab, rows, counts):
+    for ngram, count in zip(row_texts(vocab, rows), counts.tolist()):
+        yield f"{ngram} {count}"
+
+
+# Writes an n-gram model file, one line per n-gram with no new line at the end
+def write_ngram_model(output_file, lines):
+    with open(output_file, "w", encoding="utf-8") as f:
+        separator = ""
+        for line in lines:
+            f.write(separator + line)
+            separator = "\n"
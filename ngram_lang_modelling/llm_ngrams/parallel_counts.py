@@ -0,0 +1,115 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from ngram_counts import (
+    count_ngrams,
+    merge_ngram_counts,
+    ngram_rows,
+    sentence_tokens,
+    token_ids,
+)
+
+# Shards per worker process: more shards than workers keep every worker busy until the end
+shards_per_job = 4
+
+
+# Splits sentences into shards of about the same number of characters, in text order
+def shard_sentences(sentences, shards):
+    size = max(sum(map(len, sentences)) // max(shards, 1), 1)
+    shard = []
+    length = 0
+    for sentence in sentences:
+        shard.append(sentence)
+        length += len(sentence)
+        if length >= size:
+            yield shard
+            shard = []
+            length = 0
+    if shard:
+        yield shard
+
+
+# Map: tokenizes a shard and counts the n-grams of every order that are inside it
+# Returns the vocabulary of the shard, its number of tokens, the ids of its first and of
+# its last top - 1 tokens (for the n-grams across two shards) and, for every order, the
+# rows of ids, first positions and counts of its n-grams
+def count_shard(sentences, orders):
+    vocab, ids = token_ids(sentence_tokens(sentences))
+    edge = max(orders) - 1
+    counts = {
+        n: (ngram_rows(ids, n, positions), positions, ngram_counts)
+        for n, (positions, ngram_counts) in count_ngrams(ids, orders).items()
+    }
+    return vocab, len(ids), ids[:edge], ids[max(len(ids) - edge, 0) :], counts
+
+
+# Reduce: merges the counts of the shards, in text order, into the counts of the text
+# The ids of every shard are mapped to the ids of one vocabulary and the positions are
+# moved by the tokens of the shards before it. An n-gram across two shards (or more, after
+# a shard of less than top - 1 tokens) is built from the first and last tokens of the
+# shards and counted at the first shard end it crosses
+# Returns the vocabulary and, for every order, the rows of ids, first positions and
+# counts of the n-grams in the order they first occur
+def merge_shard_counts(results, orders):
+    orders = sorted(set(orders))
+    vocab = {}
+    edge_ids = {}
+    ends = []
+    parts = {n: [] for n in orders}
+    offset = 0
+    for shard_vocab, length, head, tail, counts in results:
+        mapping = np.fromiter(
+            (vocab.setdefault(token, len(vocab)) for token in shard_vocab),
+            dtype=np.uint32,
+            count=len(shard_vocab),
+        )
+        for i, token in enumerate(mapping[head].tolist()):
+            edge_ids[offset + i] = token
+        for i, token in enumerate(mapping[tail].tolist()):
+            edge_ids[offset + length - len(tail) + i] = token
+        for n, (rows, positions, ngram_counts) in counts.items():
+            parts[n].append((mapping[rows], positions + offset, ngram_counts))
+        offset += length
+        ends.append(offset)
+    total = offset
+    previous = 0
+    for end in ends[:-1]:
+        for n in orders:
+            positions = [
+                position
+                for position in range(max(end - n + 1, previous), end)
+                if position + n <= total
+            ]
+            if positions:
+                rows = np.array(
+                    [
+                        [edge_ids[position + i] for i in range(n)]
+                        for position in positions
+                    ],
+                    dtype=np.uint32,
+                )
+                parts[n].append(
+                    (rows, np.array(positions), np.ones(len(positions), dtype=np.int64))
+                )
+        previous = end
+    merged = {}
+    for n in orders:
+        if parts[n]:
+            rows, positions, counts = (np.concatenate(part) for part in zip(*parts[n]))
+        else:
+            rows = np.zeros((0, n), dtype=np.uint32)
+            positions = counts = np.zeros(0, dtype=np.int64)
+        merged[n] = merge_ngram_counts(rows, positions, counts)
+    return list(vocab), merged
+
+
+# Counts the n-grams of sentences with a pool of jobs worker processes (the CPU count by
+# default): the sentences are split into shards, every shard is tokenized and counted by a
+# worker and the counts are merged. Returns the same counts as a single process
+def parallel_count_ngrams(sentences, orders, jobs=None):
+    orders = sorted(set(orders))
+    jobs = jobs or os.cpu_count()
+    shards = list(shard_sentences(sentences, jobs * shards_per_job))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(count_shard, shards, [orders] * len(shards))
+        return merge_shard_counts(results, orders)